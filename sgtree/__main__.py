@@ -1,9 +1,17 @@
+import sys
 import warnings
 
 
 warnings.simplefilter("ignore", SyntaxWarning)
 
 
-from sgtree.cli import main
+from sgtree.shard import SUBCOMMANDS
 
-main()
+if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+    from sgtree.shard import main
+
+    main(sys.argv[1:])
+else:
+    from sgtree.cli import main
+
+    main()
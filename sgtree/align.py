@@ -1,11 +1,16 @@
 import os
+import io
 import glob
+import hashlib
 import subprocess
-import shutil
 
-from pyhmmer import easel, hmmer, plan7
+import numpy as np
+import pyhmmer
+from pyhmmer import easel, hmmer
 
+from sgtree.cache import text_digest
 from sgtree.config import Config
+from sgtree.marker_db import load_models
 from sgtree.parallel import map_processed, map_threaded
 
 
@@ -48,25 +53,43 @@ def _run_mafft_linsi(args):
         f.write(result.stdout.decode("utf-8") + "\n")
 
 
+# marker HMMs by name, filled once per alignment worker by _load_hmm_registry
+_HMMS: dict = {}
+
+
+def _load_hmm_registry(models_path: str) -> None:
+    """Pool initializer: index the run's parsed marker HMMs by name.
+
+    :func:`sgtree.marker_db.load_models` keeps one parsed marker set per
+    process, so forked workers reuse the one the search stage loaded.
+    """
+    _HMMS.clear()
+    _HMMS.update((hmm.name, hmm) for hmm in load_models(models_path).hmms)
+
+
 def _run_hmmalign(args):
-    extracted_seqs_dir, aligned_dir, model_hmm_path, filename = args
-    filepath = os.path.join(extracted_seqs_dir, filename)
-    model = filename.split(".")[0]
-    faa_path = os.path.join(aligned_dir, model + ".faa")
-    with plan7.HMMFile(model_hmm_path) as hmm_file:
-        hmm_profile = next(iter(hmm_file), None)
+    """hmmalign one marker's sequences (a FASTA path or ``(name, sequence)`` records)."""
+    aligned_dir, model, sequences = args
+    hmm_profile = _HMMS.get(model)
     if hmm_profile is None:
-        raise ValueError(f"Could not read HMM profile from {model_hmm_path}")
+        raise ValueError(f"Could not find HMM profile for marker {model}")
 
-    with easel.SequenceFile(filepath, digital=True, alphabet=hmm_profile.alphabet) as seq_file:
-        msa = hmmer.hmmalign(hmm_profile, seq_file, cpus=1, trim=True)
+    if isinstance(sequences, str):
+        with easel.SequenceFile(sequences, digital=True, alphabet=hmm_profile.alphabet) as seq_file:
+            msa = hmmer.hmmalign(hmm_profile, seq_file, cpus=1, trim=True)
+    else:
+        block = easel.TextSequenceBlock(
+            easel.TextSequence(name=name, sequence=sequence) for name, sequence in sequences
+        )
+        msa = hmmer.hmmalign(hmm_profile, block.digitize(hmm_profile.alphabet), cpus=1, trim=True)
+    faa_path = os.path.join(aligned_dir, model + ".faa")
     with open(faa_path, "wb") as out_handle:
         msa.write(out_handle, format="afa")
     _normalize_fasta(faa_path)
 
 
-def _normalize_fasta(fasta_path: str) -> None:
-    """Normalize FASTA headers and sequence order for deterministic downstream trees."""
+def _read_fasta(fasta_path: str) -> list[tuple[str, str]]:
+    """``(header line, sequence)`` records of a FASTA file, blank lines skipped."""
     records = []
     header = None
     seq_chunks = []
@@ -84,24 +107,133 @@ def _normalize_fasta(fasta_path: str) -> None:
                 seq_chunks.append(line)
     if header is not None:
         records.append((header, "".join(seq_chunks)))
+    return records
 
-    records.sort(key=lambda item: item[0])
+
+def _write_fasta(fasta_path: str, records) -> None:
     with open(fasta_path, "w") as f:
         for header, seq in records:
             f.write(f"{header}\n{seq}\n")
 
-def _split_models(models_path: str, split_dir: str) -> None:
-    if os.path.isdir(split_dir):
-        shutil.rmtree(split_dir)
-    os.makedirs(split_dir, exist_ok=True)
-    with plan7.HMMFile(models_path) as hmm_file:
-        for hmm_profile in hmm_file:
-            marker = hmm_profile.name
-            if isinstance(marker, bytes):
-                marker = marker.decode("utf-8", errors="replace")
-            out_path = os.path.join(split_dir, f"{marker}.hmm")
-            with open(out_path, "wb") as out_handle:
-                hmm_profile.write(out_handle)
+
+def _normalize_fasta(fasta_path: str) -> None:
+    """Normalize FASTA headers and sequence order for deterministic downstream trees."""
+    records = _read_fasta(fasta_path)
+    records.sort(key=lambda item: item[0])
+    _write_fasta(fasta_path, records)
+
+
+def _subset_alignment(source_path: str, seqs_path: str, dest_path: str) -> bool:
+    """Cut the hmmalign alignment ``source_path`` down to the sequences of ``seqs_path``.
+
+    hmmalign aligns every sequence to the profile on its own: consensus
+    columns are always kept and insert residues are left-justified, so an
+    alignment of a subset equals the full alignment with the other rows and
+    the insert columns that became all-gap removed. Returns False (and
+    writes nothing) unless every sequence has a matching row in
+    ``source_path``.
+    """
+    wanted = {}
+    for header, seq in _read_fasta(seqs_path):
+        wanted[header[1:].split()[0]] = seq.upper()
+    if not wanted:
+        return False
+    rows = []
+    for header, row in _read_fasta(source_path):
+        seq = wanted.get(header[1:].split()[0])
+        if seq is None:
+            continue
+        residues = row.replace("-", "").replace(".", "").upper()
+        if residues not in seq:
+            return False
+        rows.append((header, row))
+    if len(rows) != len(wanted) or len({len(row) for _header, row in rows}) != 1:
+        return False
+
+    columns = np.frombuffer("".join(row for _header, row in rows).encode("ascii"), dtype="S1")
+    keep = (columns.reshape(len(rows), -1) != b".").any(axis=0)
+    if not keep.all():
+        rows = [
+            (header, np.frombuffer(row.encode("ascii"), dtype="S1")[keep].tobytes().decode("ascii"))
+            for header, row in rows
+        ]
+    _write_fasta(dest_path, rows)
+    return True
+
+
+# Bump when the cached alignment layout changes so old entries are not reused.
+ALIGN_CACHE_VERSION = 1
+
+
+def _marker_digests(models_path: str) -> dict[str, str]:
+    """SHA-256 of every marker HMM, by name."""
+    digests = {}
+    for hmm in load_models(models_path).hmms:
+        buffer = io.BytesIO()
+        hmm.write(buffer)
+        digests[hmm.name] = hashlib.sha256(buffer.getvalue()).hexdigest()
+    return digests
+
+
+def _alignment_key(method: str, marker_digest: str, sequences) -> str:
+    """Cache key of one marker alignment.
+
+    hmmalign output is sorted by name and does not depend on the input
+    order, so it is keyed by the sorted ``(name, sequence)`` set; mafft
+    keeps its input order and full header lines, so they are keyed as read.
+    """
+    if isinstance(sequences, str):
+        records = _read_fasta(sequences)
+        if method == "hmmalign":
+            records = [(header[1:].split()[0], seq) for header, seq in records]
+    else:
+        records = list(sequences)
+    if method == "hmmalign":
+        records = sorted(records)
+    digest = hashlib.sha256()
+    for name, seq in records:
+        digest.update(f"{name}\t{seq}\n".encode("utf-8"))
+    version = pyhmmer.__version__ if method == "hmmalign" else ""
+    return text_digest("alignment", ALIGN_CACHE_VERSION, method, version, marker_digest, digest.hexdigest())
+
+
+def _fetch_cached_alignments(cfg: Config, aligned_dir: str, sources: dict) -> dict[str, str | None]:
+    """Copy cached alignments of ``sources`` (marker -> FASTA path or records) to ``aligned_dir``.
+
+    Returns the cache keys of the markers that still have to be aligned;
+    empty without ``--cache_dir``. A marker missing from the run's models
+    has no HMM to key by, so it bypasses the cache with a ``None`` key.
+    """
+    cache = cfg.cache("alignments")
+    if cache is None:
+        return {}
+    marker_digests = _marker_digests(cfg.models_path)
+    misses = {}
+    for model, source in sources.items():
+        if model not in marker_digests:
+            misses[model] = None
+            continue
+        key = _alignment_key(cfg.aln_method, marker_digests[model], source)
+        if cache.fetch(key, {"aligned.faa": os.path.join(aligned_dir, model + ".faa")}) is None:
+            misses[model] = key
+    hits = len(sources) - len(misses)
+    cfg.alignment_cache_counts["hits"] = cfg.alignment_cache_counts.get("hits", 0) + hits
+    cfg.alignment_cache_counts["misses"] = cfg.alignment_cache_counts.get("misses", 0) + len(misses)
+    print(f"-... alignment cache {cache.directory}: reused {hits} of {len(sources)} markers")
+    return misses
+
+
+def _store_alignments(cfg: Config, aligned_dir: str, misses: dict[str, str | None]) -> None:
+    cache = cfg.cache("alignments")
+    if cache is None:
+        return
+    for model, key in misses.items():
+        aligned_path = os.path.join(aligned_dir, model + ".faa")
+        if key is not None and os.path.exists(aligned_path):
+            cache.store(key, {"aligned.faa": aligned_path}, {"method": cfg.aln_method, "marker": model})
+    evicted = cache.evict()
+    if evicted:
+        print(f"-... alignment cache: evicted {len(evicted)} entries")
 
 
 def run_alignment(
@@ -109,23 +241,55 @@ def run_alignment(
     *,
     extracted_seqs_dir: str | None = None,
     aligned_dir: str | None = None,
+    markers: set[str] | None = None,
+    sequences: dict[str, list[tuple[str, str]]] | None = None,
+    reuse_aligned_dir: str | None = None,
 ):
     """Run sequence alignment using the configured method.
 
     By default this uses the standard extracted/aligned directories from the
     config, but marker-selection cleanup can provide alternate directories when
-    alignments need to be rebuilt from cleaned sequence sets.
+    alignments need to be rebuilt from cleaned sequence sets. ``markers``
+    limits alignment to those markers (``--update`` keeps the other existing
+    alignments). ``sequences`` hands the per-model hit sequences from
+    extraction straight to hmmalign instead of reading extracted_seqs/.
+    With hmmalign, ``reuse_aligned_dir`` names earlier alignments of
+    supersets of the sequences (marker-selection cleanup only removes
+    sequences); they are cut down to the remaining rows instead of aligned
+    again, and only markers they do not cover are run through hmmalign.
+    With ``--cache_dir``, every marker is first looked up in the
+    ``alignments`` cache by method, marker HMM and sequence set.
     """
     extracted_seqs_dir = extracted_seqs_dir or cfg.extracted_seqs_dir
     aligned_dir = aligned_dir or cfg.aligned_dir
     os.makedirs(aligned_dir, exist_ok=True)
 
+    if sequences is not None:
+        if cfg.aln_method != "hmmalign":
+            raise ValueError(f"in-memory sequences are only aligned with hmmalign, not {cfg.aln_method}")
+        if markers is not None:
+            sequences = {model: records for model, records in sequences.items() if model in markers}
+        print(f"- ...running {cfg.aln_method}")
+        misses = _fetch_cached_alignments(cfg, aligned_dir, sequences)
+        if cfg.cache_dir:
+            sequences = {model: records for model, records in sequences.items() if model in misses}
+        _run_hmmalign_pool(cfg, [(aligned_dir, model, records) for model, records in sequences.items()])
+        _store_alignments(cfg, aligned_dir, misses)
+        return
+
     files = [
         os.path.basename(f)
         for f in glob.glob(os.path.join(extracted_seqs_dir, "*"))
     ]
+    if markers is not None:
+        files = [f for f in files if f.split(".")[0] in markers]
 
     print(f"- ...running {cfg.aln_method}")
+    misses = _fetch_cached_alignments(
+        cfg, aligned_dir, {f.split(".")[0]: os.path.join(extracted_seqs_dir, f) for f in files}
+    )
+    if cfg.cache_dir:
+        files = [f for f in files if f.split(".")[0] in misses]
 
     if cfg.aln_method == "mafft":
         small = []
@@ -154,10 +318,23 @@ def run_alignment(
         map_threaded(_run_mafft_linsi, large, max(1, min(len(large), cfg.num_cpus // large_threads if large else 1)))
         map_threaded(_run_mafft_linsi, small, cfg.num_cpus)
     else:
-        split_dir = os.path.join(cfg.outdir, "models_split")
-        _split_models(cfg.models_path, split_dir)
-        n_jobs = max(1, min(cfg.num_cpus, len(files) if files else 1))
-        map_processed(_run_hmmalign, [
-            (extracted_seqs_dir, aligned_dir, os.path.join(split_dir, f"{f.split('.')[0]}.hmm"), f)
+        if reuse_aligned_dir is not None:
+            realign = []
+            for f in files:
+                model = f.split(".")[0]
+                source = os.path.join(reuse_aligned_dir, model + ".faa")
+                dest = os.path.join(aligned_dir, model + ".faa")
+                if not (os.path.exists(source) and _subset_alignment(source, os.path.join(extracted_seqs_dir, f), dest)):
+                    realign.append(f)
+            print(f"-... reused {len(files) - len(realign)} of {len(files)} alignments from {reuse_aligned_dir}")
+            files = realign
+        _run_hmmalign_pool(cfg, [
+            (aligned_dir, f.split(".")[0], os.path.join(extracted_seqs_dir, f))
             for f in files
-        ], n_jobs)
+        ])
+    _store_alignments(cfg, aligned_dir, misses)
+
+
+def _run_hmmalign_pool(cfg: Config, tasks: list) -> None:
+    n_jobs = max(1, min(cfg.num_cpus, len(tasks) if tasks else 1))
+    map_processed(_run_hmmalign, tasks, n_jobs, initializer=_load_hmm_registry, initargs=(cfg.models_path,))
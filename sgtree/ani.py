@@ -13,6 +13,7 @@ import numpy as np
 from Bio import SeqIO
 import pandas as pd
 
+from sgtree.compression import open_text
 from sgtree.id_schema import build_sequence_id, parse_sequence_id, sanitize_token
 
 
@@ -62,14 +63,14 @@ def _protein_marker_hits(
     cpus: int,
 ) -> list[dict[str, object]]:
     try:
-        from pyhmmer import easel, hmmer, plan7
+        from pyhmmer import easel, hmmer
+
+        from sgtree.marker_db import load_models
     except ImportError as exc:
         raise RuntimeError("SNP-tree UNI56 contig filtering requires pyhmmer in the SGTree environment") from exc
 
-    with plan7.HMMFile(str(models_path)) as hmm_file:
-        hmms = list(hmm_file)
-    if not hmms:
-        raise ValueError(f"No HMM profiles found in marker set: {models_path}")
+    # parsed once per run and shared with the search stage
+    markers = load_models(str(models_path))
 
     base_opts: dict[str, object] = {}
     if hmmsearch_cutoff == "cut_ga":
@@ -86,11 +87,8 @@ def _protein_marker_hits(
     search_opts["cpus"] = max(1, cpus)
     rows: list[dict[str, object]] = []
     try:
-        with easel.SequenceFile(str(proteome_path), digital=True, alphabet=hmms[0].alphabet) as seq_file:
-            for hmm_profile, hits in zip(hmms, hmmer.hmmsearch(hmms, seq_file, **search_opts)):
-                marker_name = hmm_profile.name
-                if isinstance(marker_name, bytes):
-                    marker_name = marker_name.decode("utf-8", errors="replace")
+        with easel.SequenceFile(str(proteome_path), digital=True, alphabet=markers.alphabet) as seq_file:
+            for marker_name, hits in zip(markers.names, hmmer.hmmsearch(markers.profiles, seq_file, **search_opts)):
                 for hit in hits:
                     hit_name = hit.name
                     if isinstance(hit_name, bytes):
@@ -131,7 +129,7 @@ def _gene_call_record(record: GenomeRecord, outdir: Path) -> Path:
     outdir.mkdir(parents=True, exist_ok=True)
     proteome_path = outdir / f"{record.genome_id}.faa"
     gene_finder = pyrodigal.GeneFinder(meta=True)
-    with open(record.assembly_path) as handle, proteome_path.open("w") as out_handle:
+    with open_text(record.assembly_path) as handle, proteome_path.open("w") as out_handle:
         for contig_index, seq_record in enumerate(SeqIO.parse(handle, "fasta"), start=1):
             contig_header = seq_record.id or seq_record.description or f"contig_{contig_index:06d}"
             contig_id = _assembly_contig_id(contig_header, f"contig_{contig_index:06d}")
@@ -336,7 +334,7 @@ def _write_filtered_assembly(
     kept_contigs: set[str],
     out_path: str | Path,
 ) -> None:
-    with open(assembly_path) as handle, open(out_path, "w") as out_handle:
+    with open_text(str(assembly_path)) as handle, open(out_path, "w") as out_handle:
         for index, record in enumerate(SeqIO.parse(handle, "fasta"), start=1):
             contig_id = _assembly_contig_id(record.id or record.description, f"contig_{index:06d}")
             if contig_id in kept_contigs:
@@ -1153,7 +1151,7 @@ def build_snp_trees(
                 continue
             assembly_paths = {genome_id: str(path) for genome_id, path in filtered_paths.items()}
 
-        with open(str(assembly_paths[representative])) as handle:
+        with open_text(str(assembly_paths[representative])) as handle:
             reference_sequences = {
                 record.id: str(record.seq).upper()
                 for record in SeqIO.parse(handle, "fasta")
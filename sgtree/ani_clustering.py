@@ -5,26 +5,23 @@ import shutil
 from pathlib import Path
 
 import pandas as pd
-from Bio import SeqIO
 
 from sgtree import ani as ani_core
+from sgtree.compression import compression_suffix, with_compression_variants
 from sgtree.config import Config
-from sgtree.id_schema import sanitize_token
-from sgtree.input_stage import NUCLEOTIDE_EXTENSIONS, detect_input_format
+from sgtree.input_stage import (
+    GenomeInput,
+    NUCLEOTIDE_EXTENSIONS,
+    detect_input_format,
+    gene_call_inputs,
+    scan_genome_inputs,
+)
 
 
 QUERY_MANIFEST_NAME = "query_manifest.tsv"
 REF_MANIFEST_NAME = "ref_manifest.tsv"
-
-
-def _fasta_stats(path: Path) -> tuple[int, int]:
-    contigs = 0
-    total_bases = 0
-    with path.open() as handle:
-        for record in SeqIO.parse(handle, "fasta"):
-            contigs += 1
-            total_bases += len(record.seq)
-    return contigs, total_bases
+# skani and minimap2 read gzip-compressed assemblies natively, but not bzip2/xz.
+ANI_BACKEND_COMPRESSION = ("", ".gz")
 
 
 def _list_nucleotide_files(input_dir: str) -> list[Path]:
@@ -32,7 +29,7 @@ def _list_nucleotide_files(input_dir: str) -> list[Path]:
     if not directory.is_dir():
         raise ValueError(f"ANI clustering currently requires a genome directory, got: {input_dir}")
     paths: list[Path] = []
-    for ext in NUCLEOTIDE_EXTENSIONS:
+    for ext in with_compression_variants(NUCLEOTIDE_EXTENSIONS):
         paths.extend(sorted(directory.glob(f"*{ext}")))
     unique = sorted({path.resolve() for path in paths if path.is_file()}, key=lambda path: path.name)
     if not unique:
@@ -40,28 +37,53 @@ def _list_nucleotide_files(input_dir: str) -> list[Path]:
     return unique
 
 
-def _discover_inputs(input_dir: str, source: str) -> list[dict[str, object]]:
+def _discover_files(input_dir: str, source: str) -> list[str]:
     if detect_input_format(input_dir) != "fna":
         raise ValueError(
             f"ANI clustering requires nucleotide genomes for {source}, but {input_dir} did not resolve to FNA input"
         )
-    rows: list[dict[str, object]] = []
-    for path in _list_nucleotide_files(input_dir):
-        contigs, total_bases = _fasta_stats(path)
-        genome_id = sanitize_token(path.stem, path.stem)
-        rows.append(
-            {
-                "genome_id": genome_id,
-                "input_format": "fna",
-                "source_file": str(path),
-                "assembly_path": str(path),
-                "staged_proteome_path": "",
-                "contigs": contigs,
-                "total_bases": total_bases,
-                "source_role": source,
-            }
+    paths = _list_nucleotide_files(input_dir)
+    unsupported = [path.name for path in paths if compression_suffix(str(path)) not in ANI_BACKEND_COMPRESSION]
+    if unsupported:
+        raise ValueError(
+            "ANI clustering backends read plain or gzip-compressed assemblies only; "
+            f"recompress these {source} inputs with gzip: {', '.join(unsupported)}"
         )
-    return rows
+    return [str(path) for path in paths]
+
+
+def _call_query_inputs(cfg: Config, query_dir: str) -> list[GenomeInput]:
+    """Gene-call every query assembly once; contig and base counts come from the same parse.
+
+    The staging step links the representatives' proteomes from here instead
+    of parsing their assemblies again, and SNP trees read the proteomes of
+    the other cluster members through the manifest.
+    """
+    staged = gene_call_inputs(
+        query_dir,
+        cfg.ani_staged_proteomes_dir,
+        cfg.ani_gene_call_map_path,
+        num_workers=cfg.num_cpus,
+        cache=cfg.cache("staging"),
+        files=_discover_files(query_dir, "query"),
+    )
+    return list(staged.genomes)
+
+
+def _manifest_rows(genomes: list[GenomeInput], source: str) -> list[dict[str, object]]:
+    return [
+        {
+            "genome_id": genome.genome_id,
+            "input_format": genome.input_format,
+            "source_file": genome.source_file,
+            "assembly_path": genome.assembly_path,
+            "staged_proteome_path": genome.staged_proteome_path,
+            "contigs": genome.contigs,
+            "total_bases": genome.total_bases,
+            "source_role": source,
+        }
+        for genome in genomes
+    ]
 
 
 def _write_manifest(rows: list[dict[str, object]], path: Path) -> None:
@@ -93,9 +115,25 @@ def _manifest_paths(cfg: Config) -> tuple[Path, Path | None]:
 
 def prepare_ani_cluster_inputs(cfg: Config) -> pd.DataFrame:
     os.makedirs(cfg.ani_dir, exist_ok=True)
-    query_rows = _discover_inputs(cfg.original_genomedir or cfg.genomedir, "query")
+    query_dir = cfg.original_genomedir or cfg.genomedir
+    query_genomes = _call_query_inputs(cfg, query_dir)
+    cfg.staged_inputs[query_dir] = query_genomes
+    query_rows = _manifest_rows(query_genomes, "query")
     ref_source_dir = cfg.original_ref or cfg.ref
-    ref_rows = _discover_inputs(ref_source_dir, "ref") if ref_source_dir else []
+    # references are gene-called by their own reference run; only their sizes are needed here
+    ref_rows = (
+        _manifest_rows(
+            scan_genome_inputs(
+                ref_source_dir,
+                input_format="fna",
+                files=_discover_files(ref_source_dir, "ref"),
+                num_workers=cfg.num_cpus,
+            ),
+            "ref",
+        )
+        if ref_source_dir
+        else []
+    )
 
     query_manifest, ref_manifest = _manifest_paths(cfg)
     _write_manifest(query_rows, query_manifest)
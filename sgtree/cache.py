@@ -0,0 +1,249 @@
+"""Content-addressed on-disk caches shared between SGTree runs.
+
+Entries live under ``<root>/<namespace>/<key[:2]>/<key>/`` and hold a few
+files plus an ``entry.json`` metadata record. Entries are published with an
+atomic directory rename and evicted by renaming them aside before deletion,
+so concurrent runs can share one cache root: a reader that loses a race with
+eviction simply sees a miss.
+
+``python -m sgtree.cache info|prune <cache_dir>`` inspects and trims a cache
+root outside of a run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+
+
+CACHE_META_FILE = "entry.json"
+# staging and eviction leftovers of killed runs are removed once this old
+LEFTOVER_GRACE_SECONDS = 6 * 3600
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's raw bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_digest(*parts: object) -> str:
+    """SHA-256 over the string form of ``parts`` (used to build cache keys)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    key: str
+    path: str
+    size: int
+    last_used: float
+
+
+@dataclass(frozen=True)
+class DiskCache:
+    root: str
+    namespace: str
+    max_bytes: int = 0
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(self.root, self.namespace)
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def fetch(self, key: str, targets: dict[str, str]) -> dict | None:
+        """Copy cached files (entry name -> destination path); return metadata or None on a miss."""
+        entry = self.entry_path(key)
+        try:
+            with open(os.path.join(entry, CACHE_META_FILE)) as handle:
+                meta = json.load(handle)
+            for name, dest in targets.items():
+                shutil.copyfile(os.path.join(entry, name), dest)
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def store(self, key: str, files: dict[str, str], meta: dict) -> bool:
+        """Publish files (entry name -> source path) under ``key``.
+
+        Returns False when the entry already exists, for example because a
+        concurrent run published the same key first.
+        """
+        entry = self.entry_path(key)
+        if os.path.isdir(entry):
+            return False
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".tmp_", dir=self.directory)
+        try:
+            for name, src in files.items():
+                shutil.copyfile(src, os.path.join(staging, name))
+            with open(os.path.join(staging, CACHE_META_FILE), "w") as handle:
+                json.dump(meta, handle, sort_keys=True)
+            os.rename(staging, entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            return False
+        return True
+
+    def entries(self) -> list[CacheEntry]:
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for prefix in sorted(os.listdir(self.directory)):
+            prefix_dir = os.path.join(self.directory, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+                continue
+            for key in sorted(os.listdir(prefix_dir)):
+                path = os.path.join(prefix_dir, key)
+                if "." in key or not os.path.isdir(path):
+                    continue
+                try:
+                    size = sum(
+                        os.path.getsize(os.path.join(path, name))
+                        for name in os.listdir(path)
+                    )
+                    last_used = os.path.getmtime(path)
+                except OSError:
+                    continue
+                entries.append(CacheEntry(key=key, path=path, size=size, last_used=last_used))
+        return entries
+
+    def total_bytes(self) -> int:
+        return sum(entry.size for entry in self.entries())
+
+    def remove_leftovers(self, grace_seconds: float = LEFTOVER_GRACE_SECONDS) -> int:
+        """Delete ``.tmp_*`` staging and ``*.evict-*`` trash directories older than ``grace_seconds``.
+
+        A run killed between staging and publishing an entry, or between
+        renaming an evicted entry aside and deleting it, leaves these
+        behind; ``entries()`` skips them, so they would never be counted or
+        evicted. The grace period keeps the staging directories of live
+        concurrent runs.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        candidates = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.startswith(".tmp_")
+        ]
+        for prefix in os.listdir(self.directory):
+            prefix_dir = os.path.join(self.directory, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+                continue
+            candidates.extend(
+                os.path.join(prefix_dir, name)
+                for name in os.listdir(prefix_dir)
+                if ".evict-" in name
+            )
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for path in candidates:
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def evict(self, max_bytes: int | None = None) -> list[CacheEntry]:
+        """Remove least-recently-used entries until the namespace fits ``max_bytes``.
+
+        Leftovers of killed runs (see :meth:`remove_leftovers`) are removed first.
+        """
+        self.remove_leftovers()
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        if limit <= 0 and max_bytes is None:
+            return []
+        entries = sorted(self.entries(), key=lambda entry: entry.last_used)
+        total = sum(entry.size for entry in entries)
+        removed = []
+        for entry in entries:
+            if total <= limit:
+                break
+            trash = f"{entry.path}.evict-{os.getpid()}"
+            try:
+                os.rename(entry.path, trash)
+            except OSError:
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= entry.size
+            removed.append(entry)
+        return removed
+
+
+def cache_namespaces(root: str) -> list[str]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and os.path.isdir(os.path.join(root, name))
+    )
+
+
+def _format_time(stamp: float) -> str:
+    return datetime.datetime.fromtimestamp(stamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect and prune an SGTree --cache_dir")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    info = subparsers.add_parser("info", help="Show entry counts, sizes and last use per namespace")
+    info.add_argument("cache_dir")
+    info.add_argument("--namespace", default=None, help="limit to one namespace (staging, hits, ...)")
+
+    prune = subparsers.add_parser("prune", help="Evict least-recently-used entries down to a size")
+    prune.add_argument("cache_dir")
+    prune.add_argument("--namespace", default=None, help="limit to one namespace (staging, hits, ...)")
+    prune.add_argument("--max_gb", type=float, required=True,
+                       help="keep at most this many GB per namespace (0 empties it)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    namespaces = [args.namespace] if args.namespace else cache_namespaces(args.cache_dir)
+    if args.command == "info":
+        print("namespace\tentries\tsize_gb\toldest_use\tnewest_use")
+        for namespace in namespaces:
+            entries = DiskCache(args.cache_dir, namespace).entries()
+            used = [entry.last_used for entry in entries]
+            print(
+                f"{namespace}\t{len(entries)}\t{sum(entry.size for entry in entries) / 1024 ** 3:.3f}"
+                f"\t{_format_time(min(used)) if used else '-'}\t{_format_time(max(used)) if used else '-'}"
+            )
+    elif args.command == "prune":
+        if args.max_gb < 0:
+            raise ValueError("--max_gb must be >= 0")
+        for namespace in namespaces:
+            cache = DiskCache(args.cache_dir, namespace)
+            removed = cache.evict(max_bytes=int(args.max_gb * 1024 ** 3))
+            print(
+                f"-... {namespace}: evicted {len(removed)} entries "
+                f"({sum(entry.size for entry in removed) / 1024 ** 3:.3f} GB), "
+                f"{len(cache.entries())} left"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Per-run DuckDB catalog of genomes, proteins, hits, selections and timings.
+
+The catalog replaces the text tables that stages used to hand to each other
+(``table_elim_dups``, ``marker_count_matrix.csv``, ``proteomes_header_map.tsv``
+and ``marker_selection_rf_values.txt``). Stages write through short-lived
+read-write connections from the main process; workers open read-only
+connections and select just the rows and columns they need.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import os
+from dataclasses import dataclass
+from typing import Iterable
+
+import pandas as pd
+
+from sgtree.id_schema import parse_savedname
+from sgtree.input_stage import GenomeInput
+
+
+CATALOG_FILENAME = "catalog.duckdb"
+
+HIT_COLUMNS = ("savedname", "genome_id", "contig_id", "gene_id", "marker", "namemodel", "score_bits")
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as exc:
+        raise RuntimeError("--catalog requires duckdb in the SGTree environment") from exc
+    return duckdb
+
+
+@dataclass(frozen=True)
+class RunCatalog:
+    path: str
+
+    def connect(self, read_only: bool = False):
+        return _duckdb().connect(self.path, read_only=read_only)
+
+    def reset(self) -> None:
+        for suffix in ("", ".wal"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def _replace_table(self, name: str, frame: pd.DataFrame) -> None:
+        with self.connect() as con:
+            con.register("frame", frame)
+            con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM frame")
+            con.unregister("frame")
+
+    # --- writers (main process only) -------------------------------------
+
+    def record_genomes(self, genomes: Iterable[GenomeInput]) -> None:
+        rows = [dataclasses.asdict(genome) for genome in genomes]
+        columns = [field.name for field in dataclasses.fields(GenomeInput)]
+        self._replace_table("genomes", pd.DataFrame(rows, columns=columns))
+
+    def record_proteins(self, map_path: str, append: bool = False) -> None:
+        """Load the normalization header map (one row per normalized protein).
+
+        ``append`` adds the rows to an existing table (``--update`` runs).
+        """
+        source = (
+            "SELECT * FROM read_csv(?, delim='\t', header=true, quote='', escape='', all_varchar=true)"
+        )
+        with self.connect() as con:
+            if append and _has_table(con, "proteins"):
+                con.execute(f"INSERT INTO proteins BY NAME {source}", [map_path])
+            else:
+                con.execute(f"CREATE OR REPLACE TABLE proteins AS {source}", [map_path])
+
+    def record_sequence_members(self, members_path: str) -> None:
+        """Load the ``--dedup_sequences`` map of proteins to the representative searched for them."""
+        with self.connect() as con:
+            con.execute(
+                "CREATE OR REPLACE TABLE sequence_members AS "
+                "SELECT * FROM read_csv(?, delim='\t', header=true, quote='', escape='', all_varchar=true)",
+                [members_path],
+            )
+
+    def record_marker_counts(
+        self,
+        dict_counts: dict[str, dict[str, int]],
+        removed_reasons: dict[str, list[str]],
+    ) -> None:
+        """Store per-genome marker copy counts and genome filter decisions.
+
+        Insertion order is kept in ``genome_rank``/``marker_rank`` so
+        :meth:`kept_marker_counts` rebuilds exactly the dict the search stage
+        used for ``marker_count_matrix.csv``.
+        """
+        counts = pd.DataFrame(
+            [
+                (genome, marker, copies, genome_rank, marker_rank, genome not in removed_reasons)
+                for genome_rank, (genome, markers) in enumerate(dict_counts.items())
+                for marker_rank, (marker, copies) in enumerate(markers.items())
+            ],
+            columns=["genome_id", "marker", "copies", "genome_rank", "marker_rank", "kept"],
+        )
+        filters = pd.DataFrame(
+            [
+                (genome, reason)
+                for genome in sorted(removed_reasons)
+                for reason in removed_reasons[genome]
+            ],
+            columns=["genome_id", "reason"],
+        )
+        self._replace_table("marker_counts", counts)
+        self._replace_table("genome_filters", filters)
+
+    def record_hits(self, df_fordups: pd.DataFrame, dropped: pd.DataFrame) -> None:
+        """Store the deduplicated hit table and the rows removed by the per-marker copy cap.
+
+        ``contig_markers`` (distinct markers hit on the same contig) is
+        computed once here instead of in every marker-selection worker.
+        """
+        hits = df_fordups.reset_index(drop=True).copy()
+        if not {"genome_id", "contig_id", "gene_id"} <= set(hits.columns):
+            # reference tables from older runs only carry savedname
+            parsed = hits["savedname"].astype(str).apply(parse_savedname)
+            hits["genome_id"] = parsed.str[0]
+            hits["contig_id"] = parsed.str[1]
+            hits["gene_id"] = parsed.str[2]
+        hits["marker"] = hits["namemodel"].astype(str).str.split("/").str[-1]
+        hits = hits[list(HIT_COLUMNS)]
+        caps = dropped.reset_index(drop=True)[["savedname", "namemodel", "score_bits"]]
+        with self.connect() as con:
+            con.register("frame", hits)
+            con.execute(
+                """
+                CREATE OR REPLACE TABLE hits AS
+                SELECT frame.*, coalesce(support.contig_markers, 1) AS contig_markers
+                FROM frame
+                LEFT JOIN (
+                    SELECT genome_id, contig_id, count(DISTINCT marker)::INTEGER AS contig_markers
+                    FROM frame GROUP BY genome_id, contig_id
+                ) AS support USING (genome_id, contig_id)
+                """
+            )
+            con.unregister("frame")
+        self._replace_table("duplicate_caps", caps)
+
+    def record_selection(self, round_idx: int, records: list[dict]) -> None:
+        frame = pd.DataFrame(
+            [
+                (
+                    round_idx,
+                    record["protein_id"],
+                    record["marker"],
+                    record["genome"],
+                    float(record["rf_distance"]),
+                    record["status"],
+                )
+                for record in records
+            ],
+            columns=["round", "protein_id", "marker", "genome_id", "rf_distance", "status"],
+        )
+        with self.connect() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS selections (round INTEGER, protein_id VARCHAR, marker VARCHAR, "
+                "genome_id VARCHAR, rf_distance DOUBLE, status VARCHAR)"
+            )
+            con.execute("DELETE FROM selections WHERE round = ?", [round_idx])
+            con.register("frame", frame)
+            con.execute("INSERT INTO selections SELECT * FROM frame")
+            con.unregister("frame")
+
+    def record_timings(self, timings: dict, phase: str) -> None:
+        with self.connect() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS stage_timings (phase VARCHAR, stage VARCHAR, started TIMESTAMP, seconds DOUBLE)"
+            )
+            for stage, (started, seconds) in timings.items():
+                con.execute(
+                    "INSERT INTO stage_timings VALUES (?, ?, ?, ?)",
+                    [phase, stage, started, float(seconds)],
+                )
+
+    # --- readers ---------------------------------------------------------
+
+    def score_table(self, savednames: Iterable[str] | None = None) -> pd.DataFrame:
+        """Hit scores indexed by ``savedname``, optionally limited to ``savednames``."""
+        query = "SELECT savedname, score_bits, namemodel, genome_id, contig_id, contig_markers FROM hits"
+        params = []
+        if savednames is not None:
+            query += " WHERE savedname IN (SELECT unnest(?))"
+            params.append(list(savednames))
+        with self.connect(read_only=True) as con:
+            frame = con.execute(query, params).df()
+        return frame.set_index("savedname")
+
+    def contig_marker_context(self) -> dict[tuple[str, str], set[str]]:
+        with self.connect(read_only=True) as con:
+            rows = con.execute(
+                "SELECT DISTINCT genome_id, contig_id, marker FROM hits"
+            ).fetchall()
+        context: dict[tuple[str, str], set[str]] = {}
+        for genome_id, contig_id, marker in rows:
+            context.setdefault((str(genome_id), str(contig_id)), set()).add(str(marker))
+        return context
+
+    def kept_marker_counts(self) -> dict[str, dict[str, int]]:
+        with self.connect(read_only=True) as con:
+            rows = con.execute(
+                "SELECT genome_id, marker, copies FROM marker_counts WHERE kept "
+                "ORDER BY genome_rank, marker_rank"
+            ).fetchall()
+        counts: dict[str, dict[str, int]] = {}
+        for genome_id, marker, copies in rows:
+            counts.setdefault(genome_id, {})[marker] = int(copies)
+        return counts
+
+    def kept_assignments(self, round_idx: int | None = None) -> dict[tuple[str, str], str]:
+        """``(marker, genome) -> protein_id`` kept by marker selection (latest round by default)."""
+        with self.connect(read_only=True) as con:
+            if not _has_table(con, "selections"):
+                return {}
+            if round_idx is None:
+                round_idx = con.execute("SELECT max(round) FROM selections").fetchone()[0]
+            rows = con.execute(
+                "SELECT marker, protein_id FROM selections WHERE round = ? AND status = 'Kept'",
+                [round_idx],
+            ).fetchall()
+        return {(marker, protein_id.split("/")[0]): protein_id for marker, protein_id in rows}
+
+
+def _has_table(con, name: str) -> bool:
+    return bool(
+        con.execute(
+            "SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [name]
+        ).fetchone()[0]
+    )
+
@@ -9,8 +9,8 @@ def cleanup_basic(outdir: str):
     """Archive intermediate files for basic run (no marker selection)."""
     keep_extensions = {"txt", "png", "csv", "nwk"}
     keep_names = {"aligned_final", "concat", "tree.nwk", "hits.hmmout",
-                  "ref_and_query_proteomes", "marker_count_matrix.csv",
-                  "ani", "snp_trees", "genome_manifest.tsv"}
+                  "marker_count_matrix.csv",
+                  "ani", "snp_trees", "genome_manifest.tsv", "catalog.duckdb"}
 
     for filepath in glob.glob(os.path.join(outdir, "*")):
         basename = os.path.basename(filepath)
@@ -41,7 +41,7 @@ def cleanup_basic(outdir: str):
     for f in glob.glob(os.path.join(outdir, "*.zip")):
         shutil.move(f, os.path.join(outdir, "temp"))
 
-    for name in ("models", "proteomes", "table_elim_dups", "hits.hmmout", "ref_and_query_proteomes"):
+    for name in ("models", "proteomes", "proteomes.fai", "table_elim_dups", "hits.hmmout"):
         src = os.path.join(outdir, name)
         if os.path.exists(src):
             shutil.move(src, os.path.join(outdir, "temp"))
@@ -56,9 +56,9 @@ def cleanup_marker_selection(outdir: str):
     """Archive intermediate files for marker selection run."""
     keep_names = {
         "tree_final.nwk", "hits.hmmout", "marker_count_matrix.csv",
-        "ref_and_query_proteomes", "concat_final",
+        "concat_final",
         "marker_selection_rf_values.txt",
-        "ani", "snp_trees", "genome_manifest.tsv",
+        "ani", "snp_trees", "genome_manifest.tsv", "catalog.duckdb",
     }
 
     for filepath in glob.glob(os.path.join(outdir, "*")):
@@ -88,8 +88,8 @@ def cleanup_marker_selection(outdir: str):
     for f in glob.glob(os.path.join(outdir, "*.zip")):
         shutil.move(f, os.path.join(outdir, "temp"))
 
-    for name in ("models", "proteomes", "table_elim_dups", "tree.nwk",
-                  "hits.hmmout", "ref_and_query_proteomes"):
+    for name in ("models", "proteomes", "proteomes.fai", "table_elim_dups", "tree.nwk",
+                  "hits.hmmout"):
         src = os.path.join(outdir, name)
         if os.path.exists(src):
             shutil.move(src, os.path.join(outdir, "temp"))
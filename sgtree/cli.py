@@ -10,7 +10,7 @@ import shutil
 from sgtree.config import Config
 from sgtree import search, extract, align, duplicates, supermatrix, phylogeny
 from sgtree import render, sgtree_logging, cleanup, reference
-from sgtree import ani_clustering
+from sgtree import ani_clustering, update, shard
 
 os.environ["QT_QPA_PLATFORM"] = "offscreen"
 
@@ -87,6 +87,28 @@ def parse_args() -> Config:
                         help="internal flag, not for user use")
     parser.add_argument("--keep_intermediates", type=str, default="no",
                         help="keep intermediate directories/files instead of archiving them (yes/no)")
+    parser.add_argument("--debug_tables", type=str, default="no",
+                        help="write the per-step hit tables under tables/ even without --keep_intermediates (yes/no)")
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="shared on-disk cache for staged proteomes, hmmsearch hits and marker alignments, reused across runs (default: off)")
+    parser.add_argument("--cache_max_gb", type=float, default=20.0,
+                        help="evict least-recently-used cache entries beyond this size in GB")
+    parser.add_argument("--catalog", type=str, default="no",
+                        help="record genomes, proteins, hits, selections and timings in <outdir>/catalog.duckdb (yes/no)")
+    parser.add_argument("--legacy_tables", type=str, default="yes",
+                        help="with --catalog yes, still export the legacy text tables (yes/no)")
+    parser.add_argument("--hmmout", type=str, default=None,
+                        help="also export hmmsearch hits as the hits.hmmout domtblout (yes/no; default yes, no with --dedup_sequences yes)")
+    parser.add_argument("--dedup_sequences", type=str, default="no",
+                        help="hmmsearch identical proteins once and fan the hits out to every copy; turns off the hits.hmmout export and needs a cut_ga/cut_tc/cut_nc cutoff (yes/no)")
+    parser.add_argument("--search_chunk", type=int, default=20000,
+                        help="hmmsearch the proteome store in blocks of this many sequences; memory follows the block size (0: stream the store once per marker)")
+    parser.add_argument("--stage_only", type=str, default="no",
+                        help="stop after staging models and proteomes, e.g. to run search-shard on them (yes/no)")
+    parser.add_argument("--hits", type=str, default=None,
+                        help="resume a staged run from this hits.hmmout (e.g. written by search-merge) instead of running hmmsearch")
+    parser.add_argument("--update", type=str, default="no",
+                        help="add genomes new to --genomedir to the previous run in --save_dir (yes/no)")
     parser.add_argument("--ani_cluster", type=str, default="no",
                         help="collapse query+reference genomes by ANI before species-tree inference (yes/no)")
     parser.add_argument("--snp", type=str, default="no",
@@ -128,6 +150,19 @@ def parse_args() -> Config:
     is_ref = _parse_bool(args.is_ref, flag="--is_ref")
     lock_references = _parse_bool(args.lock_references, flag="--lock_references")
     keep_intermediates = _parse_bool(args.keep_intermediates, flag="--keep_intermediates")
+    debug_tables = _parse_bool(args.debug_tables, flag="--debug_tables")
+    catalog = _parse_bool(args.catalog, flag="--catalog")
+    legacy_tables = _parse_bool(args.legacy_tables, flag="--legacy_tables")
+    dedup_sequences = _parse_bool(args.dedup_sequences, flag="--dedup_sequences")
+    if args.hmmout is not None:
+        write_hmmout = _parse_bool(args.hmmout, flag="--hmmout")
+    else:
+        # the export of a deduplicated search would only list the distinct sequences
+        write_hmmout = not dedup_sequences
+        if dedup_sequences:
+            print("-... --dedup_sequences yes: hits.hmmout is not exported")
+    update = _parse_bool(args.update, flag="--update")
+    stage_only = _parse_bool(args.stage_only, flag="--stage_only")
     ani_cluster = _parse_bool(args.ani_cluster, flag="--ani_cluster")
     snp = _parse_bool(args.snp, flag="--snp")
     if args.max_dupl != -1.0 and not (0.0 <= args.max_dupl <= 1.0):
@@ -150,6 +185,26 @@ def parse_args() -> Config:
         raise ValueError("--snp_tree_min_cluster_size must be >= 2")
     if snp and not ani_cluster:
         raise ValueError("--snp requires --ani_cluster yes")
+    if args.cache_max_gb <= 0:
+        raise ValueError("--cache_max_gb must be > 0")
+    if args.search_chunk < 0:
+        raise ValueError("--search_chunk must be >= 0")
+    if update and not args.save_dir:
+        raise ValueError("--update requires --save_dir pointing at the previous run")
+    if update and ani_cluster:
+        raise ValueError("--update cannot be combined with --ani_cluster yes")
+    if update and args.hmmsearch_cutoff not in ("cut_ga", "cut_tc", "cut_nc"):
+        raise ValueError("--update needs a cut_ga, cut_tc or cut_nc --hmmsearch_cutoff")
+    if dedup_sequences and write_hmmout:
+        raise ValueError("--dedup_sequences yes cannot export hits.hmmout: it would only list the distinct sequences")
+    if dedup_sequences and (update or is_ref):
+        raise ValueError("--dedup_sequences yes cannot be combined with --update or --is_ref, which read hits.hmmout back")
+    if dedup_sequences and args.hmmsearch_cutoff not in ("cut_ga", "cut_tc", "cut_nc"):
+        raise ValueError("--dedup_sequences yes needs a cut_ga, cut_tc or cut_nc --hmmsearch_cutoff")
+    if args.hits and (update or stage_only):
+        raise ValueError("--hits cannot be combined with --update or --stage_only")
+    if args.hits and not os.path.isfile(args.hits):
+        raise ValueError(f"--hits file does not exist: {args.hits}")
 
     return Config(
         genomedir=genomedir,
@@ -178,7 +233,19 @@ def parse_args() -> Config:
         singles_mode=args.singles_mode,
         num_nei=args.num_nei,
         singles_min_rfdist=args.singles_min_rfdist,
-        keep_intermediates=keep_intermediates,
+        # an updated run stays updatable
+        keep_intermediates=keep_intermediates or update,
+        debug_tables=debug_tables,
+        cache_dir=os.path.abspath(args.cache_dir) if args.cache_dir else None,
+        cache_max_gb=args.cache_max_gb,
+        catalog=catalog,
+        legacy_tables=legacy_tables,
+        update=update,
+        write_hmmout=write_hmmout,
+        dedup_sequences=dedup_sequences,
+        search_chunk=args.search_chunk,
+        stage_only=stage_only,
+        hits_table=os.path.abspath(args.hits) if args.hits else None,
         is_ref=is_ref,
         start_time=start_time,
         ani_cluster=ani_cluster,
@@ -237,6 +304,15 @@ def main():
           f" SNP tree min cluster size {cfg.snp_tree_min_cluster_size}\n"
           f" reference directory {cfg.ref}\n"
           f" keep intermediates {'yes' if cfg.keep_intermediates else 'no'}\n"
+          f" debug tables {'yes' if cfg.write_intermediate_tables else 'no'}\n"
+          f" run catalog {'yes' if cfg.catalog else 'no'}\n"
+          f" legacy tables {'yes' if cfg.write_legacy_tables else 'no'}\n"
+          f" update previous run {'yes' if cfg.update else 'no'}\n"
+          f" hits.hmmout export {'yes' if cfg.export_hmmout else 'no'}\n"
+          f" deduplicate sequences {'yes' if cfg.dedup_sequences else 'no'}\n"
+          f" hmmsearch block size {cfg.search_chunk or 'all'}\n"
+          f" stage only {'yes' if cfg.stage_only else 'no'}\n"
+          f" resume from hits {cfg.hits_table or 'no'}\n"
           f" --marker_selection {'yes' if cfg.marker_selection else 'no'}\n")
     if cfg.ref:
         print(f"--ref_concat {cfg.ref_dir_path()}\n")
@@ -244,8 +320,17 @@ def main():
         print("--ref_concat no reference directory\n")
     print("=" * 80)
 
+    update_plan = None
+    if cfg.update:
+        update_plan = update.plan_update(cfg)
+        if not update_plan.new_files:
+            print(f"-... update: no new genomes in {cfg.genomedir}, {cfg.outdir} is up to date")
+            return
+        print(f"-... update: {len(update_plan.new_files)} new genomes, "
+              f"{len(update_plan.previous)} from the previous run")
+
     # clean previous runs
-    if os.path.exists(os.path.join(cfg.outdir, "tree.nwk")) or \
+    elif os.path.exists(os.path.join(cfg.outdir, "tree.nwk")) or \
        os.path.exists(os.path.join(cfg.outdir, "tree_final.nwk")):
         for f in glob.glob(os.path.join(cfg.outdir, "*")):
             if os.path.isdir(f):
@@ -256,24 +341,45 @@ def main():
     timings = {}
 
     try:
-        # Step 1: Concatenate inputs
-        cfg.model_count = search.concat_inputs(cfg)
-
-        # Step 2: Run hmmsearch
-        t0 = datetime.datetime.now()
-        search_time = search.run_hmmsearch(cfg)
+        if update_plan is not None:
+            # Steps 1-2: stage and search only the new genomes, append to the run
+            t0 = datetime.datetime.now()
+            new_genomes, search_time = update.add_genomes(cfg, update_plan)
+            hits = None
+        else:
+            # Step 1: Concatenate inputs
+            cfg.model_count = search.concat_inputs(cfg)
+            if cfg.stage_only:
+                print(f"-... staged {cfg.proteomes_path} and {cfg.models_path}; search them with "
+                      f"'sgtree search-shard', merge with 'sgtree search-merge' and resume with --hits")
+                return
+
+            # Step 2: Run hmmsearch
+            t0 = datetime.datetime.now()
+            if cfg.hits_table:
+                print(f"-... resuming from hits in {cfg.hits_table}")
+                if not shard.check_merged_hits(cfg.hits_table, cfg.proteomes_path, cfg.models_path,
+                                               cfg.hmmsearch_cutoff, cfg.hmmsearch_evalue):
+                    print(f"-... {cfg.hits_table} has no search-merge sidecar; its search settings are not checked")
+                hits, search_time = search.read_hit_table(cfg.hits_table), 0.0
+                if cfg.export_hmmout and cfg.hits_table != os.path.abspath(cfg.hitsoutdir):
+                    shutil.copyfile(cfg.hits_table, cfg.hitsoutdir)
+            else:
+                hits, search_time = search.run_hmmsearch(cfg)
         timings["running hmmsearch"] = (t0, search_time)
 
         # Step 3: Parse results and build working df
         t0 = datetime.datetime.now()
         t_start = time.time()
-        finaldf, dict_counts = search.parse_hmmsearch(cfg)
+        finaldf, dict_counts = search.parse_hmmsearch(cfg, hits)
         df, df_fordups = search.build_working_df(cfg, finaldf)
         extract_time = time.time() - t_start
 
         # Step 4: Extract sequences
-        extract.extract_hits(cfg, df)
-        extract.write_extracted_sequences(cfg)
+        marker_sequences = extract.extract_sequences(cfg, extract.extract_hits(cfg, df))
+        if cfg.write_extracted_sequences:
+            extract.write_extracted_sequences(cfg, marker_sequences)
+            marker_sequences = None
         extract_time = time.time() - t_start
         print(f"\nextraction of best hits done - runtime: {extract_time:.1f} seconds")
         print("=" * 80)
@@ -282,7 +388,16 @@ def main():
         # Step 5: Alignment
         t0 = datetime.datetime.now()
         t_start = time.time()
-        align.run_alignment(cfg)
+        if update_plan is not None:
+            stale = update.remove_stale_markers(cfg, df)
+            if stale:
+                print(f"-... update: removed {len(stale)} markers without retained hits: {', '.join(stale)}")
+            markers = update.affected_markers(df, cfg.aligned_dir)
+            print(f"-... update: realigning {len(markers)} markers whose retained hits changed")
+            align.run_alignment(cfg, markers=markers, sequences=marker_sequences)
+        else:
+            align.run_alignment(cfg, sequences=marker_sequences)
+        marker_sequences = None
         aln_time = time.time() - t_start
         print(f"\nalignment done - runtime: {aln_time:.1f} seconds")
         print("=" * 80 + "\n")
@@ -338,6 +453,8 @@ def main():
         # Write logfile
         print(sys.argv[:])
         sgtree_logging.write_logfile(cfg, timings)
+        if cfg.catalog:
+            cfg.run_catalog().record_timings(timings, phase="species_tree")
 
     except Exception as e:
         print(f"ERROR: {e.__doc__}\n {e}")
@@ -386,9 +503,10 @@ def main():
                     ls_refs,
                     species_tree_path=current_species_tree,
                     initial_kept=previous_kept,
+                    round_idx=round_idx,
                 )
                 rf_src = os.path.join(cfg.outdir, "marker_selection_rf_values.txt")
-                if total_rounds > 1:
+                if total_rounds > 1 and cfg.write_legacy_tables:
                     shutil.copyfile(
                         rf_src,
                         os.path.join(cfg.outdir, f"marker_selection_rf_values_round{round_idx}.txt"),
@@ -408,6 +526,7 @@ def main():
                     cfg,
                     extracted_seqs_dir=cleaned_seq_dir,
                     aligned_dir=aligned_final_dir,
+                    reuse_aligned_dir=cfg.aligned_dir,
                 )
 
                 print("- ...running trimal for final alignment:")
@@ -447,6 +566,8 @@ def main():
             ms_timings["Marker selection"] = (t0, ms_time)
 
             sgtree_logging.append_logfile(cfg, ms_timings)
+            if cfg.catalog:
+                cfg.run_catalog().record_timings(ms_timings, phase="marker_selection")
 
         except Exception as e:
             print(f"ERROR in marker selection: {e.__doc__}\n {e}")
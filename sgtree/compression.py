@@ -0,0 +1,59 @@
+"""Transparent access to gzip/bzip2/xz-compressed FASTA inputs."""
+
+from __future__ import annotations
+
+import bz2
+import gzip
+import lzma
+import os
+from typing import TextIO
+
+
+COMPRESSION_OPENERS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+}
+COMPRESSION_SUFFIXES = tuple(COMPRESSION_OPENERS)
+
+
+def compression_suffix(path: str) -> str:
+    """Return the compression suffix of ``path`` (``.gz``, ``.bz2``, ``.xz``) or ``""``."""
+    suffix = os.path.splitext(str(path))[1].lower()
+    return suffix if suffix in COMPRESSION_OPENERS else ""
+
+
+def strip_compression_suffix(path: str) -> str:
+    suffix = compression_suffix(path)
+    return str(path)[: -len(suffix)] if suffix else str(path)
+
+
+def fasta_extension(path: str) -> str:
+    """Lower-cased FASTA extension, looking through any compression suffix."""
+    return os.path.splitext(strip_compression_suffix(path))[1].lower()
+
+
+def fasta_stem(path: str) -> str:
+    """File name without compression and FASTA extensions (``GenomeA.faa.gz`` -> ``GenomeA``)."""
+    return os.path.splitext(os.path.basename(strip_compression_suffix(path)))[0]
+
+
+def with_compression_variants(extensions: tuple[str, ...]) -> tuple[str, ...]:
+    return tuple(
+        ext + suffix
+        for ext in extensions
+        for suffix in ("",) + COMPRESSION_SUFFIXES
+    )
+
+
+def open_text(path: str) -> TextIO:
+    """Open a plain or compressed FASTA file for streaming text reads.
+
+    Decompression happens on the fly in the calling thread/process; the input
+    stage fans files out to worker processes, so each worker decompresses its
+    own genome and no decompressed copy is written to disk.
+    """
+    opener = COMPRESSION_OPENERS.get(compression_suffix(path))
+    if opener is None:
+        return open(path)
+    return opener(path, "rt")
@@ -3,6 +3,9 @@ import glob
 import datetime
 from dataclasses import dataclass, field
 
+from sgtree.cache import DiskCache
+from sgtree.catalog import CATALOG_FILENAME, RunCatalog
+
 
 @dataclass
 class Config:
@@ -44,13 +47,31 @@ class Config:
     original_genomedir: str | None = None
     original_ref: str | None = None
     model_count: int = 0
+    cache_dir: str | None = None
+    cache_max_gb: float = 20.0
+    catalog: bool = False
+    legacy_tables: bool = True
+    update: bool = False
+    write_hmmout: bool = True
+    # sequences per hmmsearch block (same default as --search_chunk);
+    # 0 lets pyhmmer stream the store once per marker
+    search_chunk: int = 20000
+    stage_only: bool = False
+    debug_tables: bool = False
+    # search distinct sequences once and fan hits out to identical proteins
+    dedup_sequences: bool = False
+    # merged hits.hmmout to resume from instead of running hmmsearch
+    hits_table: str | None = None
 
     # derived paths (set in __post_init__)
     models_path: str = field(init=False)
     proteomes_path: str = field(init=False)
+    unique_proteomes_path: str = field(init=False)
+    sequence_members_path: str = field(init=False)
     staged_proteomes_dir: str = field(init=False)
     gene_call_map_path: str = field(init=False)
     genome_manifest_path: str = field(init=False)
+    catalog_path: str = field(init=False)
     tables_dir: str = field(init=False)
     extracted_dir: str = field(init=False)
     extracted_seqs_dir: str = field(init=False)
@@ -58,7 +79,6 @@ class Config:
     aln_spectree_dir: str = field(init=False)
     trimmed_dir: str = field(init=False)
     concat_dir: str = field(init=False)
-    ref_proteomes_path: str = field(init=False)
     ani_dir: str = field(init=False)
     ani_inputs_path: str = field(init=False)
     ani_pairs_path: str = field(init=False)
@@ -66,16 +86,27 @@ class Config:
     ani_representatives_path: str = field(init=False)
     ani_keep_list_path: str = field(init=False)
     ani_selected_query_dir: str = field(init=False)
+    ani_staged_proteomes_dir: str = field(init=False)
+    ani_gene_call_map_path: str = field(init=False)
     ani_selected_ref_dir: str = field(init=False)
     snp_trees_dir: str = field(init=False)
     snp_tree_summary_path: str = field(init=False)
+    # per-genome records from the staging pass, keyed by input path
+    staged_inputs: dict = field(init=False, default_factory=dict, repr=False)
+    # full (genome, marker) copy counts of top-k pruned hit tables, keyed by hits path
+    marker_copies: dict = field(init=False, default_factory=dict, repr=False)
+    # alignment cache hits/misses of this run, written to the logfile
+    alignment_cache_counts: dict = field(init=False, default_factory=dict, repr=False)
 
     def __post_init__(self):
         self.models_path = os.path.join(self.outdir, "models")
         self.proteomes_path = os.path.join(self.outdir, "proteomes")
+        self.unique_proteomes_path = os.path.join(self.outdir, "proteomes.unique")
+        self.sequence_members_path = os.path.join(self.outdir, "sequence_members.tsv")
         self.staged_proteomes_dir = os.path.join(self.outdir, "staged_proteomes")
         self.gene_call_map_path = os.path.join(self.outdir, "gene_calls.tsv")
         self.genome_manifest_path = os.path.join(self.outdir, "genome_manifest.tsv")
+        self.catalog_path = os.path.join(self.outdir, CATALOG_FILENAME)
         self.tables_dir = os.path.join(self.outdir, "tables")
         self.extracted_dir = os.path.join(self.outdir, "extracted")
         self.extracted_seqs_dir = os.path.join(self.outdir, "extracted_seqs")
@@ -83,7 +114,6 @@ class Config:
         self.aln_spectree_dir = os.path.join(self.outdir, "aln_SpecTree")
         self.trimmed_dir = os.path.join(self.outdir, "trimmed_SpeciesTree")
         self.concat_dir = os.path.join(self.outdir, "concat")
-        self.ref_proteomes_path = os.path.join(self.outdir, "ref_and_query_proteomes")
         self.ani_dir = os.path.join(self.outdir, "ani")
         self.ani_inputs_path = os.path.join(self.ani_dir, "inputs.tsv")
         self.ani_pairs_path = os.path.join(self.ani_dir, "ani_pairwise.tsv")
@@ -92,6 +122,8 @@ class Config:
         self.ani_keep_list_path = os.path.join(self.ani_dir, "ani_kept_genomes.txt")
         self.ani_selected_query_dir = os.path.join(self.ani_dir, "query_representatives")
         self.ani_selected_ref_dir = os.path.join(self.ani_dir, "ref_representatives")
+        self.ani_staged_proteomes_dir = os.path.join(self.ani_dir, "staged_proteomes")
+        self.ani_gene_call_map_path = os.path.join(self.ani_dir, "gene_calls.tsv")
         self.snp_trees_dir = os.path.join(self.outdir, "snp_trees")
         self.snp_tree_summary_path = os.path.join(self.snp_trees_dir, "snp_tree_summary.tsv")
         if self.original_genomedir is None:
@@ -109,6 +141,9 @@ class Config:
 
     @property
     def genome_count(self):
+        staged = self.staged_inputs.get(self.genomedir)
+        if staged is not None:
+            return len(staged)
         if os.path.isdir(self.genomedir):
             return len(glob.glob(os.path.join(self.genomedir, "*")))
         if os.path.isfile(self.genomedir):
@@ -126,6 +161,54 @@ class Config:
             return count
         return len(glob.glob(os.path.join(self.modeldir, "*.hmm")))
 
+    def cache(self, namespace: str) -> DiskCache | None:
+        """Shared on-disk cache for ``namespace``, or None when --cache_dir is unset."""
+        if not self.cache_dir:
+            return None
+        return DiskCache(
+            root=self.cache_dir,
+            namespace=namespace,
+            max_bytes=int(self.cache_max_gb * 1024 ** 3),
+        )
+
+    @property
+    def export_hmmout(self) -> bool:
+        """Whether hmmsearch hits are also exported as the ``hits.hmmout`` domtblout.
+
+        Reference runs and ``--update`` runs read the export back, so it is
+        always written for them.
+        """
+        return self.write_hmmout or self.is_ref or self.update
+
+    @property
+    def write_intermediate_tables(self) -> bool:
+        """Whether stages write per-step diagnostic tables under ``tables/``."""
+        return self.keep_intermediates or self.debug_tables
+
+    @property
+    def write_extracted_sequences(self) -> bool:
+        """Whether per-marker hit FASTAs are written to ``extracted_seqs/``.
+
+        Marker selection, reference caches and mafft read them back; otherwise
+        extraction hands the sequences to hmmalign in memory.
+        """
+        return self.keep_intermediates or self.marker_selection or self.is_ref or self.aln_method != "hmmalign"
+
+    @property
+    def write_legacy_tables(self) -> bool:
+        """Whether stages still write the text tables the catalog replaces.
+
+        Reference runs always do: their tables are read back by later query
+        runs and by the reference-cache validation.
+        """
+        return not self.catalog or self.legacy_tables or self.is_ref
+
+    def run_catalog(self) -> RunCatalog | None:
+        """This run's DuckDB catalog, or None when --catalog is off."""
+        if not self.catalog:
+            return None
+        return RunCatalog(self.catalog_path)
+
     def ref_dir_path(self):
         """Path to the reference concat directory for this ref+model combination."""
         if self.ref is None:
@@ -92,8 +92,13 @@ def _process_file_worker(args):
 def eliminate_duplicates(cfg: Config, df_fordups: pd.DataFrame):
     """For each aligned marker, keep only the highest-scoring hit per genome."""
     os.makedirs(cfg.aln_spectree_dir, exist_ok=True)
-    score_col = _resolve_score_column(df_fordups)
-    score_lookup = _build_score_lookup(df_fordups, score_col)
+    catalog = cfg.run_catalog()
+    if catalog is not None:
+        scores = catalog.score_table()
+        score_lookup = _build_score_lookup(scores.reset_index(), "score_bits")
+    else:
+        score_col = _resolve_score_column(df_fordups)
+        score_lookup = _build_score_lookup(df_fordups, score_col)
 
     aligned_files = glob.glob(os.path.join(cfg.aligned_dir, "*.faa"))
     args = [(f, cfg.aln_spectree_dir, score_lookup) for f in aligned_files]
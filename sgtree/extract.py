@@ -1,78 +1,64 @@
 import os
-import glob
 
 import pandas as pd
-from Bio import SeqIO
-
 from sgtree.config import Config
+from sgtree.fasta_index import fetch_sequences, load_fasta_index
 
 
-def extract_hits(cfg: Config, df: pd.DataFrame):
-    """Extract hit identifiers per marker model, write per-model files to extracted/."""
-    os.makedirs(cfg.extracted_dir, exist_ok=True)
-
-    # build list of (sequence_id, model_name) pairs
-    ls_seq_model = [
-        (df.iloc[i]["savedname"].replace("/", "|"), df.iloc[i]["namemodel"].split("/")[1])
-        for i in range(len(df))
-    ]
+def extract_hits(cfg: Config, df: pd.DataFrame) -> dict[str, list[str]]:
+    """Group hit identifiers by marker model, in table order.
 
-    # create empty files for each model
-    unique_models = set(pair[1] for pair in ls_seq_model)
-    for model in unique_models:
-        open(os.path.join(cfg.extracted_dir, model), "w").close()
+    The per-model ID lists are only written to extracted/ when intermediates
+    are kept; extraction itself uses the returned mapping.
+    """
+    seq_ids = df["savedname"].astype(str).str.replace("/", "|", regex=False)
+    models = df["namemodel"].astype(str).str.extract(r"/([^/]*)", expand=False)
+    model_seqs = {model: ids.tolist() for model, ids in seq_ids.groupby(models.to_numpy(), sort=False)}
 
-    # write sequence IDs to their model files (grouped by model)
-    model_seqs = {}
-    for seq_id, model in ls_seq_model:
-        if model not in model_seqs:
-            model_seqs[model] = []
-        model_seqs[model].append(seq_id)
+    if cfg.keep_intermediates:
+        os.makedirs(cfg.extracted_dir, exist_ok=True)
+        for model, seqs in model_seqs.items():
+            with open(os.path.join(cfg.extracted_dir, model), "w") as f:
+                f.write("\n".join(seqs) + "\n")
+    return model_seqs
 
-    for model, seqs in model_seqs.items():
-        with open(os.path.join(cfg.extracted_dir, model), "w") as f:
-            f.write("\n".join(seqs) + "\n")
 
+def _wrap(sequence: str, width: int = 60) -> str:
+    return "\n".join(sequence[i:i + width] for i in range(0, len(sequence), width))
 
-def write_extracted_sequences(cfg: Config):
-    """Retrieve actual protein sequences from proteome FASTA files, write per-model FASTAs."""
-    os.makedirs(cfg.extracted_seqs_dir, exist_ok=True)
 
-    # build combined proteomes file (query + reference)
-    with open(cfg.proteomes_path) as fp:
-        data = fp.read()
+def extract_sequences(cfg: Config, model_seqs: dict[str, list[str]]) -> dict[str, list[tuple[str, str]]]:
+    """Retrieve marker-hit sequences from the query/reference proteome stores, per model.
 
+    Each store is read through its ``.fai`` offset index, seeking only to the
+    extracted hits; query records come before reference records, each in
+    store order.
+    """
+    stores = [cfg.proteomes_path]
     if cfg.ref is not None:
-        ref_proteomes = os.path.join(cfg.ref_dir_path(), "proteomes")
-        with open(ref_proteomes) as fp:
-            data += "\n" + fp.read()
-
-    with open(cfg.ref_proteomes_path, "w") as fp:
-        fp.write(data)
+        stores.append(os.path.join(cfg.ref_dir_path(), "proteomes"))
 
-    # Build id->models mapping from extracted marker ID lists.
-    ls_of_files = glob.glob(os.path.join(cfg.extracted_dir, "*"))
     id_to_models: dict[str, list[str]] = {}
-    models: list[str] = []
-    for filepath in ls_of_files:
-        model = os.path.basename(filepath)
-        models.append(model)
-        with open(filepath) as f:
-            for line in f:
-                seq_id = line.strip()
-                if not seq_id:
-                    continue
-                id_to_models.setdefault(seq_id, []).append(model)
+    for model, seq_ids in model_seqs.items():
+        for seq_id in seq_ids:
+            id_to_models.setdefault(seq_id, []).append(model)
 
-    # Single-pass sequence extraction across the combined proteomes file.
-    handles = {
-        model: open(os.path.join(cfg.extracted_seqs_dir, model + ".faa"), "w")
-        for model in models
-    }
-    try:
-        for rec in SeqIO.parse(cfg.ref_proteomes_path, "fasta"):
-            for model in id_to_models.get(rec.id, []):
-                SeqIO.write(rec, handles[model], "fasta")
-    finally:
-        for handle in handles.values():
-            handle.close()
+    sequences: dict[str, list[tuple[str, str]]] = {model: [] for model in model_seqs}
+    for store in stores:
+        index = load_fasta_index(store)
+        for seq_id, sequence in fetch_sequences(store, index, id_to_models):
+            for model in id_to_models[seq_id]:
+                sequences[model].append((seq_id, sequence))
+    return sequences
+
+
+def write_extracted_sequences(cfg: Config, sequences: dict[str, list[tuple[str, str]]]):
+    """Write per-model FASTAs of ``sequences`` (see :func:`extract_sequences`) to extracted_seqs/.
+
+    Sequences are wrapped at 60 columns as before.
+    """
+    os.makedirs(cfg.extracted_seqs_dir, exist_ok=True)
+    for model, records in sequences.items():
+        with open(os.path.join(cfg.extracted_seqs_dir, model + ".faa"), "w") as handle:
+            for seq_id, sequence in records:
+                handle.write(f">{seq_id}\n{_wrap(sequence)}\n")
@@ -0,0 +1,102 @@
+"""faidx-style offset index for normalized proteome FASTA files.
+
+The normalization stage writes ``<proteomes>.fai`` alongside the proteome
+FASTA (``NAME LENGTH OFFSET LINEBASES LINEWIDTH`` per record, as in
+``samtools faidx``), so later stages can seek straight to the few thousand
+marker hits instead of re-parsing every proteome.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+
+FAI_SUFFIX = ".fai"
+
+
+@dataclass(frozen=True)
+class FaiEntry:
+    length: int
+    offset: int
+    line_bases: int
+    line_width: int
+
+    @property
+    def span(self) -> int:
+        """Bytes from ``offset`` to the end of the sequence, newlines included."""
+        if self.length == 0:
+            return 0
+        full_lines = (self.length - 1) // self.line_bases
+        return self.length + full_lines * (self.line_width - self.line_bases)
+
+
+def fai_path(fasta_path: str) -> str:
+    return fasta_path + FAI_SUFFIX
+
+
+def fai_row(name: str, length: int, offset: int) -> str:
+    """Index row for a single-line record, the layout the normalizer writes."""
+    return f"{name}\t{length}\t{offset}\t{length}\t{length + 1}\n"
+
+
+def build_fasta_index(fasta_path: str) -> str:
+    """Scan ``fasta_path`` and write its ``.fai``; used for stores without one."""
+    out_path = fai_path(fasta_path)
+    tmp_path = out_path + ".tmp"
+    with open(fasta_path, "rb") as handle, open(tmp_path, "w") as out:
+        name = None
+        length = offset = line_bases = line_width = 0
+        position = 0
+        for line in handle:
+            if line.startswith(b">"):
+                if name is not None:
+                    out.write(f"{name}\t{length}\t{offset}\t{line_bases}\t{line_width}\n")
+                name = line[1:].split(None, 1)[0].decode() if line[1:].strip() else ""
+                length = line_bases = line_width = 0
+                offset = position + len(line)
+            elif name is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                if bases and not line_bases:
+                    line_bases, line_width = bases, len(line)
+                length += bases
+            position += len(line)
+        if name is not None:
+            out.write(f"{name}\t{length}\t{offset}\t{line_bases}\t{line_width}\n")
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def load_fasta_index(fasta_path: str) -> dict[str, FaiEntry]:
+    """Load the ``.fai`` next to ``fasta_path``, building it first if it is missing or stale.
+
+    Duplicate names keep their first record.
+    """
+    path = fai_path(fasta_path)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(fasta_path):
+        build_fasta_index(fasta_path)
+    index: dict[str, FaiEntry] = {}
+    with open(path) as handle:
+        for line in handle:
+            name, length, offset, line_bases, line_width = line.rstrip("\n").split("\t")
+            if name not in index:
+                index[name] = FaiEntry(int(length), int(offset), int(line_bases), int(line_width))
+    return index
+
+
+def fetch_sequences(
+    fasta_path: str,
+    index: dict[str, FaiEntry],
+    names: Iterable[str],
+) -> Iterator[tuple[str, str]]:
+    """Yield ``(name, sequence)`` for the indexed ``names`` in file order; unknown names are skipped."""
+    wanted = sorted(
+        ((index[name], name) for name in set(names) if name in index),
+        key=lambda item: item[0].offset,
+    )
+    with open(fasta_path, "rb") as handle:
+        for entry, name in wanted:
+            handle.seek(entry.offset)
+            raw = handle.read(entry.span)
+            yield name, raw.replace(b"\n", b"").replace(b"\r", b"").decode()
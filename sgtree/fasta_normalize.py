@@ -3,30 +3,91 @@
 from __future__ import annotations
 
 import glob
-import io
 import os
 import re
-from typing import Iterator
+import shutil
+import tempfile
+from typing import Iterator, TextIO
 
-from Bio import SeqIO
+from sgtree.cache import DiskCache, file_digest, text_digest
+from sgtree.compression import fasta_stem, open_text, with_compression_variants
+from sgtree.fasta_index import fai_path, fai_row
 from sgtree.id_schema import build_sequence_id, infer_contig_id, sanitize_token
+from sgtree.parallel import map_processed
 
 VALID_AA = set("ABCDEFGHIKLMNPQRSTVWYBXZJUO")
+PROTEIN_GLOBS = with_compression_variants((".faa",))
+# Bump when normalized output changes so staging-cache entries are not reused.
+NORMALIZER_VERSION = 2
 
 
 def _iter_fasta_records(path: str) -> Iterator[tuple[str, str]]:
-    with open(path) as handle:
-        text = handle.read()
-    text = text.replace("\r\n", "\n").replace("\r", "\n")
-    # Repair malformed FASTA where headers were glued to sequence lines (for example '*>next_header').
-    text = re.sub(r"(?<!^)(?<!\n)>", "\n>", text)
-    if not text.endswith("\n"):
-        text += "\n"
-    for record in SeqIO.parse(io.StringIO(text), "fasta"):
-        yield record.description, str(record.seq)
+    """Stream ``(description, sequence)`` pairs while holding one record in memory.
+
+    Universal-newline reads fold ``\\r\\n``/``\\r`` line endings, and any ``>``
+    past the start of a line opens a new record, which repairs malformed FASTA
+    where headers were glued to sequence lines (for example ``*>next_header``).
+    Non-blank text before the first header raises ``ValueError``, as the
+    Biopython reader did, so truncated or non-FASTA files are not staged as
+    empty proteomes.
+    """
+    header = None
+    chunks: list[str] = []
+    with open_text(path) as handle:
+        for line in handle:
+            if ">" not in line:
+                if header is not None:
+                    chunks.append(line.rstrip())
+                elif line.strip():
+                    raise ValueError(f"Text before the first FASTA header in {path}: {line.strip()[:40]!r}")
+                continue
+            sequence_part, *titles = line.rstrip().split(">")
+            if header is None and sequence_part.strip():
+                raise ValueError(f"Text before the first FASTA header in {path}: {sequence_part.strip()[:40]!r}")
+            if sequence_part and header is not None:
+                chunks.append(sequence_part)
+            for title in titles:
+                if header is not None:
+                    yield header, "".join(chunks).replace(" ", "")
+                header = title.rstrip()
+                chunks = []
+    if header is not None:
+        yield header, "".join(chunks).replace(" ", "")
+
+
+_ASCII_WHITESPACE = bytes(code for code in range(128) if re.match(r"\s", chr(code)))
+_CLEAN_DELETE = _ASCII_WHITESPACE + b"*"
+_VALID_BYTES = "".join(sorted(VALID_AA)).encode("ascii")
+
+
+def _build_clean_table() -> bytes:
+    """Byte table that upper-cases valid residues and maps every other byte to ``X``."""
+    table = bytearray(b"X" * 256)
+    for residue in _VALID_BYTES:
+        table[residue] = residue
+        table[residue + 32] = residue
+    return bytes(table)
+
+
+_CLEAN_TABLE = _build_clean_table()
+_VALID_EITHER_CASE = _VALID_BYTES + _VALID_BYTES.lower()
 
 
 def _clean_sequence(sequence: str) -> tuple[str, int]:
+    """Strip whitespace and ``*``, upper-case, and replace invalid residues with ``X``.
+
+    ASCII sequences go through two C-level ``bytes.translate`` passes; the
+    rare non-ASCII record falls back to the per-residue loop so Unicode
+    whitespace and case folding behave exactly as before.
+    """
+    if not sequence.isascii():
+        return _clean_sequence_slow(sequence)
+    raw = sequence.encode("ascii").translate(None, _CLEAN_DELETE)
+    replaced = len(raw.translate(None, _VALID_EITHER_CASE))
+    return raw.translate(_CLEAN_TABLE).decode("ascii"), replaced
+
+
+def _clean_sequence_slow(sequence: str) -> tuple[str, int]:
     seq = re.sub(r"\s+", "", sequence).upper().replace("*", "")
     cleaned = []
     replaced = 0
@@ -41,7 +102,11 @@ def _clean_sequence(sequence: str) -> tuple[str, int]:
 
 def _iter_input_files(genomedir: str) -> list[str]:
     if os.path.isdir(genomedir):
-        files = sorted(glob.glob(os.path.join(genomedir, "*.faa")))
+        files = sorted(
+            path
+            for pattern in PROTEIN_GLOBS
+            for path in glob.glob(os.path.join(genomedir, "*" + pattern))
+        )
         if not files:
             raise ValueError(f"No .faa files found in directory: {genomedir}")
         return files
@@ -81,67 +146,260 @@ def _normalize_ids(
     return genome_id, contig_id, protein_id, contig_inference
 
 
+MAP_HEADER = (
+    "source_file\toriginal_header\tnormalized_header\tgenome_id\tcontig_id\tgene_id\tcontig_inference\n"
+)
+
+
+def _normalize_file(
+    path: str,
+    file_index: int,
+    infer_genome_from_header: bool,
+    out: TextIO,
+    map_handle: TextIO | None,
+    map_prefix: str = "",
+    index_handle: TextIO | None = None,
+    offset: int = 0,
+) -> dict[str, object]:
+    """Normalize one input file, writing FASTA records, header-map and index rows.
+
+    ``map_prefix`` is written before each map row; shards leave it empty and
+    get the ``source_file`` column prepended when they are merged. ``offset``
+    is the byte position of ``out`` where this file's first record starts.
+    """
+    file_genome = _file_genome(path, file_index)
+    seen_proteins = set()
+    genomes = set()
+    contigs = set()
+    records = 0
+    invalid = 0
+    start = offset
+
+    for protein_index, (raw_header, raw_seq) in enumerate(_iter_fasta_records(path), start=1):
+        genome_id, contig_id, protein_id, contig_inference = _normalize_ids(
+            raw_header, file_genome, protein_index, infer_genome_from_header
+        )
+        base_id = protein_id
+        suffix = 2
+        while (contig_id, protein_id) in seen_proteins:
+            protein_id = f"{base_id}_{suffix}"
+            suffix += 1
+        seen_proteins.add((contig_id, protein_id))
+
+        seq, replaced = _clean_sequence(raw_seq)
+        if not seq:
+            continue
+
+        normalized_id = build_sequence_id(genome_id, contig_id, protein_id)
+        out.write(f">{normalized_id}\n{seq}\n")
+        # normalized IDs and residues are ASCII, so characters == bytes
+        offset += len(normalized_id) + 2
+        if index_handle:
+            index_handle.write(fai_row(normalized_id, len(seq), offset))
+        offset += len(seq) + 1
+
+        records += 1
+        genomes.add(genome_id)
+        contigs.add((genome_id, contig_id))
+        invalid += replaced
+
+        if map_handle:
+            header_clean = raw_header.replace("\t", " ").strip()
+            map_handle.write(
+                f"{map_prefix}{header_clean}\t{normalized_id}\t{genome_id}\t{contig_id}\t{protein_id}\t{contig_inference}\n"
+            )
+
+    return {
+        "file_genome": file_genome,
+        "genomes": genomes,
+        "contigs": contigs,
+        "records": records,
+        "invalid_chars_replaced": invalid,
+        "bytes": offset - start,
+    }
+
+
+def _file_genome(path: str, file_index: int) -> str:
+    return sanitize_token(fasta_stem(path), f"genome_{file_index:05d}")
+
+
+def _normalize_shard_worker(args) -> dict[str, object]:
+    """Worker: normalize one genome file into its own FASTA/map shard.
+
+    With a staging cache the shard is reused when the same file content was
+    normalized before under the same genome id and header-inference mode.
+    """
+    path, file_index, infer_genome_from_header, shard_fasta, shard_map, cache = args
+    shard_index = fai_path(shard_fasta)
+    targets = {"proteome.faa": shard_fasta, "header_map.tsv": shard_map, "proteome.fai": shard_index}
+    key = None
+    if cache is not None:
+        key = text_digest(
+            "normalize",
+            NORMALIZER_VERSION,
+            _file_genome(path, file_index),
+            infer_genome_from_header,
+            file_digest(path),
+        )
+        meta = cache.fetch(key, targets)
+        if meta is not None:
+            return {
+                "file_genome": meta["file_genome"],
+                "genomes": set(meta["genomes"]),
+                "contigs": {tuple(contig) for contig in meta["contigs"]},
+                "records": meta["records"],
+                "invalid_chars_replaced": meta["invalid_chars_replaced"],
+                "bytes": meta["bytes"],
+                "cached": True,
+            }
+
+    with open(shard_fasta, "w") as out, open(shard_map, "w") as map_handle, open(shard_index, "w") as index_handle:
+        result = _normalize_file(
+            path, file_index, infer_genome_from_header, out, map_handle, index_handle=index_handle
+        )
+    if cache is not None:
+        cache.store(
+            key,
+            targets,
+            {
+                "file_genome": result["file_genome"],
+                "genomes": sorted(result["genomes"]),
+                "contigs": sorted(result["contigs"]),
+                "records": result["records"],
+                "invalid_chars_replaced": result["invalid_chars_replaced"],
+                "bytes": result["bytes"],
+            },
+        )
+    result["cached"] = False
+    return result
+
+
+def _append_shard(path: str, dest: TextIO, *, prefix: str = "") -> None:
+    with open(path) as handle:
+        if not prefix:
+            shutil.copyfileobj(handle, dest)
+            return
+        for line in handle:
+            dest.write(prefix + line)
+
+
+def _append_index_shard(path: str, dest: TextIO, base_offset: int) -> None:
+    with open(path) as handle:
+        for line in handle:
+            name, length, offset, rest = line.split("\t", 3)
+            dest.write(f"{name}\t{length}\t{int(offset) + base_offset}\t{rest}")
+
+
 def normalize_and_concat_proteomes(
     genomedir: str,
     out_fasta: str,
     map_path: str | None = None,
+    num_workers: int = 1,
+    cache: DiskCache | None = None,
 ) -> dict[str, int]:
+    """Normalize all input proteomes into one FASTA with stable SGTree IDs.
+
+    With ``num_workers > 1`` each genome file is normalized in a worker process
+    into a per-genome shard; shards are merged in input-file order so the
+    output and stats match the serial path exactly. With a ``cache`` (see
+    :mod:`sgtree.cache`) unchanged genome files reuse their stored shards.
+    """
+    stats, _per_file = normalize_proteomes_by_file(genomedir, out_fasta, map_path, num_workers, cache)
+    return stats
+
+
+def normalize_proteomes_by_file(
+    genomedir: str,
+    out_fasta: str,
+    map_path: str | None = None,
+    num_workers: int = 1,
+    cache: DiskCache | None = None,
+) -> tuple[dict[str, int], list[tuple[str, str, int, bool]]]:
+    """Normalize inputs like :func:`normalize_and_concat_proteomes`.
+
+    Also returns ``(input path, file genome id, records written, served from
+    the staging cache)`` per input file.
+    A faidx-style index (see :mod:`sgtree.fasta_index`) is written next to
+    ``out_fasta``.
+    """
     files = _iter_input_files(genomedir)
     infer_genome_from_header = os.path.isfile(genomedir)
 
-    total_records = 0
     total_genomes = set()
-    total_invalid = 0
     contigs_seen = set()
+    total_records = 0
+    total_invalid = 0
 
     map_handle = open(map_path, "w") if map_path else None
     if map_handle:
-        map_handle.write(
-            "source_file\toriginal_header\tnormalized_header\tgenome_id\tcontig_id\tgene_id\tcontig_inference\n"
-        )
+        map_handle.write(MAP_HEADER)
+    index_handle = open(fai_path(out_fasta), "w")
 
     try:
         with open(out_fasta, "w") as out:
-            for file_index, path in enumerate(files, start=1):
-                stem = os.path.splitext(os.path.basename(path))[0]
-                file_genome = sanitize_token(stem, f"genome_{file_index:05d}")
-                seen_proteins = set()
-
-                for protein_index, (raw_header, raw_seq) in enumerate(_iter_fasta_records(path), start=1):
-                    genome_id, contig_id, protein_id, contig_inference = _normalize_ids(
-                        raw_header, file_genome, protein_index, infer_genome_from_header
-                    )
-                    base_id = protein_id
-                    suffix = 2
-                    while (contig_id, protein_id) in seen_proteins:
-                        protein_id = f"{base_id}_{suffix}"
-                        suffix += 1
-                    seen_proteins.add((contig_id, protein_id))
-
-                    seq, replaced = _clean_sequence(raw_seq)
-                    if not seq:
-                        continue
-
-                    normalized_id = build_sequence_id(genome_id, contig_id, protein_id)
-                    out.write(f">{normalized_id}\n{seq}\n")
-
-                    total_records += 1
-                    total_genomes.add(genome_id)
-                    contigs_seen.add((genome_id, contig_id))
-                    total_invalid += replaced
-
-                    if map_handle:
-                        header_clean = raw_header.replace("\t", " ").strip()
-                        map_handle.write(
-                            f"{path}\t{header_clean}\t{normalized_id}\t{genome_id}\t{contig_id}\t{protein_id}\t{contig_inference}\n"
+            if cache is not None or (num_workers > 1 and len(files) > 1):
+                shard_dir = tempfile.mkdtemp(
+                    prefix=".normalize_shards_",
+                    dir=os.path.dirname(os.path.abspath(out_fasta)),
+                )
+                try:
+                    tasks = [
+                        (
+                            path,
+                            file_index,
+                            infer_genome_from_header,
+                            os.path.join(shard_dir, f"{file_index:06d}.faa"),
+                            os.path.join(shard_dir, f"{file_index:06d}.map"),
+                            cache,
                         )
+                        for file_index, path in enumerate(files, start=1)
+                    ]
+                    results = map_processed(_normalize_shard_worker, tasks, num_workers)
+                    offset = 0
+                    for (path, _index, _infer, shard_fasta, shard_map, _cache), result in zip(tasks, results):
+                        _append_shard(shard_fasta, out)
+                        _append_index_shard(fai_path(shard_fasta), index_handle, offset)
+                        offset += result["bytes"]
+                        if map_handle:
+                            _append_shard(shard_map, map_handle, prefix=f"{path}\t")
+                finally:
+                    shutil.rmtree(shard_dir, ignore_errors=True)
+            else:
+                results = []
+                offset = 0
+                for file_index, path in enumerate(files, start=1):
+                    result = _normalize_file(
+                        path,
+                        file_index,
+                        infer_genome_from_header,
+                        out,
+                        map_handle,
+                        map_prefix=f"{path}\t",
+                        index_handle=index_handle,
+                        offset=offset,
+                    )
+                    offset += result["bytes"]
+                    results.append(result)
+
+            for result in results:
+                total_genomes.update(result["genomes"])
+                contigs_seen.update(result["contigs"])
+                total_records += result["records"]
+                total_invalid += result["invalid_chars_replaced"]
     finally:
+        # closed after out_fasta so the index is never older than the FASTA
+        index_handle.close()
         if map_handle:
             map_handle.close()
 
-    return {
+    stats = {
         "genomes": len(total_genomes),
         "contigs": len(contigs_seen),
         "records": total_records,
         "invalid_chars_replaced": total_invalid,
     }
+    per_file = [
+        (path, result["file_genome"], result["records"], bool(result.get("cached")))
+        for path, result in zip(files, results)
+    ]
+    return stats, per_file
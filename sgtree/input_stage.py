@@ -1,16 +1,39 @@
 from __future__ import annotations
 
 import glob
+import importlib.util
 import os
-from dataclasses import dataclass
+import shutil
+import tempfile
+from dataclasses import dataclass, replace
 
+import pandas as pd
 from Bio import SeqIO
 
+from sgtree.cache import DiskCache, file_digest, text_digest
+from sgtree.compression import fasta_extension, fasta_stem, open_text
 from sgtree.id_schema import build_sequence_id, sanitize_token
+from sgtree.parallel import map_processed
 
 
 NUCLEOTIDE_EXTENSIONS = (".fna", ".fa", ".fasta")
 PROTEIN_EXTENSIONS = (".faa",)
+# Bump when gene-call output changes so staging-cache entries are not reused.
+GENE_CALLER_VERSION = 1
+
+
+@dataclass(frozen=True)
+class GenomeInput:
+    """Per-genome facts collected once while staging inputs."""
+
+    genome_id: str
+    input_format: str
+    source_file: str
+    assembly_path: str = ""
+    staged_proteome_path: str = ""
+    contigs: int = 0
+    total_bases: int = 0
+    proteins: int = 0
 
 
 @dataclass(frozen=True)
@@ -20,12 +43,14 @@ class InputStageStats:
     staged_records: int
     staged_genomes: int
     contigs: int
+    genomes: tuple[GenomeInput, ...] = ()
+    cached: int = 0
 
 
 def _fasta_size_stats(path: str) -> tuple[int, int]:
     contigs = 0
     total_bases = 0
-    with open(path) as handle:
+    with open_text(path) as handle:
         for record in SeqIO.parse(handle, "fasta"):
             contigs += 1
             total_bases += len(record.seq)
@@ -45,7 +70,7 @@ def _list_files(input_path: str) -> list[str]:
 
 def detect_input_format(input_path: str) -> str:
     files = _list_files(input_path)
-    exts = {os.path.splitext(path)[1].lower() for path in files}
+    exts = {fasta_extension(path) for path in files}
     if exts and exts <= set(PROTEIN_EXTENSIONS):
         return "faa"
     if exts and exts <= set(NUCLEOTIDE_EXTENSIONS):
@@ -53,7 +78,7 @@ def detect_input_format(input_path: str) -> str:
 
     first = files[0]
     sequence = ""
-    with open(first) as handle:
+    with open_text(first) as handle:
         for line in handle:
             if line.startswith(">"):
                 continue
@@ -65,117 +90,300 @@ def detect_input_format(input_path: str) -> str:
     return "faa"
 
 
+GENE_CALL_MAP_HEADER = (
+    "source_file\tcontig_header\tnormalized_header\tgenome_id\tcontig_id\tgene_id\tbegin\tend\tstrand\ttranslation_table\n"
+)
+
+
+def _gene_call_worker(args) -> dict[str, int]:
+    """Worker: gene-call one assembly into its own .faa and gene-call map fragment.
+
+    Fragment rows omit ``source_file``; it is prepended when fragments are
+    merged so cached fragments stay valid when the input file moves.
+    """
+    path, genome_id, out_path, fragment_path, cache = args
+    import pyrodigal
+
+    targets = {"proteome.faa": out_path, "gene_calls.tsv": fragment_path}
+    key = None
+    if cache is not None:
+        key = text_digest(
+            "gene_call",
+            GENE_CALLER_VERSION,
+            pyrodigal.__version__,
+            genome_id,
+            file_digest(path),
+        )
+        meta = cache.fetch(key, targets)
+        if meta is not None:
+            return {**meta, "cached": True}
+
+    gene_finder = pyrodigal.GeneFinder(meta=True)
+    records = 0
+    contigs = 0
+    total_bases = 0
+    with open(out_path, "w") as out_handle, open(fragment_path, "w") as map_handle:
+        with open_text(path) as handle:
+            for contig_index, record in enumerate(SeqIO.parse(handle, "fasta"), start=1):
+                contigs += 1
+                total_bases += len(record.seq)
+                contig_token = record.id or record.description or f"contig_{contig_index:06d}"
+                contig_id = sanitize_token(contig_token, f"contig_{contig_index:06d}")
+                genes = gene_finder.find_genes(bytes(record.seq))
+                for gene_index, gene in enumerate(genes, start=1):
+                    gene_id = f"gene_{gene_index:06d}"
+                    normalized_id = build_sequence_id(genome_id, contig_id, gene_id)
+                    protein = str(
+                        gene.translate(
+                            include_stop=False,
+                            strict=False,
+                        )
+                    )
+                    if not protein:
+                        continue
+                    out_handle.write(f">{normalized_id}\n{protein}\n")
+                    records += 1
+                    map_handle.write(
+                        "\t".join(
+                            [
+                                record.description.replace("\t", " ").strip(),
+                                normalized_id,
+                                genome_id,
+                                contig_id,
+                                gene_id,
+                                str(gene.begin),
+                                str(gene.end),
+                                str(gene.strand),
+                                str(gene.translation_table),
+                            ]
+                        )
+                        + "\n"
+                    )
+    result = {"records": records, "contigs": contigs, "total_bases": total_bases}
+    if cache is not None:
+        cache.store(key, targets, result)
+    return {**result, "cached": False}
+
+
 def gene_call_inputs(
     input_path: str,
     output_dir: str,
     map_path: str,
+    num_workers: int = 1,
+    cache: DiskCache | None = None,
+    files: list[str] | None = None,
 ) -> InputStageStats:
-    try:
-        import pyrodigal
-    except ImportError as exc:
-        raise RuntimeError(
-            "FNA input requires pyrodigal; add it to the environment first"
-        ) from exc
+    """Gene-call FNA inputs with pyrodigal, one genome per task.
+
+    Genomes are dispatched largest first across ``num_workers`` processes;
+    per-genome map fragments are merged into ``map_path`` in input order.
+    With a ``cache``, assemblies whose content was gene-called before reuse
+    the stored proteome and map fragment. ``files`` replaces the listing of
+    ``input_path``.
+    """
+    if importlib.util.find_spec("pyrodigal") is None:
+        raise RuntimeError("FNA input requires pyrodigal; add it to the environment first")
 
     os.makedirs(output_dir, exist_ok=True)
-    files = _list_files(input_path)
-    gene_finder = pyrodigal.GeneFinder(meta=True)
+    files = _list_files(input_path) if files is None else files
+    fragment_dir = tempfile.mkdtemp(prefix=".gene_call_fragments_", dir=output_dir)
 
-    total_records = 0
-    total_contigs = 0
-    genomes = set()
+    tasks = []
+    for file_index, path in enumerate(files, start=1):
+        genome_id = sanitize_token(fasta_stem(path), f"genome_{file_index:05d}")
+        tasks.append(
+            (
+                path,
+                genome_id,
+                os.path.join(output_dir, genome_id + ".faa"),
+                os.path.join(fragment_dir, f"{file_index:06d}.tsv"),
+                cache,
+            )
+        )
+
+    try:
+        by_size = sorted(tasks, key=lambda task: os.path.getsize(task[0]), reverse=True)
+        results = dict(
+            zip(
+                (task[3] for task in by_size),
+                map_processed(_gene_call_worker, by_size, num_workers, chunksize=1),
+            )
+        )
+        with open(map_path, "w") as map_handle:
+            map_handle.write(GENE_CALL_MAP_HEADER)
+            for task in tasks:
+                with open(task[3]) as fragment:
+                    for line in fragment:
+                        map_handle.write(f"{task[0]}\t{line}")
+    finally:
+        shutil.rmtree(fragment_dir, ignore_errors=True)
 
-    with open(map_path, "w") as map_handle:
-        map_handle.write(
-            "source_file\tcontig_header\tnormalized_header\tgenome_id\tcontig_id\tgene_id\tbegin\tend\tstrand\ttranslation_table\n"
+    genomes = tuple(
+        GenomeInput(
+            genome_id=genome_id,
+            input_format="fna",
+            source_file=os.path.abspath(path),
+            assembly_path=os.path.abspath(path),
+            staged_proteome_path=os.path.abspath(out_path),
+            contigs=results[fragment_path]["contigs"],
+            total_bases=results[fragment_path]["total_bases"],
+            proteins=results[fragment_path]["records"],
         )
-        for file_index, path in enumerate(files, start=1):
-            stem = os.path.splitext(os.path.basename(path))[0]
-            genome_id = sanitize_token(stem, f"genome_{file_index:05d}")
-            genomes.add(genome_id)
-            out_path = os.path.join(output_dir, genome_id + ".faa")
-            with open(out_path, "w") as out_handle:
-                with open(path) as handle:
-                    for contig_index, record in enumerate(SeqIO.parse(handle, "fasta"), start=1):
-                        total_contigs += 1
-                        contig_token = record.id or record.description or f"contig_{contig_index:06d}"
-                        contig_id = sanitize_token(contig_token, f"contig_{contig_index:06d}")
-                        genes = gene_finder.find_genes(bytes(record.seq))
-                        for gene_index, gene in enumerate(genes, start=1):
-                            gene_id = f"gene_{gene_index:06d}"
-                            normalized_id = build_sequence_id(genome_id, contig_id, gene_id)
-                            protein = str(
-                                gene.translate(
-                                    include_stop=False,
-                                    strict=False,
-                                )
-                            )
-                            if not protein:
-                                continue
-                            out_handle.write(f">{normalized_id}\n{protein}\n")
-                            total_records += 1
-                            map_handle.write(
-                                "\t".join(
-                                    [
-                                        path,
-                                        record.description.replace("\t", " ").strip(),
-                                        normalized_id,
-                                        genome_id,
-                                        contig_id,
-                                        gene_id,
-                                        str(gene.begin),
-                                        str(gene.end),
-                                        str(gene.strand),
-                                        str(gene.translation_table),
-                                    ]
-                                )
-                                + "\n"
-                            )
+        for path, genome_id, out_path, fragment_path, _cache in tasks
+    )
+    return InputStageStats(
+        input_format="fna",
+        staged_source=output_dir,
+        staged_records=sum(genome.proteins for genome in genomes),
+        staged_genomes=len({genome.genome_id for genome in genomes}),
+        contigs=sum(genome.contigs for genome in genomes),
+        genomes=genomes,
+        cached=sum(1 for result in results.values() if result["cached"]),
+    )
+
+
+def link_gene_calls(
+    called: list[GenomeInput],
+    input_path: str,
+    output_dir: str,
+    map_path: str,
+    called_map_path: str,
+) -> InputStageStats | None:
+    """Stage the gene calls of an earlier pass for the assemblies in ``input_path``.
 
+    ``called`` and ``called_map_path`` are the records and gene-call map of
+    a :func:`gene_call_inputs` pass over a superset of the inputs (ANI
+    discovery calls every query assembly before representatives are
+    picked). Their proteomes are linked into ``output_dir`` and their map
+    rows copied to ``map_path``. Returns ``None`` when a genome of
+    ``input_path`` was not called, so the caller gene-calls instead.
+    """
+    by_id = {genome.genome_id: genome for genome in called if genome.staged_proteome_path}
+    genome_ids = [
+        sanitize_token(fasta_stem(path), f"genome_{file_index:05d}")
+        for file_index, path in enumerate(_list_files(input_path), start=1)
+    ]
+    if not genome_ids or any(
+        genome_id not in by_id or not os.path.exists(by_id[genome_id].staged_proteome_path)
+        for genome_id in genome_ids
+    ):
+        return None
+
+    os.makedirs(output_dir, exist_ok=True)
+    genomes = []
+    for genome_id in genome_ids:
+        target = os.path.join(output_dir, genome_id + ".faa")
+        if os.path.lexists(target):
+            os.remove(target)
+        try:
+            os.symlink(by_id[genome_id].staged_proteome_path, target)
+        except OSError:
+            shutil.copyfile(by_id[genome_id].staged_proteome_path, target)
+        genomes.append(replace(by_id[genome_id], staged_proteome_path=os.path.abspath(target)))
+
+    wanted = set(genome_ids)
+    with open(called_map_path) as source, open(map_path, "w") as map_handle:
+        map_handle.write(source.readline())
+        for line in source:
+            if line.split("\t", 4)[3] in wanted:
+                map_handle.write(line)
     return InputStageStats(
         input_format="fna",
         staged_source=output_dir,
-        staged_records=total_records,
+        staged_records=sum(genome.proteins for genome in genomes),
         staged_genomes=len(genomes),
-        contigs=total_contigs,
+        contigs=sum(genome.contigs for genome in genomes),
+        genomes=tuple(genomes),
     )
 
 
+def scan_genome_inputs(
+    input_path: str,
+    *,
+    input_format: str,
+    staged_source: str | None = None,
+    files: list[str] | None = None,
+    num_workers: int = 1,
+) -> list[GenomeInput]:
+    """Collect per-genome paths and assembly size stats without gene calling.
+
+    Used when no staging pass has already produced the records (for example
+    ANI discovery, which runs before gene calling).
+    """
+    files = _list_files(input_path) if files is None else files
+    stats = (
+        map_processed(_fasta_size_stats, files, num_workers)
+        if input_format == "fna"
+        else [(0, 0)] * len(files)
+    )
+    genomes = []
+    for file_index, (path, (contigs, total_bases)) in enumerate(zip(files, stats), start=1):
+        genome_id = sanitize_token(fasta_stem(path), f"genome_{file_index:05d}")
+        staged_proteome_path = ""
+        if input_format == "fna" and staged_source is not None:
+            staged_proteome_path = os.path.abspath(os.path.join(staged_source, genome_id + ".faa"))
+        genomes.append(
+            GenomeInput(
+                genome_id=genome_id,
+                input_format=input_format,
+                source_file=os.path.abspath(path),
+                assembly_path=os.path.abspath(path) if input_format == "fna" else "",
+                staged_proteome_path=staged_proteome_path,
+                contigs=contigs,
+                total_bases=total_bases,
+            )
+        )
+    return genomes
+
+
 def write_genome_manifest(
     input_path: str,
     *,
     input_format: str,
     manifest_path: str,
     staged_source: str | None = None,
+    genomes: list[GenomeInput] | None = None,
 ) -> None:
-    files = _list_files(input_path)
+    """Write genome_manifest.tsv, reusing staged ``genomes`` when available."""
+    if genomes is None:
+        genomes = scan_genome_inputs(
+            input_path,
+            input_format=input_format,
+            staged_source=staged_source,
+        )
     with open(manifest_path, "w") as handle:
         handle.write(
             "genome_id\tinput_format\tsource_file\tassembly_path\tstaged_proteome_path\tcontigs\ttotal_bases\n"
         )
-        for file_index, path in enumerate(files, start=1):
-            stem = os.path.splitext(os.path.basename(path))[0]
-            genome_id = sanitize_token(stem, f"genome_{file_index:05d}")
-            contigs = 0
-            total_bases = 0
-            assembly_path = ""
-            staged_proteome_path = ""
-            if input_format == "fna":
-                contigs, total_bases = _fasta_size_stats(path)
-                assembly_path = os.path.abspath(path)
-                if staged_source is not None:
-                    staged_proteome_path = os.path.abspath(os.path.join(staged_source, genome_id + ".faa"))
+        for genome in genomes:
             handle.write(
                 "\t".join(
                     [
-                        genome_id,
-                        input_format,
-                        os.path.abspath(path),
-                        assembly_path,
-                        staged_proteome_path,
-                        str(contigs),
-                        str(total_bases),
+                        genome.genome_id,
+                        genome.input_format,
+                        genome.source_file,
+                        genome.assembly_path,
+                        genome.staged_proteome_path,
+                        str(genome.contigs),
+                        str(genome.total_bases),
                     ]
                 )
                 + "\n"
             )
+
+
+def read_genome_manifest(manifest_path: str) -> list[GenomeInput]:
+    """Load the records written by :func:`write_genome_manifest`."""
+    manifest = pd.read_csv(manifest_path, sep="\t", dtype=str, keep_default_na=False)
+    return [
+        GenomeInput(
+            genome_id=row.genome_id,
+            input_format=row.input_format,
+            source_file=row.source_file,
+            assembly_path=row.assembly_path,
+            staged_proteome_path=row.staged_proteome_path,
+            contigs=int(row.contigs or 0),
+            total_bases=int(row.total_bases or 0),
+        )
+        for row in manifest.itertuples(index=False)
+    ]
@@ -44,10 +44,13 @@ def write_heatmap(cfg: Config, tree_path: str, outsuffix: str):
     lst_nodes = [node for node in next(itol_tree.copy().traverse())]
     treetaxa = [n.name for n in lst_nodes]
 
-    mkr_count_df = pd.read_csv(os.path.join(cfg.outdir, "marker_count_matrix.csv"))
-    ls_order_cols = list(mkr_count_df["Unnamed: 0"])
-    target_list_d = mkr_count_df.set_index("Unnamed: 0").to_dict()
-    target_list_d = {k: list(v.values()) for k, v in target_list_d.items()}
+    catalog = cfg.run_catalog()
+    if catalog is not None:
+        mkr_count_df = pd.DataFrame.from_dict(catalog.kept_marker_counts()).fillna(0)
+    else:
+        mkr_count_df = pd.read_csv(os.path.join(cfg.outdir, "marker_count_matrix.csv"), index_col=0)
+    ls_order_cols = [str(marker) for marker in mkr_count_df.index]
+    target_list_d = {k: list(v.values()) for k, v in mkr_count_df.to_dict().items()}
 
     outpath = os.path.join(cfg.outdir, outsuffix)
     with open(outpath, "w") as f:
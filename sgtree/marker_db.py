@@ -0,0 +1,143 @@
+"""Pressed (binary) marker HMM database shared by search and alignment.
+
+The models stage presses the staged ``models`` text file once into the
+HMMER binary database (``models.h3m/.h3i/.h3f/.h3p``) next to it, stamped
+with the SHA-256 of the text it was pressed from. With ``--cache_dir`` the
+pressed files are also kept in the ``models`` cache namespace, keyed by that
+content hash, so a marker set is pressed once across runs.
+
+:func:`load_models` reads the binary database (HMMs from ``.h3m``, ready
+optimized profiles from ``.h3p``) and keeps the result in memory, so every
+consumer in one process shares the same parsed profiles.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from dataclasses import dataclass
+
+import pyhmmer
+from pyhmmer import hmmer, plan7
+
+from sgtree.cache import DiskCache, file_digest, text_digest
+
+
+# Bump when the pressed layout changes so cached databases are not reused.
+MODEL_DB_VERSION = 1
+PRESSED_SUFFIXES = (".h3m", ".h3i", ".h3f", ".h3p")
+DIGEST_SUFFIX = ".h3.sha256"
+
+
+@dataclass(frozen=True)
+class MarkerSet:
+    """Parsed marker profiles of one HMM file, in file order."""
+
+    digest: str
+    hmms: tuple
+    profiles: tuple
+
+    @property
+    def alphabet(self):
+        return self.hmms[0].alphabet
+
+    @property
+    def names(self) -> tuple[str, ...]:
+        return tuple(hmm.name for hmm in self.hmms)
+
+
+_LOADED: dict[str, MarkerSet] = {}
+# (path, st_mtime_ns, st_size) -> content hash, so repeated loads skip hashing
+_DIGESTS: dict[tuple[str, int, int], str] = {}
+
+
+def _pressed_digest(models_path: str) -> str | None:
+    """Content hash the pressed database next to ``models_path`` was built from."""
+    try:
+        with open(models_path + DIGEST_SUFFIX) as handle:
+            digest = handle.read().strip()
+    except OSError:
+        return None
+    if not all(os.path.exists(models_path + suffix) for suffix in PRESSED_SUFFIXES):
+        return None
+    return digest
+
+
+def _read_text(models_path: str) -> list:
+    # a file handle, not the path: HMMFile(path) prefers a (possibly stale) .h3m
+    with open(models_path, "rb") as handle, plan7.HMMFile(handle) as hmm_file:
+        return list(hmm_file)
+
+
+def press_models(models_path: str, cache: DiskCache | None = None) -> str:
+    """Write the pressed database for ``models_path`` unless it is current.
+
+    Returns the content hash of the models file.
+    """
+    digest = file_digest(models_path)
+    if _pressed_digest(models_path) == digest:
+        return digest
+
+    targets = {"models" + suffix: models_path + suffix for suffix in PRESSED_SUFFIXES}
+    key = text_digest("hmmpress", MODEL_DB_VERSION, pyhmmer.__version__, digest)
+    if cache is not None and cache.fetch(key, targets) is not None:
+        source = "cache"
+    else:
+        hmms = _read_text(models_path)
+        if not hmms:
+            raise ValueError(f"Marker set does not contain valid HMM entries: {models_path}")
+        prefix = tempfile.mkdtemp(prefix=".hmmpress_", dir=os.path.dirname(models_path) or ".")
+        try:
+            hmmer.hmmpress(hmms, os.path.join(prefix, "models"))
+            for name, dest in targets.items():
+                os.replace(os.path.join(prefix, name), dest)
+        finally:
+            for name in os.listdir(prefix):
+                os.remove(os.path.join(prefix, name))
+            os.rmdir(prefix)
+        source = "pressed"
+        if cache is not None:
+            cache.store(key, targets, {"models": len(hmms)})
+            cache.evict()
+    with open(models_path + DIGEST_SUFFIX, "w") as handle:
+        handle.write(digest + "\n")
+    print(f"-... marker database {models_path}.h3m ({source})")
+    return digest
+
+
+def load_models(models_path: str) -> MarkerSet:
+    """Profiles of ``models_path``, parsed once per content hash in this process.
+
+    Reads the pressed database when it matches the file; other HMM files (for
+    example an unstaged ``--modeldir``) are parsed from text and their
+    optimized profiles built once here. The file is only hashed when its
+    path, mtime or size differ from an earlier call.
+    """
+    models_path = str(models_path)
+    stat = os.stat(models_path)
+    stat_key = (os.path.abspath(models_path), stat.st_mtime_ns, stat.st_size)
+    digest = _DIGESTS.get(stat_key)
+    if digest is None:
+        digest = _DIGESTS[stat_key] = file_digest(models_path)
+    loaded = _LOADED.get(digest)
+    if loaded is not None:
+        return loaded
+
+    if _pressed_digest(models_path) == digest:
+        with plan7.HMMFile(models_path + ".h3m") as hmm_file:
+            hmms = list(hmm_file)
+        with plan7.HMMFile(models_path) as hmm_file:
+            profiles = list(hmm_file.optimized_profiles())
+    else:
+        hmms = _read_text(models_path)
+        profiles = []
+        for hmm in hmms:
+            profile = plan7.Profile(hmm.M, hmm.alphabet)
+            profile.configure(hmm, plan7.Background(hmm.alphabet))
+            profiles.append(profile.to_optimized())
+    if not hmms:
+        raise ValueError(f"Marker set does not contain valid HMM entries: {models_path}")
+
+    loaded = MarkerSet(digest=digest, hmms=tuple(hmms), profiles=tuple(profiles))
+    _LOADED[digest] = loaded
+    return loaded
@@ -5,6 +5,7 @@ import pandas as pd
 from Bio import SeqIO
 from ete3 import Tree
 
+from sgtree.catalog import RunCatalog
 from sgtree.config import Config
 from sgtree.id_schema import parse_savedname, parse_sequence_id
 from sgtree.parallel import map_processed, map_threaded
@@ -58,7 +59,17 @@ def choose_best_candidate(
     )
 
 
-def _load_score_table(table_path: str) -> tuple[pd.DataFrame, str]:
+def _load_score_table(
+    table_path: str | RunCatalog,
+    savednames: list[str] | None = None,
+) -> tuple[pd.DataFrame, str]:
+    """Load hit scores indexed by savedname from ``table_elim_dups`` or the run catalog.
+
+    Catalog lookups are limited to ``savednames`` when given; the CSV is
+    always read whole.
+    """
+    if isinstance(table_path, RunCatalog):
+        return table_path.score_table(savednames), "score_bits"
     dfa = pd.read_csv(table_path)
     if "savedname" not in dfa.columns:
         raise ValueError(f"Missing required column 'savedname' in {table_path}")
@@ -105,6 +116,8 @@ def _build_duplicate_map(lst_nodes: list[str], score_table: pd.DataFrame, score_
 
 
 def _build_contig_support_map(score_table: pd.DataFrame) -> dict[str, int]:
+    if "contig_markers" in score_table.columns:
+        return {str(name): int(count) for name, count in score_table["contig_markers"].items()}
     df = score_table.reset_index().copy()
     if "namemodel" not in df.columns:
         return {str(row.savedname): 1 for row in df.itertuples(index=False)}
@@ -247,7 +260,7 @@ def _optimize_selected_entries(
 def resolve_marker_tree(
     marker_tree_path: str,
     species_tree_path: str,
-    table_path: str,
+    table_path: str | RunCatalog,
     marker_name: str,
     ls_refs: list[str] | None,
     selection_mode: str,
@@ -255,9 +268,11 @@ def resolve_marker_tree(
     lock_references: bool,
     initial_kept: dict[tuple[str, str], str] | None = None,
 ) -> tuple[list[str], list[dict]]:
-    score_table, score_col = _load_score_table(table_path)
     marker_tree = Tree(marker_tree_path)
     lst_nodes = [leaf.name for leaf in marker_tree.iter_leaves()]
+    score_table, score_col = _load_score_table(
+        table_path, [node.replace("|", "/") for node in lst_nodes]
+    )
     dups = _build_duplicate_map(lst_nodes, score_table, score_col)
     contig_support_map = _build_contig_support_map(score_table)
     species_tree = Tree(species_tree_path)
@@ -320,6 +335,14 @@ def resolve_marker_tree(
     return cleaned_nodes, records
 
 
+def _kept_from_records(records: list[dict]) -> dict[tuple[str, str], str]:
+    return {
+        (record["marker"], record["protein_id"].split("/")[0]): record["protein_id"]
+        for record in records
+        if record["status"] == "Kept"
+    }
+
+
 def _load_kept_assignments(rf_outfile: str) -> dict[tuple[str, str], str]:
     kept: dict[tuple[str, str], str] = {}
     if not os.path.exists(rf_outfile):
@@ -372,12 +395,13 @@ def _process_tree_worker(args):
             f.write(f"{item}\n")
         f.write(f"{len(removed)} {len(cleaned_nodes) + len(removed)}\n{'*' * 80}\n")
 
-    with open(rf_outfile, "a") as f:
-        for record in records:
-            f.write(
-                f"{record['protein_id']} {record['marker']} "
-                f"{record['rf_distance']:.6f} {record['status']}\n"
-            )
+    if rf_outfile is not None:
+        with open(rf_outfile, "a") as f:
+            for record in records:
+                f.write(
+                    f"{record['protein_id']} {record['marker']} "
+                    f"{record['rf_distance']:.6f} {record['status']}\n"
+                )
 
     t = Tree(filepath)
     t_final = t.copy()
@@ -389,6 +413,7 @@ def _process_tree_worker(args):
             f"_no_dups_{marker_name}_.nw",
         ),
     )
+    return records
 
 
 def run_noperm(
@@ -396,6 +421,7 @@ def run_noperm(
     ls_refs: list[str] | None,
     species_tree_path: str | None = None,
     initial_kept: dict[tuple[str, str], str] | None = None,
+    round_idx: int = 1,
 ):
     """RF-distance based marker selection.
 
@@ -403,7 +429,8 @@ def run_noperm(
     compare RF distance to species tree, keep the copy producing lowest RF distance.
     """
     treeout_dir = os.path.join(cfg.outdir, "treeouts_protTrees")
-    table_path = os.path.join(cfg.outdir, "table_elim_dups")
+    catalog = cfg.run_catalog()
+    table_path = catalog or os.path.join(cfg.outdir, "table_elim_dups")
 
     # create output directories
     for d in [
@@ -415,9 +442,11 @@ def run_noperm(
     ]:
         os.makedirs(d, exist_ok=True)
 
-    rf_outfile = os.path.join(cfg.outdir, "marker_selection_rf_values.txt")
-    with open(rf_outfile, "w") as f:
-        f.write("ProteinID MarkerGene RFdistance Status\n")
+    rf_outfile = None
+    if cfg.write_legacy_tables:
+        rf_outfile = os.path.join(cfg.outdir, "marker_selection_rf_values.txt")
+        with open(rf_outfile, "w") as f:
+            f.write("ProteinID MarkerGene RFdistance Status\n")
 
     if species_tree_path is None:
         species_tree_path = os.path.join(cfg.outdir, "tree.nwk")
@@ -438,8 +467,14 @@ def run_noperm(
         for f in ls_of_files
     ]
 
-    map_processed(_process_tree_worker, args, cfg.num_cpus)
-    return _load_kept_assignments(rf_outfile)
+    records = [
+        record
+        for marker_records in map_processed(_process_tree_worker, args, cfg.num_cpus)
+        for record in marker_records
+    ]
+    if catalog is not None:
+        catalog.record_selection(round_idx, records)
+    return _kept_from_records(records)
 
 
 def _tree_to_genome_level(tree: Tree) -> Tree:
@@ -927,7 +962,9 @@ def _propose_singleton_prune_worker(args):
         score_table = None
         score_col = None
         if effective_mode in {"topoknn", "outlier", "hybrid"}:
-            score_table, score_col = _load_score_table(table_path)
+            score_table, score_col = _load_score_table(
+                table_path, [leaf.name.replace("|", "/") for leaf in tf.iter_leaves()]
+            )
         chosen = choose_singleton_prune(
             species_tree=ti,
             working_tree=tf,
@@ -1029,12 +1066,17 @@ def remove_singles(cfg: Config, species_tree_path: str | None = None):
     files = glob.glob(os.path.join(cfg.outdir, "protTrees", "no_duplicates", "out", "*"))
     if species_tree_path is None:
         species_tree_path = os.path.join(cfg.outdir, "tree.nwk")
-    duplicate_markers = {
-        marker
-        for marker, _genome in _load_kept_assignments(
+    catalog = cfg.run_catalog()
+    table_path = catalog or os.path.join(cfg.outdir, "table_elim_dups")
+    if catalog is not None:
+        kept_assignments = catalog.kept_assignments()
+        contig_marker_context = catalog.contig_marker_context()
+    else:
+        kept_assignments = _load_kept_assignments(
             os.path.join(cfg.outdir, "marker_selection_rf_values.txt")
         )
-    }
+        contig_marker_context = _load_contig_marker_context(table_path)
+    duplicate_markers = {marker for marker, _genome in kept_assignments}
     args = [
         (
             f,
@@ -1042,7 +1084,7 @@ def remove_singles(cfg: Config, species_tree_path: str | None = None):
             cfg.num_nei,
             cfg.singles_min_rfdist,
             cfg.singles_mode,
-            os.path.join(cfg.outdir, "table_elim_dups"),
+            table_path,
             duplicate_markers,
         )
         for f in files
@@ -1061,7 +1103,7 @@ def remove_singles(cfg: Config, species_tree_path: str | None = None):
         )
     proposals = classify_singleton_proposals(
         proposals,
-        contig_marker_context=_load_contig_marker_context(os.path.join(cfg.outdir, "table_elim_dups")),
+        contig_marker_context=contig_marker_context,
     )
     accepted = select_singleton_proposals(
         [proposal for proposal in proposals if proposal.get("singleton_class") == "contamination_candidate"],
@@ -25,15 +25,28 @@ def map_threaded(func: Callable[[T], R], args: list[T], workers: int) -> list[R]
         return list(executor.map(func, args))
 
 
-def map_processed(func: Callable[[T], R], args: list[T], workers: int) -> list[R]:
+def map_processed(
+    func: Callable[[T], R],
+    args: list[T],
+    workers: int,
+    chunksize: int | None = None,
+    initializer: Callable[..., None] | None = None,
+    initargs: tuple = (),
+) -> list[R]:
+    """``func`` over ``args`` in a process pool.
+
+    ``initializer(*initargs)`` runs once in every worker before its first
+    task, or once in this process when the tasks run serially.
+    """
     if not args:
         return []
     n_workers = _bounded_workers(workers, len(args))
-    if n_workers <= 1:
-        return [func(item) for item in args]
-    try:
-        with mp.Pool(n_workers) as pool:
-            return pool.map(func, args)
-    except (PermissionError, OSError) as exc:
-        print(f"warning: multiprocessing unavailable ({exc}); falling back to serial execution")
-        return [func(item) for item in args]
+    if n_workers > 1:
+        try:
+            with mp.Pool(n_workers, initializer, initargs) as pool:
+                return pool.map(func, args, chunksize)
+        except (PermissionError, OSError) as exc:
+            print(f"warning: multiprocessing unavailable ({exc}); falling back to serial execution")
+    if initializer is not None:
+        initializer(*initargs)
+    return [func(item) for item in args]
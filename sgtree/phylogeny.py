@@ -20,7 +20,7 @@ def run_fasttree(input_fasta: str, output_tree: str, threads: int):
     subprocess.run(cmd, stdout=subprocess.PIPE, check=True)
 
 
-def _run_iqtree(input_fasta: str, output_tree: str, cpus: int, model: str, fast: bool):
+def _run_iqtree(input_fasta: str, output_tree: str, cpus: int, model: str, fast: bool, redo: bool = False):
     """Run IQ-TREE and copy resulting treefile to output_tree."""
     prefix = output_tree + ".iqtree"
     cmd = [
@@ -30,6 +30,9 @@ def _run_iqtree(input_fasta: str, output_tree: str, cpus: int, model: str, fast:
         "-m", model,
         "-T", str(max(1, cpus)),
     ]
+    if redo:
+        # --update rebuilds the tree next to the previous run's checkpoint
+        cmd.append("-redo")
     if fast:
         cmd.append("-fast")
     cmd.extend(["-s", input_fasta])
@@ -44,7 +47,7 @@ def _run_iqtree(input_fasta: str, output_tree: str, cpus: int, model: str, fast:
 def run_species_tree(cfg: Config, input_fasta: str, output_tree: str):
     """Run selected tree method for the species tree."""
     if cfg.tree_method == "iqtree":
-        _run_iqtree(input_fasta, output_tree, cfg.num_cpus, cfg.iqtree_model, cfg.iqtree_fast)
+        _run_iqtree(input_fasta, output_tree, cfg.num_cpus, cfg.iqtree_model, cfg.iqtree_fast, cfg.update)
     else:
         run_fasttree(input_fasta, output_tree, cfg.num_cpus)
 
@@ -76,13 +79,13 @@ def run_snp_tree(cfg: Config, input_fasta: str, output_tree: str):
 
 def _build_tree_worker(args):
     """Worker: build a single protein tree with selected tree method."""
-    filepath, treeout_dir, tree_method, iqtree_model, iqtree_fast = args
+    filepath, treeout_dir, tree_method, iqtree_model, iqtree_fast, redo = args
     tree_out = os.path.join(
         treeout_dir,
         os.path.basename(filepath) + "_tree.out",
     )
     if tree_method == "iqtree":
-        _run_iqtree(filepath, tree_out, 1, iqtree_model, iqtree_fast)
+        _run_iqtree(filepath, tree_out, 1, iqtree_model, iqtree_fast, redo)
     else:
         cmd = [_fasttree_executable(), "-threads", "1", "-quiet", "-out", tree_out, filepath]
         result = subprocess.run(cmd, stdout=subprocess.PIPE, check=True)
@@ -94,7 +97,7 @@ def run_fasttree_per_marker(cfg: Config, trimmed_dir: str, treeout_dir: str):
 
     files = glob.glob(os.path.join(trimmed_dir, "*"))
     args = [
-        (f, treeout_dir, cfg.tree_method, cfg.iqtree_model, cfg.iqtree_fast)
+        (f, treeout_dir, cfg.tree_method, cfg.iqtree_model, cfg.iqtree_fast, cfg.update)
         for f in files
     ]
     if not args:
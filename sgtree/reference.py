@@ -172,6 +172,10 @@ def prepare_reference(cfg: Config) -> list[str] | None:
         "--save_dir", ref_dir,
         "--is_ref", "yes",
     ]
+    if cfg.cache_dir:
+        cmd += ["--cache_dir", cfg.cache_dir, "--cache_max_gb", str(cfg.cache_max_gb)]
+    if cfg.search_chunk:
+        cmd += ["--search_chunk", str(cfg.search_chunk)]
     print("- ... Creating new reference directory\n", cmd)
     subprocess.run(cmd, stdout=subprocess.PIPE, check=True)
 
@@ -188,7 +192,7 @@ def prepare_reference(cfg: Config) -> list[str] | None:
             shutil.rmtree(filepath)
         else:
             keep_files = (
-                "marker_count_matrix.csv", "proteomes",
+                "marker_count_matrix.csv", "proteomes", "proteomes.fai",
                 "hits.hmmout", "table_elim_dups", "genome_manifest.tsv",
             )
             if basename in keep_files:
@@ -203,7 +207,7 @@ def prepare_reference(cfg: Config) -> list[str] | None:
     for f in glob.glob(os.path.join(ref_dir, "*.txt")):
         shutil.move(f, os.path.join(ref_dir, "temp"))
 
-    for name in ("ref_and_query_proteomes", "models", "tree.nwk"):
+    for name in ("models", "tree.nwk"):
         src = os.path.join(ref_dir, name)
         if os.path.exists(src):
             shutil.move(src, os.path.join(ref_dir, "temp"))
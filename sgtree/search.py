@@ -1,19 +1,39 @@
 import os
 import glob
+import hashlib
+import heapq
+import io
+import itertools
+import pickle
 import shutil
-import subprocess
+import tempfile
 import time
 
+import numpy as np
 import pandas as pd
+import pyhmmer
 from pyhmmer import easel, hmmer, plan7
 
+from sgtree.cache import DiskCache, text_digest
 from sgtree.config import Config
-from sgtree.fasta_normalize import normalize_and_concat_proteomes
-from sgtree.id_schema import parse_savedname
-from sgtree.input_stage import detect_input_format, gene_call_inputs, write_genome_manifest
+from sgtree.fasta_index import fai_path
+from sgtree.fasta_normalize import normalize_proteomes_by_file
+from sgtree.input_stage import (
+    GenomeInput,
+    detect_input_format,
+    gene_call_inputs,
+    link_gene_calls,
+    write_genome_manifest,
+)
+from sgtree.marker_db import load_models, press_models
+from sgtree.sequence_dedup import read_members, write_unique_store
 
 
-def _cap_namemodel_duplicates(df: pd.DataFrame, max_per_group: int = 5) -> pd.DataFrame:
+# copies of one marker kept per genome, best bitscore first (ties: savedname)
+MAX_MARKER_COPIES = 5
+
+
+def _cap_namemodel_duplicates(df: pd.DataFrame, max_per_group: int = MAX_MARKER_COPIES) -> pd.DataFrame:
     if df.empty:
         return df.copy()
     if "namemodel" not in df.columns:
@@ -28,6 +48,39 @@ def _cap_namemodel_duplicates(df: pd.DataFrame, max_per_group: int = 5) -> pd.Da
     )
 
 
+HIT_CACHE_VERSION = 1
+
+# Hit table columns keep the domtblout field numbers used since the text
+# parser (0 target, 3 query, 7 bitscore, ...).
+HIT_TABLE_DTYPES = {
+    0: object,      # target name
+    1: object,      # target accession
+    2: np.int64,    # target length
+    3: object,      # query (marker) name
+    4: object,      # query accession
+    5: np.int64,    # query length
+    6: np.float64,  # full-sequence E-value
+    7: np.float64,  # full-sequence bitscore
+    8: np.float64,  # full-sequence bias
+    9: np.int64,    # domain number
+    10: np.int64,   # number of reported domains
+    11: np.float64,  # domain conditional E-value
+    12: np.float64,  # domain independent E-value
+    13: np.float64,  # domain bitscore
+    14: np.float64,  # domain bias
+    15: np.int64,   # hmm from
+    16: np.int64,   # hmm to
+    17: np.int64,   # alignment from
+    18: np.int64,   # alignment to
+    19: np.int64,   # envelope from
+    20: np.int64,   # envelope to
+    21: object,     # acc, mean posterior probability of the aligned residues, as printed (0.98); - unless text tables are written
+    22: object,     # target description
+}
+
+BIT_CUTOFFS = {"cut_ga": "gathering", "cut_tc": "trusted", "cut_nc": "noise"}
+
+
 def _count_models_in_hmm(models_path: str) -> int:
     count = 0
     with open(models_path, "rb") as handle:
@@ -60,75 +113,236 @@ def concat_inputs(cfg: Config) -> int:
     model_count = _count_models_in_hmm(cfg.models_path)
     if model_count == 0:
         raise ValueError(f"No HMM models found in marker set: {cfg.modeldir}")
+    press_models(cfg.models_path, cfg.cache("models"))
 
     os.makedirs(cfg.outdir, exist_ok=True)
     map_path = os.path.join(cfg.outdir, "proteomes_header_map.tsv")
     input_format = cfg.input_format
     if input_format == "auto":
         input_format = detect_input_format(cfg.genomedir)
+    genomes = stage_genomes(
+        cfg,
+        cfg.genomedir,
+        input_format,
+        proteomes_path=cfg.proteomes_path,
+        map_path=map_path,
+        staged_dir=cfg.staged_proteomes_dir,
+        gene_call_map_path=cfg.gene_call_map_path,
+    )
+    # manifest, banner and logfile counts all reuse this single staging pass
+    cfg.staged_inputs[cfg.genomedir] = genomes
+    if cfg.dedup_sequences:
+        write_unique_store(cfg.proteomes_path, cfg.unique_proteomes_path, cfg.sequence_members_path)
+    catalog = cfg.run_catalog()
+    if catalog is not None:
+        catalog.reset()
+        catalog.record_genomes(genomes)
+        catalog.record_proteins(map_path)
+        if cfg.dedup_sequences:
+            catalog.record_sequence_members(cfg.sequence_members_path)
+        if not cfg.write_legacy_tables:
+            os.remove(map_path)
+    write_genome_manifest(
+        cfg.genomedir,
+        input_format=input_format,
+        manifest_path=cfg.genome_manifest_path,
+        genomes=genomes,
+    )
+    cfg.input_format = input_format
+
+    return model_count
+
+
+def stage_genomes(
+    cfg: Config,
+    genomedir: str,
+    input_format: str,
+    *,
+    proteomes_path: str,
+    map_path: str,
+    staged_dir: str,
+    gene_call_map_path: str,
+) -> list[GenomeInput]:
+    """Gene-call (FNA) and normalize ``genomedir`` into ``proteomes_path``.
+
+    Returns one record per input genome; ``concat_inputs`` stages the whole
+    input set and ``--update`` stages only the new genomes.
+    """
+    staging_cache = cfg.cache("staging")
     if input_format == "fna":
-        staged = gene_call_inputs(
-            cfg.genomedir,
-            cfg.staged_proteomes_dir,
-            cfg.gene_call_map_path,
-        )
+        staged = None
+        if cfg.ani_cluster and genomedir == cfg.ani_selected_query_dir:
+            # ANI discovery already gene-called every query assembly
+            staged = link_gene_calls(
+                cfg.staged_inputs.get(cfg.original_genomedir, []),
+                genomedir,
+                staged_dir,
+                gene_call_map_path,
+                cfg.ani_gene_call_map_path,
+            )
+        if staged is None:
+            staged = gene_call_inputs(
+                genomedir,
+                staged_dir,
+                gene_call_map_path,
+                num_workers=cfg.num_cpus,
+                cache=staging_cache,
+            )
         source_path = staged.staged_source
     elif input_format == "faa":
         staged = None
-        source_path = cfg.genomedir
+        source_path = genomedir
     else:
         raise ValueError(f"Unsupported input format: {input_format}")
 
-    write_genome_manifest(
-        cfg.genomedir,
-        input_format=input_format,
-        manifest_path=cfg.genome_manifest_path,
-        staged_source=cfg.staged_proteomes_dir if input_format == "fna" else None,
+    stats, per_file = normalize_proteomes_by_file(
+        source_path,
+        proteomes_path,
+        map_path,
+        num_workers=cfg.num_cpus,
+        cache=staging_cache,
     )
-    stats = normalize_and_concat_proteomes(source_path, cfg.proteomes_path, map_path)
-    cfg.input_format = input_format
+    if staged is not None:
+        genomes = list(staged.genomes)
+    else:
+        genomes = [
+            GenomeInput(
+                genome_id=genome_id,
+                input_format="faa",
+                source_file=os.path.abspath(path),
+                proteins=records,
+            )
+            for path, genome_id, records, _cached in per_file
+        ]
     print(
         "-... normalized proteomes "
         f"(format={input_format}, genomes={stats['genomes']}, contigs={stats['contigs']}, records={stats['records']}, "
         f"invalid_chars_replaced={stats['invalid_chars_replaced']})"
     )
-
-    return model_count
-
-
-def run_hmmsearch(cfg: Config):
-    """Run pyhmmer search on models vs proteomes with configurable threshold mode."""
+    if staging_cache is not None:
+        reused = sum(1 for *_, cached in per_file if cached)
+        if staged is not None:
+            reused = f"{staged.cached} gene-called, {reused} normalized"
+        evicted = staging_cache.evict()
+        print(
+            f"-... staging cache {staging_cache.directory}: reused {reused} of {len(genomes)} genomes"
+            f", evicted {len(evicted)} entries"
+        )
+    return genomes
+
+
+def threshold_options(cutoff: str, evalue: float) -> dict:
+    """hmmsearch reporting thresholds for ``--hmmsearch_cutoff``/``--hmmsearch_evalue``."""
+    if cutoff in BIT_CUTOFFS:
+        return {"bit_cutoffs": BIT_CUTOFFS[cutoff]}
+    return {"E": evalue, "domE": evalue}
+
+
+def run_hmmsearch(
+    cfg: Config,
+    *,
+    proteomes_path: str | None = None,
+    hits_path: str | None = None,
+    database_size: int | None = None,
+):
+    """Run pyhmmer search on models vs proteomes with configurable threshold mode.
+
+    Returns ``(hits, elapsed)``: the typed hit table (see
+    :func:`hits_to_table`) for ``parse_hmmsearch`` and the search runtime.
+    Unless the length filter, the step tables or the catalog need every
+    hit, the table only holds the ``MAX_MARKER_COPIES`` copies per genome
+    and marker that the duplicate cap keeps; the full copy counts for the
+    genome filters are left in ``cfg.marker_copies[hits_path]``.
+    The domtblout text export is written to ``hits_path`` only when
+    ``cfg.export_hmmout`` is set. The queries are the optimized profiles
+    from the pressed marker database (:func:`sgtree.marker_db.load_models`).
+
+    ``--update`` searches only the new genomes' proteomes into a separate hit
+    file; ``database_size`` then fixes the E-value search space (``Z``) to the
+    combined proteome count so new E-values are on the same scale as a full
+    search of the combined proteomes.
+
+    With ``cfg.search_chunk`` the proteome store is parsed once and searched
+    in blocks of that many sequences (see :func:`_search_chunked`); without
+    it pyhmmer re-reads the store for every marker. The hit cache path
+    streams one genome at a time. With ``cfg.dedup_sequences`` and a bit
+    cutoff only the distinct sequences of the store are searched (see
+    :mod:`sgtree.sequence_dedup`) and their hits fanned out in the table.
+    """
+    proteomes_path = proteomes_path or cfg.proteomes_path
+    hits_path = hits_path or cfg.hitsoutdir
     print("-... running hmmsearch")
     start = time.time()
 
-    with plan7.HMMFile(cfg.models_path) as hmm_file:
-        hmms = list(hmm_file)
-    if not hmms:
-        raise ValueError(f"Marker set does not contain valid HMM entries: {cfg.models_path}")
-
-    base_opts = {}
-    if cfg.hmmsearch_cutoff == "cut_ga":
-        base_opts["bit_cutoffs"] = "gathering"
-    elif cfg.hmmsearch_cutoff == "cut_tc":
-        base_opts["bit_cutoffs"] = "trusted"
-    elif cfg.hmmsearch_cutoff == "cut_nc":
-        base_opts["bit_cutoffs"] = "noise"
-    else:
-        base_opts["E"] = cfg.hmmsearch_evalue
-        base_opts["domE"] = cfg.hmmsearch_evalue
+    markers = load_models(cfg.models_path)
+    profiles = list(markers.profiles)
+
+    base_opts = threshold_options(cfg.hmmsearch_cutoff, cfg.hmmsearch_evalue)
+    if database_size:
+        base_opts["Z"] = database_size
+
+    # bit cutoffs report the same hits for a sequence wherever it is searched,
+    # so the distinct sequences stand in for the store with Z fixed to its
+    # size; the domtblout export would only list the distinct sequences
+    members = None
+    if (
+        cfg.dedup_sequences
+        and proteomes_path == cfg.proteomes_path
+        and cfg.hmmsearch_cutoff in BIT_CUTOFFS
+        and not cfg.export_hmmout
+    ):
+        members = read_members(cfg.sequence_members_path)
+        base_opts["Z"] = _count_sequences(proteomes_path)
+        proteomes_path = cfg.unique_proteomes_path
+
+    # per-genome hits only add up to a full search when no threshold depends on Z
+    hit_cache = None
+    if cfg.hmmsearch_cutoff in BIT_CUTOFFS and not database_size and members is None:
+        hit_cache = cfg.cache("hits")
+    key_parts = ()
+    if hit_cache is not None:
+        key_parts = (markers.digest, cfg.hmmsearch_cutoff, cfg.hmmsearch_evalue)
+
+    # the length filter, the step tables and the catalog's duplicate caps
+    # need every hit; otherwise only the copies the cap can keep are collected
+    top_k = 0
+    if cfg.lflt_fraction <= 0 and not cfg.write_intermediate_tables and not cfg.catalog:
+        top_k = MAX_MARKER_COPIES
+    cfg.marker_copies.pop(hits_path, None)
 
     requested_cpus = max(1, cfg.num_cpus)
 
     def _run_search(cpus: int):
         search_opts = dict(base_opts)
         search_opts["cpus"] = cpus
-        with easel.SequenceFile(cfg.proteomes_path, digital=True, alphabet=hmms[0].alphabet) as seq_file:
-            with open(cfg.hitsoutdir, "wb") as hits_out:
-                for i, hits in enumerate(hmmer.hmmsearch(hmms, seq_file, **search_opts)):
-                    hits.write(hits_out, format="domains", header=(i == 0))
+        with easel.SequenceFile(proteomes_path, digital=True, alphabet=markers.alphabet) as seq_file:
+            if hit_cache is not None:
+                results = _search_with_hit_cache(profiles, seq_file, search_opts, hit_cache, key_parts)
+            elif cfg.search_chunk:
+                search_opts.setdefault("Z", _count_sequences(proteomes_path))
+                results = _search_chunked(profiles, seq_file, search_opts, cfg.search_chunk)
+            else:
+                results = list(hmmer.hmmsearch(profiles, seq_file, **search_opts))
+        # acc is only read from the domtblout text, so it is formatted for
+        # the text tables that print it and shared with the export
+        accuracies = [] if cfg.write_legacy_tables or cfg.write_intermediate_tables else None
+        if cfg.export_hmmout:
+            write_hits(results, hits_path, accuracies)
+        elif accuracies is not None:
+            accuracies = [_domain_accuracies(_domain_text(top_hits)) for top_hits in results]
+        if not top_k:
+            return hits_to_table(results, members=members, accuracies=accuracies)
+        copies: dict = {}
+        table = hits_to_table(results, top_k=top_k, copies=copies, members=members, accuracies=accuracies)
+        cfg.marker_copies[hits_path] = copies
+        print(
+            f"-... kept the best {top_k} copies per genome and marker: "
+            f"{table[0].nunique()} of {sum(copies.values())} marker proteins"
+        )
+        return table
 
     try:
-        _run_search(requested_cpus)
+        hit_table = _run_search(requested_cpus)
     except PermissionError as e:
         if requested_cpus == 1:
             raise
@@ -136,16 +350,348 @@ def run_hmmsearch(cfg: Config):
             f"warning: pyhmmer multiprocessing unavailable ({e}); "
             "retrying hmmsearch with cpus=1"
         )
-        _run_search(1)
+        hit_table = _run_search(1)
 
     elapsed = time.time() - start
     print(f"\nmarker protein detection done - runtime: {elapsed:.1f} seconds")
     print("=" * 80)
-    return elapsed
+    return hit_table, elapsed
+
+
+def write_hits(results, hits_path: str, accuracies: list | None = None) -> None:
+    """Export per-model ``TopHits`` as the ``hits.hmmout`` domtblout.
+
+    With an ``accuracies`` list, each model's domain ``acc`` values (see
+    :func:`_domain_accuracies`) are appended to it from the text written.
+    """
+    with open(hits_path, "wb") as hits_out:
+        for i, hits in enumerate(results):
+            if accuracies is None:
+                hits.write(hits_out, format="domains", header=(i == 0))
+                continue
+            text = _domain_text(hits, header=(i == 0))
+            hits_out.write(text)
+            accuracies.append(_domain_accuracies(text))
+
+
+def _evalue(value: float) -> float:
+    return float(f"{value:.2g}")
+
+
+def _score(value: float) -> float:
+    return float(f"{value:.1f}")
+
+
+class _WorseFirst:
+    """Heap key ordering savednames descending, so the heap root is the copy to drop next."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __lt__(self, other: "_WorseFirst") -> bool:
+        return self.name > other.name
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _WorseFirst) and self.name == other.name
 
 
-def parse_hmmsearch(cfg: Config) -> tuple[pd.DataFrame, dict]:
-    """Parse hmmsearch domtblout, count markers per genome, filter incomplete genomes.
+def _reported_targets(top_hits, members: dict | None) -> tuple[list, float]:
+    """``(target name, hit)`` pairs of ``top_hits`` in domtblout order, and its ``domZ``.
+
+    With ``members`` (see :mod:`sgtree.sequence_dedup`) the hit of a unique
+    sequence stands for every ID that carries it: the pairs are fanned out
+    and ordered like a search of the full store (score descending, then
+    name), and ``domZ``, the number of reported targets, counts every copy.
+    """
+    targets = [(hit.name, hit) for hit in top_hits.reported]
+    if not members:
+        return targets, top_hits.domZ
+    targets = [
+        (name, hit)
+        for representative, hit in targets
+        for name in (representative, *members.get(representative, ()))
+    ]
+    targets.sort(key=lambda target: (-target[1].score, target[0]))
+    return targets, top_hits.domZ + len(targets) - len(top_hits.reported)
+
+
+def _top_copies(results, reported: list, top_k: int, copies: dict) -> list[set[int]]:
+    """Positions in ``reported`` of the targets ``build_working_df`` can keep after its duplicate cap.
+
+    Mirrors the cap on the full table: a protein's first row (earliest
+    marker) survives the savedname de-duplication, and each genome+marker
+    group keeps its ``top_k`` best rows by rounded bitscore, then savedname.
+    A bounded heap per genome holds the current best copies of one marker,
+    so pruned hits never reach the table. ``copies`` receives the distinct
+    proteins per ``(genome, marker)`` of the full table, in first-seen order.
+    """
+    seen: set[str] = set()
+    kept = []
+    for top_hits, (targets, _dom_z) in zip(results, reported):
+        marker = top_hits.query.name
+        heaps: dict[str, list] = {}
+        names: set[str] = set()
+        for position, (name, hit) in enumerate(targets):
+            if name in names or next(iter(hit.domains.reported), None) is None:
+                continue
+            names.add(name)
+            genome = name.split("|", 1)[0]
+            copies[(genome, marker)] = copies.get((genome, marker), 0) + 1
+            savedname = name.replace("|", "/")
+            if savedname in seen:
+                continue
+            seen.add(savedname)
+            entry = (_score(hit.score), _WorseFirst(savedname), position)
+            heap = heaps.setdefault(genome, [])
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heappushpop(heap, entry)
+        kept.append({entry[2] for heap in heaps.values() for entry in heap})
+    return kept
+
+
+def _domain_text(top_hits, header: bool = False) -> bytes:
+    buffer = io.BytesIO()
+    top_hits.write(buffer, format="domains", header=header)
+    return buffer.getvalue()
+
+
+def _domain_accuracies(text: bytes) -> dict[tuple[str, int], str]:
+    """domtblout ``acc`` of every reported domain, by (target name, domain number).
+
+    pyhmmer does not expose the optimal-accuracy score behind it, so it is
+    read from the domain table HMMER itself writes.
+    """
+    accuracies = {}
+    for line in text.decode().splitlines():
+        if line.startswith("#"):
+            continue
+        fields = line.split(None, 22)
+        accuracies[(fields[0], int(fields[9]))] = fields[21]
+    return accuracies
+
+
+def hits_to_table(
+    results,
+    top_k: int = 0,
+    copies: dict | None = None,
+    members: dict[str, list[str]] | None = None,
+    accuracies: list | None = None,
+) -> pd.DataFrame:
+    """Collect reported domains from ``TopHits`` into the typed hit table.
+
+    One row per reported domain, in the order of the domtblout export.
+    Scores and E-values are rounded to the export's precision so a table
+    built in memory equals one read back with :func:`read_hit_table`.
+    With ``top_k`` only the proteins the duplicate cap keeps are collected
+    (see :func:`_top_copies`); ``copies`` then receives the full counts.
+    ``members`` fans hits of a deduplicated store back out to every
+    protein with the same sequence (see :func:`_reported_targets`); the
+    search must then fix ``Z`` to the full store.
+    The ``acc`` column (21) comes from per-model ``accuracies`` (see
+    :func:`write_hits`) and is ``-`` without them.
+    """
+    reported = [_reported_targets(top_hits, members) for top_hits in results]
+    kept = None
+    if top_k:
+        kept = _top_copies(results, reported, top_k, {} if copies is None else copies)
+    columns: dict[int, list] = {label: [] for label in HIT_TABLE_DTYPES}
+    for index, (top_hits, (targets, dom_z)) in enumerate(zip(results, reported)):
+        query = top_hits.query
+        query_accession = query.accession or "-"
+        domain_acc = accuracies[index] if accuracies is not None else None
+        for position, (name, hit) in enumerate(targets):
+            if kept is not None and position not in kept[index]:
+                continue
+            domains = list(hit.domains.reported)
+            hit_values = (
+                name,
+                hit.accession or "-",
+                hit.length,
+                query.name,
+                query_accession,
+                query.M,
+                _evalue(hit.evalue),
+                _score(hit.score),
+                _score(hit.bias),
+            )
+            for number, domain in enumerate(domains, start=1):
+                alignment = domain.alignment
+                row = hit_values + (
+                    number,
+                    len(domains),
+                    # the conditional E-value, with domZ counting fanned-out copies
+                    _evalue(domain.pvalue * dom_z),
+                    _evalue(domain.i_evalue),
+                    _score(domain.score),
+                    _score(domain.bias),
+                    alignment.hmm_from,
+                    alignment.hmm_to,
+                    alignment.target_from,
+                    alignment.target_to,
+                    domain.env_from,
+                    domain.env_to,
+                    domain_acc[(hit.name, number)] if domain_acc is not None else "-",
+                    hit.description or "-",
+                )
+                for label, value in zip(HIT_TABLE_DTYPES, row):
+                    columns[label].append(value)
+    return pd.DataFrame(
+        {label: np.array(values, dtype=HIT_TABLE_DTYPES[label]) for label, values in columns.items()}
+    )
+
+
+def read_hit_table(hits_path: str) -> pd.DataFrame:
+    """Read a ``hits.hmmout`` domtblout export into the typed hit table."""
+    frame = pd.read_csv(hits_path, comment="#", sep=r'\s+', header=None, dtype=str)
+    if frame.empty:
+        return hits_to_table([])
+    return pd.DataFrame(
+        {label: frame[label].astype(dtype) for label, dtype in HIT_TABLE_DTYPES.items()}
+    )
+
+
+def _genome_blocks(sequences):
+    """Yield ``(genome, sequences)`` runs of normalized ``genome|contig|gene`` records in store order."""
+    for genome, group in itertools.groupby(sequences, key=lambda sequence: sequence.name.split("|", 1)[0]):
+        yield genome, list(group)
+
+
+def _count_sequences(fasta_path: str) -> int:
+    """Record count of a FASTA store, from its ``.fai`` when there is one."""
+    index = fai_path(fasta_path)
+    path, marker = (index, None) if os.path.exists(index) else (fasta_path, b">")
+    count = 0
+    with open(path, "rb") as handle:
+        for line in handle:
+            if marker is None or line.startswith(marker):
+                count += 1
+    return count
+
+
+def _merge_hits(merged: list | None, hits: list) -> list:
+    # merge as each block finishes: unmerged per-block TopHits hold far more
+    # memory than the hits they report
+    if merged is None:
+        return hits
+    return [previous.merge(top_hits) for previous, top_hits in zip(merged, hits)]
+
+
+def _search_chunked(
+    profiles: list,
+    seq_file,
+    search_opts: dict,
+    chunk_size: int,
+    limit: int | None = None,
+) -> list:
+    """hmmsearch ``seq_file`` in blocks of ``chunk_size`` sequences.
+
+    Each block is parsed once and searched with every profile and the full
+    ``cpus`` budget, and its hits are merged before the next block is read,
+    so memory is set by the block size rather than the store. ``search_opts``
+    must fix ``Z`` to the whole store: E-values and E-value thresholds then
+    match a single search, and ``TopHits.merge`` keeps that ``Z`` while
+    summing ``domZ`` across blocks. ``limit`` stops after that many
+    sequences (one shard of a store, see :mod:`sgtree.shard`).
+    """
+    merged = None
+    blocks = 0
+    remaining = limit
+    while remaining is None or remaining > 0:
+        block = seq_file.read_block(sequences=chunk_size if remaining is None else min(chunk_size, remaining))
+        if not block:
+            break
+        merged = _merge_hits(merged, list(hmmer.hmmsearch(profiles, block, **search_opts)))
+        blocks += 1
+        if remaining is not None:
+            remaining -= len(block)
+    print(f"-... chunked hmmsearch: {blocks} blocks of up to {chunk_size} sequences")
+    if merged is None:
+        empty = easel.DigitalSequenceBlock(profiles[0].alphabet)
+        return list(hmmer.hmmsearch(profiles, empty, **search_opts))
+    return merged
+
+
+def _sequences_digest(sequences) -> str:
+    digest = hashlib.sha256()
+    for sequence in sequences:
+        digest.update(sequence.name.encode())
+        digest.update(b"\0")
+        digest.update(bytes(sequence.sequence))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _search_with_hit_cache(
+    profiles: list,
+    sequences,
+    search_opts: dict,
+    cache: DiskCache,
+    key_parts: tuple,
+) -> list:
+    """hmmsearch ``sequences`` one genome at a time, reusing cached per-genome hits.
+
+    Each cache entry holds the pickled ``TopHits`` state of one genome for
+    every model (the query profiles are re-attached from ``profiles``). Per-model
+    results are merged in store order with ``TopHits.merge``, which sums the
+    per-genome ``Z``/``domZ`` back to the values of a single search, so the
+    written table matches an uncached run. ``sequences`` is read lazily (a
+    digital ``SequenceFile`` streams), so only one genome's sequences are
+    held at a time.
+    """
+    merged = None
+    genomes = 0
+    reused = 0
+    with tempfile.TemporaryDirectory(prefix=".hit_cache_") as tmpdir:
+        hits_file = os.path.join(tmpdir, "hits.pkl")
+        for genome, genome_sequences in _genome_blocks(sequences):
+            key = text_digest(
+                "hmmsearch",
+                HIT_CACHE_VERSION,
+                pyhmmer.__version__,
+                *key_parts,
+                _sequences_digest(genome_sequences),
+            )
+            if cache.fetch(key, {"hits.pkl": hits_file}) is not None:
+                with open(hits_file, "rb") as handle:
+                    states = pickle.load(handle)
+                restored = []
+                for profile, state in zip(profiles, states):
+                    top_hits = plan7.TopHits(profile)
+                    top_hits.__setstate__(state)
+                    restored.append(top_hits)
+                merged = _merge_hits(merged, restored)
+                genomes += 1
+                reused += 1
+                continue
+
+            block = easel.DigitalSequenceBlock(profiles[0].alphabet, genome_sequences)
+            genome_hits = list(hmmer.hmmsearch(profiles, block, **search_opts))
+            with open(hits_file, "wb") as handle:
+                pickle.dump([top_hits.__getstate__() for top_hits in genome_hits], handle)
+            cache.store(key, {"hits.pkl": hits_file}, {"genome_id": genome, "sequences": len(genome_sequences)})
+            merged = _merge_hits(merged, genome_hits)
+            genomes += 1
+
+    if merged is None:
+        empty = easel.DigitalSequenceBlock(profiles[0].alphabet)
+        return list(hmmer.hmmsearch(profiles, empty, **search_opts))
+    evicted = cache.evict()
+    print(
+        f"-... hit cache {cache.directory}: reused {reused} of {genomes} genomes"
+        f", evicted {len(evicted)} entries"
+    )
+    return merged
+
+
+def parse_hmmsearch(cfg: Config, hits: pd.DataFrame | None = None) -> tuple[pd.DataFrame, dict]:
+    """Count markers per genome in the hit table and filter incomplete genomes.
+
+    ``hits`` is the typed table returned by :func:`run_hmmsearch`; without it
+    (``--update`` runs) the table is read back from ``hits.hmmout``.
 
     Returns (finaldf, dict_counts).
     """
@@ -156,132 +702,152 @@ def parse_hmmsearch(cfg: Config) -> tuple[pd.DataFrame, dict]:
     print("\n - ...extracting best hits")
     print("MINIMUM MODELS", round(min_models * cfg.genome_count))
 
-    # optional length filtering
+    finaldf = hits if hits is not None else read_hit_table(cfg.hitsoutdir)
+
+    # optional length filtering: drop every hit of proteins shorter than
+    # lflt x the median target length of a marker they hit
     if cfg.lflt_fraction > 0:
-        df = pd.read_csv(cfg.hitsoutdir, comment="#", sep=r'\s+', header=None)
-        filtered_out = df[df[2] < df.groupby(3)[2].transform('median') * cfg.lflt_fraction][0]
-        list_torm_path = cfg.hitsoutdir + ".del.ls"
-        filtered_out.to_csv(list_torm_path, index=False, header=False)
-        out_lengthfilter = cfg.hitsoutdir + ".lfilt"
-        with open(out_lengthfilter, "w") as l_out:
-            subprocess.run(["grep", "-vwFf", list_torm_path, cfg.hitsoutdir], stdout=l_out)
-        shutil.move(out_lengthfilter, cfg.hitsoutdir)
-
-    # read domtblout as whitespace-separated, all strings
-    finaldf = pd.read_csv(cfg.hitsoutdir, comment="#", sep=r'\s+', header=None, dtype=str)
-
-    # count markers per genome
-    seen = set()
-    for _, row in finaldf.iterrows():
-        name = row[0].split("|")[0]
-        model = row[3]
-        proteinid = row[0]
-        key = f"{proteinid}_{model}"
-
-        if key not in seen:
-            seen.add(key)
-            if name not in dict_counts:
-                dict_counts[name] = {}
-            if model in dict_counts[name]:
-                dict_counts[name][model] += 1
-            else:
-                dict_counts[name][model] = 1
+        too_short = finaldf[2] < finaldf.groupby(3)[2].transform("median") * cfg.lflt_fraction
+        filtered_out = finaldf.loc[too_short, 0]
+        filtered_out.to_csv(cfg.hitsoutdir + ".del.ls", index=False, header=False)
+        finaldf = finaldf[~finaldf[0].isin(filtered_out.unique())]
+        print(f"-... length filter removed {filtered_out.nunique()} proteins")
+
+    # marker copies per genome: distinct (protein, marker) pairs, kept in
+    # first-seen genome/marker order for the count matrix and catalog; a
+    # table pruned to the top copies comes with the counts of every hit
+    row_genomes = finaldf[0].str.extract(r"^([^|]*)", expand=False)
+    copies = cfg.marker_copies.pop(cfg.hitsoutdir, None) if hits is not None else None
+    if copies is not None:
+        counts = pd.Series(
+            list(copies.values()),
+            index=pd.MultiIndex.from_tuples(list(copies), names=["genome", "model"]),
+            dtype=np.int64,
+        )
+    else:
+        pairs = pd.DataFrame({"genome": row_genomes, "model": finaldf[3], "protein": finaldf[0]})
+        counts = (
+            pairs.drop_duplicates(["protein", "model"])
+            .groupby(["genome", "model"], sort=False)
+            .size()
+        )
+    for (genome, model), copies in zip(counts.index, counts.tolist()):
+        dict_counts.setdefault(genome, {})[model] = copies
+
+    per_genome = counts.groupby(level="genome", sort=False)
+    markers_found = per_genome.size()
+    max_copies = per_genome.max()
+    dup_fraction = (counts > 1).groupby(level="genome", sort=False).sum() / cfg.model_count
 
     # filter incomplete genomes
-    incomplete_genomes = {
-        g for g in dict_counts
-        if len(dict_counts[g]) < (cfg.model_count * min_models)
+    incomplete_genomes = markers_found.index[markers_found < cfg.model_count * min_models]
+    removed_reasons = {
+        g: [f"minmarker:{markers_found[g] / cfg.model_count:.4f}"] for g in incomplete_genomes
     }
-
-    removed_reasons = {g: [f"minmarker:{len(dict_counts[g]) / cfg.model_count:.4f}"] for g in incomplete_genomes}
     removed_genomes = set(incomplete_genomes)
 
     if cfg.max_sdup >= 0:
-        high_single_dup = {
-            g for g, counts in dict_counts.items()
-            if counts and max(counts.values()) > cfg.max_sdup
-        }
-        for g in high_single_dup:
-            removed_reasons.setdefault(g, []).append(f"maxsdup:{max(dict_counts[g].values())}")
-        removed_genomes.update(high_single_dup)
+        for g in max_copies.index[max_copies > cfg.max_sdup]:
+            removed_reasons.setdefault(g, []).append(f"maxsdup:{max_copies[g]}")
+            removed_genomes.add(g)
 
     if cfg.max_dupl >= 0:
-        high_dup_fraction = set()
-        for g, counts in dict_counts.items():
-            dup_fraction = sum(1 for v in counts.values() if v > 1) / cfg.model_count
-            if dup_fraction > cfg.max_dupl:
-                high_dup_fraction.add(g)
-                removed_reasons.setdefault(g, []).append(f"maxdupl:{dup_fraction:.4f}")
-        removed_genomes.update(high_dup_fraction)
+        for g in dup_fraction.index[dup_fraction > cfg.max_dupl]:
+            removed_reasons.setdefault(g, []).append(f"maxdupl:{dup_fraction[g]:.4f}")
+            removed_genomes.add(g)
 
     keep_genomes = _load_keep_genomes(cfg)
     if keep_genomes:
-        non_representatives = {g for g in dict_counts if g not in keep_genomes}
-        for genome in non_representatives:
+        for genome in markers_found.index[~markers_found.index.isin(list(keep_genomes))]:
             removed_reasons.setdefault(genome, []).append("ani_cluster:non_representative")
-        removed_genomes.update(non_representatives)
+            removed_genomes.add(genome)
 
-    rows_to_drop = []
-    for idx, row in finaldf.iterrows():
-        name = row[0].split("|")[0]
-        if name in removed_genomes:
-            rows_to_drop.append(idx)
-    finaldf = finaldf.drop(rows_to_drop)
+    drop_mask = row_genomes.isin(removed_genomes).to_numpy()
+    rows_dropped = int(drop_mask.sum())
+    finaldf = finaldf[~drop_mask]
 
     with open(os.path.join(cfg.outdir, "log_genomes_removed.txt"), "w") as f:
         for genome in sorted(removed_genomes):
             reasons = ";".join(removed_reasons.get(genome, ["filtered"]))
             f.write(f"{genome}\t{reasons}\n")
 
-    print(f"AFTER hmmout {finaldf.shape} # rows deleted {len(rows_to_drop)}")
+    print(f"AFTER hmmout {finaldf.shape} # rows deleted {rows_dropped}")
+
+    catalog = cfg.run_catalog()
+    if catalog is not None:
+        catalog.record_marker_counts(
+            dict_counts,
+            {genome: removed_reasons.get(genome, ["filtered"]) for genome in removed_genomes},
+        )
 
     # write marker count matrix
-    kept_counts = {
-        genome: counts
-        for genome, counts in dict_counts.items()
-        if genome not in removed_genomes
-    }
-    count_mat = pd.DataFrame.from_dict(kept_counts).fillna(0)
-    count_mat.to_csv(os.path.join(cfg.outdir, "marker_count_matrix.csv"))
+    if cfg.write_legacy_tables:
+        kept_counts = {
+            genome: counts
+            for genome, counts in dict_counts.items()
+            if genome not in removed_genomes
+        }
+        count_mat = pd.DataFrame.from_dict(kept_counts).fillna(0)
+        count_mat.to_csv(os.path.join(cfg.outdir, "marker_count_matrix.csv"))
 
     return finaldf, dict_counts
 
 
+def _split_sequence_ids(ids: pd.Series) -> tuple[pd.Series, pd.Series, pd.Series]:
+    """Vectorized :func:`sgtree.id_schema.parse_sequence_id` over a column of ``genome|contig|gene`` IDs."""
+    parts = ids.str.split("|", n=2, expand=True).reindex(columns=range(3))
+    one_part = parts[1].isna()
+    two_parts = ~one_part & parts[2].isna()
+    genome = parts[0].mask(one_part, "unknown_genome")
+    contig = parts[1].mask(two_parts, "unknown_contig").fillna("unknown_contig")
+    gene = parts[2].mask(two_parts, parts[1]).mask(one_part, parts[0])
+    return genome, contig, gene
+
+
 def build_working_df(cfg: Config, finaldf: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     """Build the working dataframe with savedname and namemodel columns.
 
     Handles duplicate filtering and reference merging.
-    Returns (df, df_fordups).
+    Returns (df, df_fordups). The per-step tables under ``tables/`` are only
+    written with ``--keep_intermediates`` or ``--debug_tables``; reference
+    runs always write ``merged_final``, which query runs read back.
     """
-    finaldf = finaldf.copy()
-    finaldf["savedname"] = finaldf[0].apply(lambda c: c.replace("|", "/"))
-    parsed_ids = finaldf["savedname"].apply(parse_savedname)
-    finaldf["genome_id"] = parsed_ids.apply(lambda item: item[0])
-    finaldf["contig_id"] = parsed_ids.apply(lambda item: item[1])
-    finaldf["gene_id"] = parsed_ids.apply(lambda item: item[2])
-    df = finaldf.map(lambda x: x.split("|")[0] if isinstance(x, str) else x)
-    score_col = 7 if 7 in df.columns else ("7" if "7" in df.columns else None)
+    score_col = 7 if 7 in finaldf.columns else ("7" if "7" in finaldf.columns else None)
     if score_col is None:
         raise ValueError("Expected HMMER bitscore column '7' in parsed domtblout table")
-    df["score_bits"] = pd.to_numeric(df[score_col], errors="coerce")
-    if df["score_bits"].isna().any():
+
+    score_bits = pd.to_numeric(finaldf[score_col], errors="coerce")
+    if score_bits.isna().any():
         raise ValueError("Failed to parse one or more HMMER bitscores from column '7'")
-    df['namemodel'] = df[0] + "/" + df[3]
-    df["genome_id"] = finaldf["genome_id"]
-    df["contig_id"] = finaldf["contig_id"]
-    df["gene_id"] = finaldf["gene_id"]
-    df = df.drop_duplicates(subset='savedname', keep='first')
-    df.to_csv(os.path.join(cfg.tables_dir, "before_drops_elim_incompletes"))
 
-    # cap duplicate copy count per genome+marker group (keep best-scoring copies)
-    capped = _cap_namemodel_duplicates(df, max_per_group=5)
-    capped.to_csv(os.path.join(cfg.tables_dir, "duplicates_namemodel"))
+    # every later column is per protein, so derive them after keeping the first domain row
+    df = finaldf.assign(savedname=finaldf[0].str.replace("|", "/", regex=False))
+    df = df.drop_duplicates(subset="savedname", keep="first")
+    genome_id, contig_id, gene_id = _split_sequence_ids(df[0].str.replace("/", "|", regex=False))
+    # text columns keep only their part before the first "|" (the genome ID for column 0)
+    for column in finaldf.columns:
+        if df[column].dtype == object:
+            has_bar = df[column].str.contains("|", regex=False, na=False)
+            if has_bar.any():
+                df.loc[has_bar, column] = df.loc[has_bar, column].str.extract(r"^([^|]*)", expand=False)
+    df["genome_id"] = genome_id
+    df["contig_id"] = contig_id
+    df["gene_id"] = gene_id
+    df["score_bits"] = score_bits
+    df["namemodel"] = df[0] + "/" + df[3]
+    if cfg.write_intermediate_tables:
+        df.to_csv(os.path.join(cfg.tables_dir, "before_drops_elim_incompletes"))
 
+    # cap duplicate copy count per genome+marker group (keep best-scoring copies)
+    capped = _cap_namemodel_duplicates(df)
     dropped = df.loc[~df.index.isin(capped.index)]
-    dropped.to_csv(os.path.join(cfg.tables_dir, "dropped_namemodel"))
+    if cfg.write_intermediate_tables:
+        capped.to_csv(os.path.join(cfg.tables_dir, "duplicates_namemodel"))
+        dropped.to_csv(os.path.join(cfg.tables_dir, "dropped_namemodel"))
 
     df = capped
-    df.to_csv(os.path.join(cfg.tables_dir, "merged_final"))
+    if cfg.write_legacy_tables and (cfg.is_ref or cfg.write_intermediate_tables):
+        df.to_csv(os.path.join(cfg.tables_dir, "merged_final"))
 
     # merge with reference data if available
     if cfg.ref is not None:
@@ -290,13 +856,18 @@ def build_working_df(cfg: Config, finaldf: pd.DataFrame) -> tuple[pd.DataFrame,
         keep_genomes = _load_keep_genomes(cfg)
         if keep_genomes:
             if "genome_id" not in df_ref.columns:
-                parsed_ref = df_ref["savedname"].astype(str).apply(parse_savedname)
                 df_ref = df_ref.copy()
-                df_ref["genome_id"] = parsed_ref.apply(lambda item: item[0])
+                df_ref["genome_id"] = _split_sequence_ids(
+                    df_ref["savedname"].astype(str).str.replace("/", "|", regex=False)
+                )[0]
             df_ref = df_ref[df_ref["genome_id"].astype(str).isin(keep_genomes)]
         df = pd.concat([df, df_ref])
 
     df_fordups = df.set_index(df["savedname"])
-    df_fordups.to_csv(os.path.join(cfg.outdir, "table_elim_dups"))
+    if cfg.write_legacy_tables:
+        df_fordups.to_csv(os.path.join(cfg.outdir, "table_elim_dups"))
+    catalog = cfg.run_catalog()
+    if catalog is not None:
+        catalog.record_hits(df_fordups, dropped)
 
     return df, df_fordups
@@ -0,0 +1,72 @@
+"""Exact-sequence deduplication of the normalized proteome store.
+
+Near-clonal isolates share most of their proteins byte for byte. With
+``--dedup_sequences yes`` the staging pass writes every distinct sequence
+once to ``proteomes.unique``, named by the first normalized ID that carries
+it, and lists the other IDs with the same sequence in
+``sequence_members.tsv`` (``representative``/``protein_id`` rows, store
+order). hmmsearch runs on the unique store and
+:func:`sgtree.search.hits_to_table` fans each hit back out to the members,
+so the hit table equals the one of a search of the full store.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+
+from sgtree.fasta_index import fai_path, fai_row
+
+
+MEMBERS_HEADER = "representative\tprotein_id\n"
+
+
+@dataclass(frozen=True)
+class DedupStats:
+    records: int
+    unique: int
+
+
+def _iter_store(store: str):
+    # the normalized store holds one ``>id`` line and one sequence line per record
+    with open(store) as handle:
+        for header in handle:
+            yield header[1:].rstrip("\n"), handle.readline().rstrip("\n")
+
+
+def write_unique_store(store: str, unique_path: str, members_path: str) -> DedupStats:
+    """Write the distinct sequences of ``store`` and the IDs that repeat them."""
+    representatives: dict[bytes, str] = {}
+    records = 0
+    offset = 0
+    with open(unique_path, "w") as out, open(fai_path(unique_path), "w") as index, \
+            open(members_path, "w") as members:
+        members.write(MEMBERS_HEADER)
+        for name, sequence in _iter_store(store):
+            records += 1
+            digest = hashlib.sha256(sequence.encode("ascii")).digest()
+            representative = representatives.setdefault(digest, name)
+            if representative != name:
+                members.write(f"{representative}\t{name}\n")
+                continue
+            out.write(f">{name}\n{sequence}\n")
+            offset += len(name) + 2
+            index.write(fai_row(name, len(sequence), offset))
+            offset += len(sequence) + 1
+    stats = DedupStats(records=records, unique=len(representatives))
+    print(
+        f"-... sequence dedup: {stats.unique} unique of {stats.records} proteins"
+        f" ({stats.records - stats.unique} identical copies are searched once)"
+    )
+    return stats
+
+
+def read_members(members_path: str) -> dict[str, list[str]]:
+    """Representative ID -> the other normalized IDs with the same sequence."""
+    members: dict[str, list[str]] = {}
+    with open(members_path) as handle:
+        next(handle, None)
+        for line in handle:
+            representative, protein_id = line.rstrip("\n").split("\t")
+            members.setdefault(representative, []).append(protein_id)
+    return members
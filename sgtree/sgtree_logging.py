@@ -6,6 +6,13 @@ import datetime
 from sgtree.config import Config
 
 
+def _alignment_cache_line(cfg: Config) -> str:
+    counts = cfg.alignment_cache_counts
+    if not counts:
+        return ""
+    return f"alignment cache: {counts.get('hits', 0)} hits, {counts.get('misses', 0)} misses\n"
+
+
 def write_logfile(cfg: Config, timings: dict):
     """Write runtime statistics to logfile."""
     logfile = os.path.join(
@@ -26,6 +33,7 @@ def write_logfile(cfg: Config, timings: dict):
                 f.write(f"{timestamp}- {step_name}")
                 f.write(f"\n{step_name} done - runtime: {runtime} seconds\n{sep}\n")
 
+            f.write(_alignment_cache_line(cfg))
             f.write(f"Sgtree endtime: \n{datetime.datetime.now()}\n")
             f.write(f"{cfg.genome_count} genomes\n{cfg.model_file_count} models\n")
             f.write(f"{cfg.start_time}\n{datetime.datetime.now()}\n{sep}\n")
@@ -47,6 +55,7 @@ def append_logfile(cfg: Config, timings: dict):
                 f.write(f"{timestamp}- {step_name}")
                 f.write(f"\n{step_name} done - runtime: {runtime} seconds\n{sep}\n")
 
+            f.write(_alignment_cache_line(cfg))
             f.write(f"Sgtree start, endtime (with marker selection): \n")
             f.write(f"{cfg.start_time}\n{datetime.datetime.now()}\n")
     except Exception:
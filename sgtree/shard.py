@@ -0,0 +1,249 @@
+"""Scatter/gather hmmsearch over slices of one staged proteome store.
+
+``python -m sgtree search-shard`` searches one contiguous slice of the
+normalized ``proteomes`` store of a staged run (``--stage_only yes``) and
+writes a shard file with the per-model ``TopHits`` state. ``Z`` is fixed to
+the record count of the whole store, so every shard reports E-values on
+the scale of a single search. ``python -m sgtree search-merge`` checks that
+a complete, consistent set of shards is given and merges them in store
+order into the ``hits.hmmout`` domtblout a monolithic search exports, plus
+a ``<out>.json`` sidecar with the search settings; the pipeline resumes from
+it with ``--hits`` and checks the sidecar against its own store and models.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pickle
+import time
+from dataclasses import dataclass
+
+from pyhmmer import easel, plan7
+
+from sgtree.cache import file_digest
+from sgtree.fasta_index import FaiEntry, build_fasta_index, fai_path
+from sgtree.marker_db import load_models
+from sgtree.search import _merge_hits, _search_chunked, threshold_options, write_hits
+
+
+# Bump when the shard file layout changes.
+SHARD_VERSION = 2
+SUBCOMMANDS = ("search-shard", "search-merge")
+SIDECAR_SUFFIX = ".json"
+# Settings every shard of a set, and a resumed run, must share.
+SEARCH_SETTINGS = ("models", "store", "hmmsearch_cutoff", "hmmsearch_evalue")
+
+
+@dataclass(frozen=True)
+class ShardSlice:
+    shard: int
+    shards: int
+    start: int
+    records: int
+    offset: int
+    total: int
+
+
+def _fresh_index(store: str) -> str:
+    index = fai_path(store)
+    if not os.path.exists(index) or os.path.getmtime(index) < os.path.getmtime(store):
+        build_fasta_index(store)
+    return index
+
+
+def _fai_rows(store: str):
+    with open(_fresh_index(store)) as handle:
+        for line in handle:
+            _name, length, offset, line_bases, line_width = line.rstrip("\n").split("\t")
+            yield FaiEntry(int(length), int(offset), int(line_bases), int(line_width))
+
+
+def store_digest(store: str) -> str:
+    """SHA-256 of the ``.fai`` index of ``store`` (record names, lengths and offsets)."""
+    return file_digest(_fresh_index(store))
+
+
+def shard_slice(store: str, shard: int, shards: int) -> ShardSlice:
+    """Records ``[start, start + records)`` of ``store`` that belong to ``shard``."""
+    if shards < 1 or not 0 <= shard < shards:
+        raise ValueError(f"shard index {shard} is outside 0..{shards - 1}")
+    total = sum(1 for _ in _fai_rows(store))
+    start = shard * total // shards
+    end = (shard + 1) * total // shards
+    offset = 0
+    if start:
+        # the header of record ``start`` follows the line end of record ``start - 1``
+        for number, entry in enumerate(_fai_rows(store), start=1):
+            if number == start:
+                offset = entry.offset + entry.span + (entry.line_width - entry.line_bases)
+                break
+    return ShardSlice(shard=shard, shards=shards, start=start, records=end - start, offset=offset, total=total)
+
+
+def search_shard(
+    store: str,
+    models_path: str,
+    shard: int,
+    shards: int,
+    out_path: str,
+    *,
+    hmmsearch_cutoff: str = "cut_ga",
+    hmmsearch_evalue: float = 1e-5,
+    num_cpus: int = 1,
+    search_chunk: int = 20000,
+) -> ShardSlice:
+    """Search one slice of ``store`` and write its shard file to ``out_path``."""
+    markers = load_models(models_path)
+    profiles = list(markers.profiles)
+    piece = shard_slice(store, shard, shards)
+    search_opts = threshold_options(hmmsearch_cutoff, hmmsearch_evalue)
+    search_opts["Z"] = piece.total
+    search_opts["cpus"] = max(1, num_cpus)
+
+    print(f"-... search shard {shard + 1}/{shards}: records {piece.start}-{piece.start + piece.records} of {piece.total}")
+    start = time.time()
+    with open(store, "rb") as handle:
+        handle.seek(piece.offset)
+        with easel.SequenceFile(handle, format="fasta", digital=True, alphabet=markers.alphabet) as seq_file:
+            results = _search_chunked(profiles, seq_file, search_opts, max(1, search_chunk), limit=piece.records)
+
+    shard_data = {
+        "version": SHARD_VERSION,
+        "models": markers.digest,
+        "store": store_digest(store),
+        "hmmsearch_cutoff": hmmsearch_cutoff,
+        "hmmsearch_evalue": hmmsearch_evalue,
+        "total": piece.total,
+        "shard": shard,
+        "shards": shards,
+        "hits": [top_hits.__getstate__() for top_hits in results],
+    }
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as handle:
+        pickle.dump(shard_data, handle)
+    os.replace(tmp_path, out_path)
+    print(f"-... shard written to {out_path} - runtime: {time.time() - start:.1f} seconds")
+    return piece
+
+
+def merge_shards(shard_paths: list[str], models_path: str, out_path: str) -> int:
+    """Merge a complete set of shard files into the domtblout ``out_path``.
+
+    Returns the number of shards merged.
+    """
+    markers = load_models(models_path)
+    shards = []
+    for path in shard_paths:
+        with open(path, "rb") as handle:
+            shards.append(pickle.load(handle))
+    if not shards:
+        raise ValueError("search-merge needs at least one shard file")
+
+    settings = ("version", *SEARCH_SETTINGS, "total", "shards")
+    first = shards[0]
+    for path, shard_data in zip(shard_paths, shards):
+        mismatched = [name for name in settings if shard_data.get(name) != first.get(name)]
+        if mismatched:
+            raise ValueError(f"shard {path} was searched with different {', '.join(mismatched)}")
+    if first["version"] != SHARD_VERSION:
+        raise ValueError(f"shard files have version {first['version']}, expected {SHARD_VERSION}")
+    if first["models"] != markers.digest:
+        raise ValueError(f"shard files were searched with a different marker set than {models_path}")
+    found = sorted(shard_data["shard"] for shard_data in shards)
+    if found != list(range(first["shards"])):
+        missing = sorted(set(range(first["shards"])) - set(found))
+        raise ValueError(
+            f"search-merge needs each of the {first['shards']} shards exactly once; "
+            f"missing {missing or 'none'}, given {found}"
+        )
+
+    merged = None
+    for shard_data in sorted(shards, key=lambda item: item["shard"]):
+        restored = []
+        for profile, state in zip(markers.profiles, shard_data["hits"]):
+            top_hits = plan7.TopHits(profile)
+            top_hits.__setstate__(state)
+            restored.append(top_hits)
+        merged = _merge_hits(merged, restored)
+    write_hits(merged, out_path)
+    with open(out_path + SIDECAR_SUFFIX, "w") as handle:
+        json.dump({name: first[name] for name in SEARCH_SETTINGS}, handle, sort_keys=True, indent=2)
+    print(f"-... merged {len(shards)} shards into {out_path}")
+    return len(shards)
+
+
+def check_merged_hits(
+    hits_path: str,
+    store: str,
+    models_path: str,
+    hmmsearch_cutoff: str,
+    hmmsearch_evalue: float,
+) -> bool:
+    """Check the ``search-merge`` sidecar of ``hits_path`` against a resumed run.
+
+    Returns ``False`` when ``hits_path`` has no sidecar (a ``hits.hmmout``
+    exported by an earlier run); raises ``ValueError`` on any mismatch.
+    """
+    sidecar = hits_path + SIDECAR_SUFFIX
+    if not os.path.isfile(sidecar):
+        return False
+    with open(sidecar) as handle:
+        recorded = json.load(handle)
+    expected = {
+        "models": file_digest(models_path),
+        "store": store_digest(store),
+        "hmmsearch_cutoff": hmmsearch_cutoff,
+        "hmmsearch_evalue": hmmsearch_evalue,
+    }
+    mismatched = [name for name in SEARCH_SETTINGS if recorded.get(name) != expected[name]]
+    if mismatched:
+        raise ValueError(
+            f"--hits {hits_path} was searched with different {', '.join(mismatched)} than this run"
+        )
+    return True
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="sgtree", description="Sharded hmmsearch over a staged proteome store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    shard_parser = commands.add_parser("search-shard", help="search one slice of a proteome store")
+    shard_parser.add_argument("proteomes", help="normalized proteome store, e.g. <run>/proteomes")
+    shard_parser.add_argument("models", help="staged marker HMM file, e.g. <run>/models")
+    shard_parser.add_argument("--shard", type=int, required=True, help="0-based index of this shard")
+    shard_parser.add_argument("--shards", type=int, required=True, help="total number of shards")
+    shard_parser.add_argument("--out", required=True, help="shard file to write")
+    shard_parser.add_argument("--num_cpus", type=int, default=8)
+    shard_parser.add_argument("--hmmsearch_cutoff", type=str, default="cut_ga",
+                              help="cut_ga, cut_tc, cut_nc, or any other value for --hmmsearch_evalue")
+    shard_parser.add_argument("--hmmsearch_evalue", type=float, default=1e-5)
+    shard_parser.add_argument("--search_chunk", type=int, default=20000,
+                              help="sequences per hmmsearch block")
+
+    merge_parser = commands.add_parser("search-merge", help="merge shard files into hits.hmmout")
+    merge_parser.add_argument("shards", nargs="+", help="shard files written by search-shard")
+    merge_parser.add_argument("--models", required=True, help="the marker HMM file the shards were searched with")
+    merge_parser.add_argument("--out", required=True, help="merged domtblout to write (resume with --hits)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    if args.command == "search-shard":
+        if args.search_chunk < 1:
+            raise ValueError("--search_chunk must be >= 1")
+        search_shard(
+            args.proteomes,
+            args.models,
+            args.shard,
+            args.shards,
+            args.out,
+            hmmsearch_cutoff=args.hmmsearch_cutoff,
+            hmmsearch_evalue=args.hmmsearch_evalue,
+            num_cpus=args.num_cpus,
+            search_chunk=args.search_chunk,
+        )
+    else:
+        merge_shards(args.shards, args.models, args.out)
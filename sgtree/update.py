@@ -0,0 +1,252 @@
+"""Incremental ``--update`` mode: add new genomes to an existing run directory.
+
+Only genomes missing from the previous run's ``genome_manifest.tsv`` are
+staged and searched against the stored ``models``; their proteomes, index
+rows, header-map rows and hits are appended to the existing run files. The
+caller then re-parses the combined hit table (so the genome filters apply to
+the new genomes exactly as in a full run) and re-aligns only the markers
+whose retained hits no longer match the previous alignment.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import glob
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+
+import pandas as pd
+
+from sgtree.compression import fasta_stem
+from sgtree.config import Config
+from sgtree.fasta_index import build_fasta_index, fai_path, load_fasta_index
+from sgtree.fasta_normalize import _iter_input_files
+from sgtree.id_schema import sanitize_token
+from sgtree.input_stage import (
+    GenomeInput,
+    _list_files,
+    detect_input_format,
+    read_genome_manifest,
+    write_genome_manifest,
+)
+from sgtree.marker_db import press_models
+from sgtree.search import BIT_CUTOFFS, _count_models_in_hmm, run_hmmsearch, stage_genomes
+
+
+# run files an update builds on; --keep_intermediates yes keeps them in place
+UPDATE_REQUIRED = ("models", "proteomes", "hits.hmmout", "genome_manifest.tsv", "aligned")
+
+
+@dataclass(frozen=True)
+class UpdatePlan:
+    input_format: str
+    previous: tuple[GenomeInput, ...]
+    new_files: tuple[str, ...]
+
+
+def _input_files(genomedir: str, input_format: str) -> list[str]:
+    # the same file lists the staging stage walks for each format
+    return _list_files(genomedir) if input_format == "fna" else _iter_input_files(genomedir)
+
+
+def plan_update(cfg: Config) -> UpdatePlan:
+    """Validate the previous run in ``cfg.outdir`` and list the input files it has not seen."""
+    if not os.path.isdir(cfg.genomedir):
+        raise ValueError("--update requires --genomedir to be a directory of genome files")
+    if cfg.hmmsearch_cutoff not in BIT_CUTOFFS:
+        # appended rows would carry E-values on a different Z than the old ones
+        raise ValueError("--update needs a cut_ga, cut_tc or cut_nc --hmmsearch_cutoff")
+    missing = [name for name in UPDATE_REQUIRED if not os.path.exists(os.path.join(cfg.outdir, name))]
+    if missing:
+        raise ValueError(
+            f"--update needs a previous run in {cfg.outdir} made with --keep_intermediates yes; "
+            f"missing: {', '.join(missing)}"
+        )
+
+    previous = read_genome_manifest(cfg.genome_manifest_path)
+    input_format = cfg.input_format
+    if input_format == "auto":
+        input_format = detect_input_format(cfg.genomedir)
+    previous_formats = {genome.input_format for genome in previous}
+    if previous_formats and previous_formats != {input_format}:
+        raise ValueError(
+            f"--update input format {input_format} does not match the previous run "
+            f"({', '.join(sorted(previous_formats))})"
+        )
+
+    known = {genome.genome_id for genome in previous}
+    new_files = tuple(
+        path
+        for path in _input_files(cfg.genomedir, input_format)
+        if sanitize_token(fasta_stem(path), "") not in known
+    )
+    return UpdatePlan(input_format=input_format, previous=tuple(previous), new_files=new_files)
+
+
+def _append_rows(src: str, dest: str, source_paths: dict[str, str]) -> None:
+    """Append TSV rows (minus header) from ``src``, rewriting the leading source_file column."""
+    with open(src) as handle, open(dest, "a") as out:
+        next(handle, None)
+        for line in handle:
+            source, rest = line.split("\t", 1)
+            out.write(f"{source_paths.get(source, source)}\t{rest}")
+
+
+def _append_store(new_fasta: str, store: str) -> int:
+    """Append ``new_fasta`` and its index to ``store``; return the combined record count."""
+    if not os.path.exists(fai_path(store)):
+        build_fasta_index(store)
+    base_offset = os.path.getsize(store)
+    with open(new_fasta, "rb") as src, open(store, "ab") as dest:
+        shutil.copyfileobj(src, dest)
+    with open(fai_path(new_fasta)) as src, open(fai_path(store), "a") as dest:
+        for line in src:
+            name, length, offset, rest = line.split("\t", 3)
+            dest.write(f"{name}\t{length}\t{int(offset) + base_offset}\t{rest}")
+    return len(load_fasta_index(store))
+
+
+def _append_hits(new_hits: str, hits_path: str) -> int:
+    rows = 0
+    with open(new_hits) as src, open(hits_path, "a") as dest:
+        for line in src:
+            if not line.startswith("#"):
+                dest.write(line)
+                rows += 1
+    return rows
+
+
+def add_genomes(cfg: Config, plan: UpdatePlan) -> tuple[list[GenomeInput], float]:
+    """Stage, search and append the genomes in ``plan``.
+
+    Returns the new genome records and the hmmsearch runtime.
+    """
+    cfg.model_count = _count_models_in_hmm(cfg.models_path)
+    # runs from before the models stage have no pressed database yet
+    press_models(cfg.models_path, cfg.cache("models"))
+    cfg.input_format = plan.input_format
+    map_path = os.path.join(cfg.outdir, "proteomes_header_map.tsv")
+    work_dir = tempfile.mkdtemp(prefix=".update_", dir=cfg.outdir)
+    try:
+        inputs_dir = os.path.join(work_dir, "inputs")
+        staged_dir = os.path.join(work_dir, "staged_proteomes")
+        os.makedirs(inputs_dir)
+        originals = {}
+        for path in plan.new_files:
+            link = os.path.join(inputs_dir, os.path.basename(path))
+            os.symlink(os.path.abspath(path), link)
+            originals[link] = os.path.abspath(path)
+
+        new_proteomes = os.path.join(work_dir, "proteomes")
+        new_map = os.path.join(work_dir, "proteomes_header_map.tsv")
+        new_gene_calls = os.path.join(work_dir, "gene_calls.tsv")
+        genomes = stage_genomes(
+            cfg,
+            inputs_dir,
+            plan.input_format,
+            proteomes_path=new_proteomes,
+            map_path=new_map,
+            staged_dir=staged_dir,
+            gene_call_map_path=new_gene_calls,
+        )
+
+        # point records and map rows at the real inputs / final staged proteomes
+        source_paths = dict(originals)
+        final = []
+        for genome in genomes:
+            source = originals.get(genome.source_file, genome.source_file)
+            staged = genome.staged_proteome_path
+            if staged:
+                os.makedirs(cfg.staged_proteomes_dir, exist_ok=True)
+                moved = os.path.join(cfg.staged_proteomes_dir, os.path.basename(staged))
+                shutil.move(staged, moved)
+                source_paths[staged] = moved
+                staged = os.path.abspath(moved)
+            final.append(
+                dataclasses.replace(
+                    genome,
+                    source_file=source,
+                    assembly_path=source if genome.assembly_path else "",
+                    staged_proteome_path=staged,
+                )
+            )
+        genomes = final
+        for link, original in originals.items():
+            source_paths[link] = original
+
+        total_records = _append_store(new_proteomes, cfg.proteomes_path)
+        if os.path.exists(map_path):
+            _append_rows(new_map, map_path, source_paths)
+        if plan.input_format == "fna" and os.path.exists(cfg.gene_call_map_path):
+            _append_rows(new_gene_calls, cfg.gene_call_map_path, source_paths)
+
+        new_hits = os.path.join(work_dir, "hits.hmmout")
+        _, search_time = run_hmmsearch(
+            cfg,
+            proteomes_path=new_proteomes,
+            hits_path=new_hits,
+            database_size=total_records,
+        )
+        appended = _append_hits(new_hits, cfg.hitsoutdir)
+
+        catalog = cfg.run_catalog()
+        if catalog is not None:
+            mapped_map = os.path.join(work_dir, "mapped_header_map.tsv")
+            with open(new_map) as handle, open(mapped_map, "w") as out:
+                out.write(next(handle))
+            _append_rows(new_map, mapped_map, source_paths)
+            catalog.record_proteins(mapped_map, append=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    all_genomes = list(plan.previous) + genomes
+    cfg.staged_inputs[cfg.genomedir] = all_genomes
+    write_genome_manifest(
+        cfg.genomedir,
+        input_format=plan.input_format,
+        manifest_path=cfg.genome_manifest_path,
+        genomes=all_genomes,
+    )
+    if catalog is not None:
+        catalog.record_genomes(all_genomes)
+    print(f"-... update: added {len(genomes)} genomes, {appended} new hit rows")
+    return genomes, search_time
+
+
+def _aligned_ids(aligned_path: str) -> set[str]:
+    with open(aligned_path) as handle:
+        return {line[1:].split()[0] for line in handle if line.startswith(">")}
+
+
+def affected_markers(df: pd.DataFrame, aligned_dir: str) -> set[str]:
+    """Markers whose retained hits differ from the rows of the previous run's alignment.
+
+    The combined hit table is filtered again, so besides the markers new
+    genomes contribute to, a marker can gain or lose hits of old genomes
+    (the genome filters and the length filter depend on the whole table).
+    """
+    seq_ids = df["savedname"].astype(str).str.replace("/", "|", regex=False)
+    models = df["namemodel"].astype(str).str.split("/").str[-1]
+    changed = set()
+    for model, ids in seq_ids.groupby(models.to_numpy(), sort=False):
+        aligned_path = os.path.join(aligned_dir, model + ".faa")
+        if not os.path.exists(aligned_path) or _aligned_ids(aligned_path) != set(ids):
+            changed.add(model)
+    return changed
+
+
+def remove_stale_markers(cfg: Config, df: pd.DataFrame) -> list[str]:
+    """Delete the alignments and extracted sequences of markers left without retained hits."""
+    kept = set(df["namemodel"].astype(str).str.split("/").str[-1])
+    stale = []
+    for aligned_path in sorted(glob.glob(os.path.join(cfg.aligned_dir, "*.faa"))):
+        model = os.path.basename(aligned_path).split(".")[0]
+        if model in kept:
+            continue
+        stale.append(model)
+        for path in (aligned_path, os.path.join(cfg.extracted_seqs_dir, model + ".faa")):
+            if os.path.exists(path):
+                os.remove(path)
+    return stale
@@ -0,0 +1,90 @@
+"""Shared inputs for the tests that run the search and alignment steps."""
+
+import random
+import string
+from pathlib import Path
+
+from pyhmmer import plan7
+
+from sgtree.config import Config
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+RESIDUES = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def make_config(tmp: Path, **overrides) -> Config:
+    """A run config over ``tmp/input`` and ``tmp/models.hmm``; ``overrides`` replace single fields."""
+    settings = dict(
+        genomedir=str(tmp / "input"),
+        modeldir=str(tmp / "models.hmm"),
+        outdir=str(tmp / "run"),
+        num_cpus=1,
+        percent_models=0,
+        input_format="faa",
+        lflt_fraction=0.0,
+        aln_method="hmmalign",
+        tree_method="fasttree",
+        iqtree_fast=True,
+        iqtree_model="LG+F+I+G4",
+        hmmsearch_cutoff="cut_ga",
+        hmmsearch_evalue=1e-5,
+        selection_mode="coordinate",
+        selection_max_rounds=5,
+        selection_global_rounds=1,
+        lock_references=False,
+        max_sdup=-1,
+        max_dupl=-1.0,
+        ref=None,
+        ref_concat=str(tmp / "ref_cache"),
+        marker_selection=False,
+        singles=False,
+        singles_mode="delta_rf",
+        num_nei=0,
+        singles_min_rfdist=0.25,
+        keep_intermediates=True,
+        is_ref=False,
+        start_time="now",
+    )
+    settings.update(overrides)
+    return Config(**settings)
+
+
+def write_marker_inputs(
+    tmp: Path,
+    *,
+    models: int = 3,
+    genomes: int = 3,
+    mutations: int = 10,
+    paralogs: int = 0,
+    extra_proteins: int = 0,
+    seed: int = 0,
+) -> None:
+    """Write the first ``models`` RProt16 HMMs and ``genomes`` proteomes to ``tmp``.
+
+    Every genome (``GenomeA``, ``GenomeB``, ...) carries one copy of each
+    marker consensus with ``mutations`` random substitutions, named
+    ``<genome>|c0|p<marker>``; the first ``paralogs`` markers get a second
+    copy on contig ``c1``. ``extra_proteins`` random 120-residue proteins
+    without a marker (``<genome>|noise|n<k>``, wrapped at 60 columns) follow.
+    """
+    rng = random.Random(seed)
+    with plan7.HMMFile(str(REPO_ROOT / "resources" / "models" / "RProt16.hmm")) as hmm_file:
+        hmms = [hmm for _, hmm in zip(range(models), hmm_file)]
+    with open(tmp / "models.hmm", "wb") as handle:
+        for hmm in hmms:
+            hmm.write(handle)
+
+    (tmp / "input").mkdir()
+    for genome in (f"Genome{letter}" for letter in string.ascii_uppercase[:genomes]):
+        lines = []
+        for index, hmm in enumerate(hmms):
+            for copy in range(1 + (index < paralogs)):
+                consensus = list(hmm.consensus.upper())
+                for position in rng.sample(range(len(consensus)), mutations):
+                    consensus[position] = rng.choice(RESIDUES)
+                lines.append(f">{genome}|c{copy}|p{index}\n{''.join(consensus)}\n")
+        for number in range(extra_proteins):
+            noise = "".join(rng.choice(RESIDUES) for _ in range(120))
+            lines.append(f">{genome}|noise|n{number}\n{noise[:60]}\n{noise[60:]}\n")
+        (tmp / "input" / f"{genome}.faa").write_text("".join(lines))
@@ -0,0 +1,234 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from helpers import make_config, write_marker_inputs
+from sgtree import align, extract, search
+from sgtree.cache import LEFTOVER_GRACE_SECONDS, DiskCache, main as cache_main, text_digest
+from sgtree.config import Config
+from sgtree.fasta_normalize import normalize_and_concat_proteomes, normalize_proteomes_by_file
+
+
+def _write_inputs(tmp: Path) -> None:
+    write_marker_inputs(tmp, models=2, genomes=3, mutations=8, extra_proteins=1, seed=7)
+
+
+class DiskCacheTests(unittest.TestCase):
+    def test_store_fetch_roundtrip_and_duplicate_store(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cache = DiskCache(str(tmp / "cache"), "staging")
+            src = tmp / "src.faa"
+            src.write_text(">a\nMKV\n")
+            key = text_digest("test", 1)
+
+            self.assertIsNone(cache.fetch(key, {"proteome.faa": str(tmp / "miss.faa")}))
+            self.assertTrue(cache.store(key, {"proteome.faa": str(src)}, {"records": 1}))
+            self.assertFalse(cache.store(key, {"proteome.faa": str(src)}, {"records": 2}))
+
+            meta = cache.fetch(key, {"proteome.faa": str(tmp / "hit.faa")})
+            self.assertEqual(meta, {"records": 1})
+            self.assertEqual((tmp / "hit.faa").read_text(), ">a\nMKV\n")
+
+    def test_evict_removes_leftovers_of_killed_runs_after_the_grace_period(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cache = DiskCache(str(tmp / "cache"), "staging")
+            src = tmp / "src.faa"
+            src.write_text("x")
+            key = text_digest("kept")
+            cache.store(key, {"data": str(src)}, {})
+            directory = Path(cache.directory)
+            old_tmp = directory / ".tmp_old"
+            old_trash = directory / "ab" / ("ab" + "0" * 62 + ".evict-123")
+            live_tmp = directory / ".tmp_live"
+            for path in (old_tmp, old_trash, live_tmp):
+                path.mkdir(parents=True)
+                (path / "data").write_text("x" * 100)
+            stale = os.path.getmtime(cache.entry_path(key)) - 2 * LEFTOVER_GRACE_SECONDS
+            for path in (old_tmp, old_trash):
+                os.utime(path, (stale, stale))
+
+            self.assertEqual(cache.evict(), [])
+
+            self.assertFalse(old_tmp.exists())
+            self.assertFalse(old_trash.exists())
+            self.assertTrue(live_tmp.exists())
+            self.assertEqual([entry.key for entry in cache.entries()], [key])
+
+    def test_evict_removes_least_recently_used_entries_first(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cache = DiskCache(str(tmp / "cache"), "staging")
+            src = tmp / "src.faa"
+            src.write_text("x" * 1000)
+            keys = [text_digest("entry", index) for index in range(3)]
+            for age, key in enumerate(keys):
+                cache.store(key, {"data": str(src)}, {})
+                stamp = 1_000_000 + age
+                os.utime(cache.entry_path(key), (stamp, stamp))
+            # touching the oldest entry makes it the most recently used
+            cache.fetch(keys[0], {})
+
+            entry_size = cache.entries()[0].size
+            removed = cache.evict(max_bytes=2 * entry_size)
+
+            self.assertEqual([entry.key for entry in removed], [keys[1]])
+            self.assertEqual(sorted(entry.key for entry in cache.entries()), sorted([keys[0], keys[2]]))
+
+
+class StagingCacheTests(unittest.TestCase):
+    def test_normalization_reuses_unchanged_genomes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            faa_dir = tmp / "faa"
+            faa_dir.mkdir()
+            (faa_dir / "GenomeA.faa").write_text(">contig0001_1\nMPEP*\n>contig0002_3\nMKV!\n")
+            (faa_dir / "GenomeB.faa").write_text(">GenomeB|scaf9|p1\nMAAB\n")
+            cache = DiskCache(str(tmp / "cache"), "staging")
+
+            plain = normalize_and_concat_proteomes(str(faa_dir), str(tmp / "plain.faa"), str(tmp / "plain.tsv"))
+            first, first_files = normalize_proteomes_by_file(
+                str(faa_dir), str(tmp / "first.faa"), str(tmp / "first.tsv"), cache=cache
+            )
+            second, second_files = normalize_proteomes_by_file(
+                str(faa_dir), str(tmp / "second.faa"), str(tmp / "second.tsv"), cache=cache
+            )
+
+            self.assertEqual([cached for *_, cached in first_files], [False, False])
+            self.assertEqual([cached for *_, cached in second_files], [True, True])
+            self.assertEqual(second, plain)
+            self.assertEqual(sorted(plain), ["contigs", "genomes", "invalid_chars_replaced", "records"])
+            self.assertEqual((tmp / "second.faa").read_text(), (tmp / "plain.faa").read_text())
+            self.assertEqual((tmp / "second.tsv").read_text(), (tmp / "plain.tsv").read_text())
+            self.assertEqual((tmp / "second.faa.fai").read_text(), (tmp / "plain.faa.fai").read_text())
+
+            (faa_dir / "GenomeB.faa").write_text(">GenomeB|scaf9|p1\nMAAC\n")
+            _third, third_files = normalize_proteomes_by_file(str(faa_dir), str(tmp / "third.faa"), cache=cache)
+
+            self.assertEqual([cached for *_, cached in third_files], [True, False])
+            self.assertIn("MAAC", (tmp / "third.faa").read_text())
+            self.assertEqual(len(cache.entries()), 3)
+
+
+class HitCacheTests(unittest.TestCase):
+    def _search(self, cfg: Config) -> bytes:
+        os.makedirs(cfg.outdir, exist_ok=True)
+        search.concat_inputs(cfg)
+        search.run_hmmsearch(cfg)
+        return Path(cfg.hitsoutdir).read_bytes()
+
+    def test_cached_search_matches_cold_search(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            _write_inputs(tmp)
+            cache_dir = str(tmp / "cache")
+
+            cold = self._search(make_config(tmp, outdir=str(tmp / "cold")))
+            first = self._search(make_config(tmp, outdir=str(tmp / "first"), cache_dir=cache_dir))
+            warm = self._search(make_config(tmp, outdir=str(tmp / "warm"), cache_dir=cache_dir))
+
+            hits = DiskCache(cache_dir, "hits")
+            self.assertEqual(len(hits.entries()), 3)
+            self.assertEqual(first, cold)
+            self.assertEqual(warm, cold)
+            self.assertEqual(sum(not line.startswith(b"#") for line in cold.splitlines()), 6)
+
+            # a changed genome misses the cache; the others are reused
+            genome_c = tmp / "input" / "GenomeC.faa"
+            genome_c.write_text(genome_c.read_text().replace("noise", "other"))
+            cold_changed = self._search(make_config(tmp, outdir=str(tmp / "cold_changed")))
+            warm_changed = self._search(make_config(tmp, outdir=str(tmp / "warm_changed"), cache_dir=cache_dir))
+            self.assertEqual(warm_changed, cold_changed)
+            self.assertEqual(len(hits.entries()), 4)
+
+    def test_evalue_mode_bypasses_hit_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            _write_inputs(tmp)
+            cfg = make_config(tmp, outdir=str(tmp / "run"), cache_dir=str(tmp / "cache"), hmmsearch_cutoff="evalue")
+
+            self._search(cfg)
+
+            self.assertEqual(DiskCache(cfg.cache_dir, "hits").entries(), [])
+
+    def test_prune_command_empties_a_namespace(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            src = tmp / "src"
+            src.write_text("x")
+            for namespace in ("hits", "staging"):
+                DiskCache(str(tmp / "cache"), namespace).store(text_digest(namespace), {"data": str(src)}, {})
+
+            cache_main(["prune", str(tmp / "cache"), "--namespace", "hits", "--max_gb", "0"])
+
+            self.assertEqual(DiskCache(str(tmp / "cache"), "hits").entries(), [])
+            self.assertEqual(len(DiskCache(str(tmp / "cache"), "staging").entries()), 1)
+
+
+class AlignmentCacheTests(unittest.TestCase):
+    def _align(self, cfg: Config, sequences=None) -> dict[str, bytes]:
+        align.run_alignment(cfg, sequences=sequences)
+        return {path.name: path.read_bytes() for path in Path(cfg.aligned_dir).iterdir()}
+
+    def test_alignments_are_reused_per_marker_sequence_set(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            _write_inputs(tmp)
+            cache_dir = str(tmp / "cache")
+            cold = make_config(tmp, outdir=str(tmp / "cold"))
+            os.makedirs(cold.outdir)
+            cold.model_count = search.concat_inputs(cold)
+            hits, _ = search.run_hmmsearch(cold)
+            finaldf, _ = search.parse_hmmsearch(cold, hits)
+            df, _ = search.build_working_df(cold, finaldf)
+            sequences = extract.extract_sequences(cold, extract.extract_hits(cold, df))
+            extract.write_extracted_sequences(cold, sequences)
+            expected = self._align(cold)
+
+            first = make_config(tmp, outdir=str(tmp / "cold"), cache_dir=cache_dir)
+            first.aligned_dir = str(tmp / "first")
+            self.assertEqual(self._align(first), expected)
+            self.assertEqual(first.alignment_cache_counts, {"hits": 0, "misses": 2})
+
+            # the in-memory handoff is keyed by the same sequence sets
+            warm = make_config(tmp, outdir=str(tmp / "cold"), cache_dir=cache_dir)
+            warm.aligned_dir = str(tmp / "warm")
+            self.assertEqual(self._align(warm, sequences=sequences), expected)
+            self.assertEqual(warm.alignment_cache_counts, {"hits": 2, "misses": 0})
+
+            # dropping a sequence of one marker misses only that marker
+            changed = sorted(Path(cold.extracted_seqs_dir).iterdir())[0]
+            records = align._read_fasta(str(changed))
+            align._write_fasta(str(changed), records[:-1])
+            rerun = make_config(tmp, outdir=str(tmp / "cold"), cache_dir=cache_dir)
+            rerun.aligned_dir = str(tmp / "rerun")
+            realigned = self._align(rerun)
+            self.assertEqual(rerun.alignment_cache_counts, {"hits": 1, "misses": 1})
+            self.assertEqual(realigned[changed.name].count(b">"), expected[changed.name].count(b">") - 1)
+            self.assertEqual(len(DiskCache(cache_dir, "alignments").entries()), 3)
+
+    def test_markers_without_an_hmm_bypass_the_alignment_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            _write_inputs(tmp)
+            cfg = make_config(tmp, cache_dir=str(tmp / "cache"), aln_method="mafft")
+            os.makedirs(cfg.outdir)
+            search.concat_inputs(cfg)
+            records = [(">GenomeA|c0|p0", "MKV"), (">GenomeB|c0|p0", "MKL")]
+            align._write_fasta(str(tmp / "Unknown.faa"), records)
+            aligned = tmp / "aligned"
+            aligned.mkdir()
+
+            misses = align._fetch_cached_alignments(cfg, str(aligned), {"Unknown": str(tmp / "Unknown.faa")})
+            align._write_fasta(str(aligned / "Unknown.faa"), records)
+            align._store_alignments(cfg, str(aligned), misses)
+
+            self.assertEqual(misses, {"Unknown": None})
+            self.assertEqual(cfg.alignment_cache_counts, {"hits": 0, "misses": 1})
+            self.assertEqual(DiskCache(cfg.cache_dir, "alignments").entries(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from helpers import make_config
+from sgtree import marker_selection
+from sgtree.catalog import RunCatalog
+from sgtree.sequence_dedup import read_members, write_unique_store
+
+
+def _hit_rows() -> pd.DataFrame:
+    rows = [
+        ("A/c1/p1", "A", "c1", "p1", "A/MarkerX", 100.0),
+        ("A/c2/p2", "A", "c2", "p2", "A/MarkerX", 200.0),
+        ("A/c2/p3", "A", "c2", "p3", "A/MarkerY", 90.0),
+        ("B/c1/b1", "B", "c1", "b1", "B/MarkerX", 150.0),
+    ]
+    frame = pd.DataFrame(
+        rows,
+        columns=["savedname", "genome_id", "contig_id", "gene_id", "namemodel", "score_bits"],
+    )
+    return frame.set_index(frame["savedname"])
+
+
+def _write_selection_inputs(run: Path, hits: pd.DataFrame) -> None:
+    (run / "treeouts_protTrees").mkdir(parents=True)
+    (run / "treeouts_protTrees" / "MarkerX.nwk").write_text("((A|c1|p1,B|c1|b1),A|c2|p2);\n")
+    (run / "treeouts_protTrees" / "MarkerY.nwk").write_text("(A|c2|p3,B|c1|b1);\n")
+    (run / "tree.nwk").write_text("(A,B);\n")
+    hits.to_csv(run / "table_elim_dups")
+
+
+@unittest.skipUnless(importlib.util.find_spec("duckdb"), "duckdb not installed")
+class RunCatalogTests(unittest.TestCase):
+    def test_marker_counts_roundtrip_keeps_order_and_drops_removed_genomes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            catalog = RunCatalog(str(Path(tmpdir) / "catalog.duckdb"))
+            dict_counts = {"B": {"M2": 1, "M1": 2}, "A": {"M1": 1}, "C": {"M3": 1}}
+
+            catalog.record_marker_counts(dict_counts, {"C": ["minmarker:0.1000"]})
+
+            self.assertEqual(catalog.kept_marker_counts(), {"B": {"M2": 1, "M1": 2}, "A": {"M1": 1}})
+            self.assertEqual(
+                list(catalog.kept_marker_counts()["B"]),
+                ["M2", "M1"],
+            )
+
+    def test_hits_carry_contig_support_and_match_csv_selection(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            hits = _hit_rows()
+            table_path = tmp / "table_elim_dups"
+            hits.to_csv(table_path)
+            catalog = RunCatalog(str(tmp / "catalog.duckdb"))
+            catalog.record_hits(hits, hits.iloc[0:0])
+
+            scores = catalog.score_table(["A/c2/p2", "B/c1/b1"])
+            self.assertEqual(sorted(scores.index), ["A/c2/p2", "B/c1/b1"])
+            self.assertEqual(int(scores.loc["A/c2/p2", "contig_markers"]), 2)
+            self.assertEqual(
+                catalog.contig_marker_context(),
+                marker_selection._load_contig_marker_context(str(table_path)),
+            )
+
+            marker_tree = tmp / "marker.nwk"
+            species_tree = tmp / "species.nwk"
+            marker_tree.write_text("((A|c1|p1,B|c1|b1),A|c2|p2);\n")
+            species_tree.write_text("(A,B);\n")
+            results = [
+                marker_selection.resolve_marker_tree(
+                    marker_tree_path=str(marker_tree),
+                    species_tree_path=str(species_tree),
+                    table_path=source,
+                    marker_name="MarkerX",
+                    ls_refs=None,
+                    selection_mode="coordinate",
+                    max_rounds=5,
+                    lock_references=False,
+                )
+                for source in (str(table_path), catalog)
+            ]
+            self.assertEqual(results[0], results[1])
+
+            records = results[1][1]
+            catalog.record_selection(1, records)
+            self.assertEqual(catalog.kept_assignments(), marker_selection._kept_from_records(records))
+
+    def test_sequence_members_are_recorded(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            store = tmp / "proteomes"
+            store.write_text(">A|c1|p1\nMKV\n>A|c1|p2\nMKL\n>B|c1|p1\nMKV\n>C|c1|p1\nMKV\n")
+            stats = write_unique_store(str(store), str(tmp / "proteomes.unique"), str(tmp / "members.tsv"))
+            catalog = RunCatalog(str(tmp / "catalog.duckdb"))
+            catalog.record_sequence_members(str(tmp / "members.tsv"))
+
+            with catalog.connect(read_only=True) as con:
+                rows = con.execute("SELECT * FROM sequence_members ORDER BY protein_id").fetchall()
+            self.assertEqual(rows, [("A|c1|p1", "B|c1|p1"), ("A|c1|p1", "C|c1|p1")])
+            self.assertEqual((stats.records, stats.unique), (4, 2))
+            self.assertEqual((tmp / "proteomes.unique").read_text(), ">A|c1|p1\nMKV\n>A|c1|p2\nMKL\n")
+            self.assertEqual(read_members(str(tmp / "members.tsv")), {"A|c1|p1": ["B|c1|p1", "C|c1|p1"]})
+
+    def test_run_noperm_with_and_without_the_catalog(self):
+        kept = {}
+        for catalog in (False, True):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                tmp = Path(tmpdir)
+                cfg = make_config(tmp, marker_selection=True, catalog=catalog, legacy_tables=not catalog)
+                _write_selection_inputs(Path(cfg.outdir), _hit_rows())
+                if catalog:
+                    cfg.run_catalog().record_hits(_hit_rows(), _hit_rows().iloc[0:0])
+
+                kept[catalog] = marker_selection.run_noperm(cfg, None)
+
+                rf_values = Path(cfg.outdir, "marker_selection_rf_values.txt")
+                self.assertEqual(rf_values.exists(), not catalog)
+                self.assertTrue(Path(cfg.outdir, "protTrees", "no_duplicates", "out", "_no_dups_MarkerX_.nw").exists())
+                if catalog:
+                    self.assertEqual(cfg.run_catalog().kept_assignments(1), kept[catalog])
+                else:
+                    self.assertEqual(marker_selection._load_kept_assignments(str(rf_values)), kept[catalog])
+
+        self.assertEqual(kept[False], kept[True])
+        self.assertEqual(set(kept[True]), {("MarkerX", "A")})
+
+
+if __name__ == "__main__":
+    unittest.main()
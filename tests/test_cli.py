@@ -40,6 +40,20 @@ class CliTests(unittest.TestCase):
         self.assertTrue(cfg.ani_cluster)
         self.assertTrue(cfg.snp)
 
+    def test_dedup_sequences_turns_off_the_export_and_needs_bit_cutoffs(self):
+        argv = ["sgtree", "input_dir", "models.hmm", "--dedup_sequences", "yes"]
+        with patch.object(sys, "argv", argv):
+            cfg = parse_args()
+        self.assertTrue(cfg.dedup_sequences)
+        self.assertFalse(cfg.export_hmmout)
+        with patch.object(sys, "argv", argv + ["--hmmout", "yes"]):
+            with self.assertRaisesRegex(ValueError, "cannot export hits.hmmout"):
+                parse_args()
+        with patch.object(sys, "argv", argv + ["--hmmsearch_cutoff", "evalue"]):
+            with self.assertRaisesRegex(ValueError, "cut_nc --hmmsearch_cutoff"):
+                parse_args()
+        with patch.object(sys, "argv", ["sgtree", "input_dir", "models.hmm"]):
+            self.assertTrue(parse_args().export_hmmout)
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,129 @@
+import filecmp
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from helpers import make_config, write_marker_inputs
+from sgtree import align, extract, search
+from sgtree.config import Config
+from sgtree.marker_db import load_models
+
+
+def _write_inputs(tmp: Path) -> None:
+    write_marker_inputs(tmp, models=3, genomes=3, seed=17)
+
+
+def _config(tmp: Path, name: str, keep_intermediates: bool) -> Config:
+    return make_config(tmp, outdir=str(tmp / name), keep_intermediates=keep_intermediates)
+
+
+class ExtractionHandoffTests(unittest.TestCase):
+    def test_extract_hits_groups_ids_per_model_in_table_order(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cfg = _config(tmp, "run", True)
+            df = pd.DataFrame(
+                {
+                    "savedname": ["B/c1/p2", "A/c1/p1", "A/c2/p7", "B/c1/p3"],
+                    "namemodel": ["B/M2", "A/M1", "A/M2", "B/M1"],
+                }
+            )
+
+            model_seqs = extract.extract_hits(cfg, df)
+
+            self.assertEqual(model_seqs, {"M2": ["B|c1|p2", "A|c2|p7"], "M1": ["A|c1|p1", "B|c1|p3"]})
+            self.assertEqual(list(model_seqs), ["M2", "M1"])
+            self.assertEqual(Path(cfg.extracted_dir, "M2").read_text(), "B|c1|p2\nA|c2|p7\n")
+            self.assertEqual(sorted(os.listdir(cfg.extracted_dir)), ["M1", "M2"])
+
+    def test_in_memory_handoff_aligns_like_the_extracted_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            _write_inputs(tmp)
+            aligned = []
+            for name, keep in (("disk", True), ("memory", False)):
+                cfg = _config(tmp, name, keep)
+                os.makedirs(cfg.outdir)
+                cfg.model_count = search.concat_inputs(cfg)
+                hits, _ = search.run_hmmsearch(cfg)
+                finaldf, _ = search.parse_hmmsearch(cfg, hits)
+                df, _ = search.build_working_df(cfg, finaldf)
+
+                sequences = extract.extract_sequences(cfg, extract.extract_hits(cfg, df))
+                self.assertEqual(cfg.write_extracted_sequences, keep)
+                if cfg.write_extracted_sequences:
+                    extract.write_extracted_sequences(cfg, sequences)
+                    sequences = None
+                align.run_alignment(cfg, sequences=sequences)
+                aligned.append(Path(cfg.aligned_dir))
+
+            self.assertFalse(Path(tmp, "memory", "extracted").exists())
+            self.assertFalse(Path(tmp, "memory", "extracted_seqs").exists())
+            self.assertFalse(Path(tmp, "disk", "models_split").exists())
+            self.assertFalse(Path(tmp, "memory", "models_split").exists())
+            self.assertEqual(len(list(Path(tmp, "disk", "extracted_seqs").iterdir())), 3)
+            names = sorted(path.name for path in aligned[0].iterdir())
+            self.assertEqual(names, sorted(path.name for path in aligned[1].iterdir()))
+            self.assertEqual(len(names), 3)
+            _match, mismatch, errors = filecmp.cmpfiles(aligned[0], aligned[1], names, shallow=False)
+            self.assertEqual((mismatch, errors), ([], []))
+
+    def test_hmmalign_looks_markers_up_in_the_loaded_registry(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            _write_inputs(tmp)
+            cfg = _config(tmp, "run", False)
+            os.makedirs(cfg.outdir)
+            search.concat_inputs(cfg)
+
+            align._load_hmm_registry(cfg.models_path)
+
+            self.assertEqual(sorted(align._HMMS), sorted(load_models(cfg.models_path).names))
+            with self.assertRaisesRegex(ValueError, "Could not find HMM profile for marker missing"):
+                align._run_hmmalign((cfg.outdir, "missing", [("A|c1|p1", "MKV")]))
+
+    def test_cleanup_realignment_reuses_the_first_pass_alignments(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            _write_inputs(tmp)
+            cfg = _config(tmp, "run", True)
+            os.makedirs(cfg.outdir)
+            cfg.model_count = search.concat_inputs(cfg)
+            hits, _ = search.run_hmmsearch(cfg)
+            finaldf, _ = search.parse_hmmsearch(cfg, hits)
+            df, _ = search.build_working_df(cfg, finaldf)
+            extract.write_extracted_sequences(cfg, extract.extract_sequences(cfg, extract.extract_hits(cfg, df)))
+            align.run_alignment(cfg)
+
+            cleaned = tmp / "cleaned"
+            cleaned.mkdir()
+            names = sorted(path.name for path in Path(cfg.extracted_seqs_dir).iterdir())
+            for index, name in enumerate(names):
+                records = align._read_fasta(os.path.join(cfg.extracted_seqs_dir, name))
+                kept = records[index % 2::2]
+                if index == 0:
+                    kept.append((">GenomeZ|c1|p0", records[0][1]))
+                align._write_fasta(str(cleaned / name), kept)
+
+            align.run_alignment(cfg, extracted_seqs_dir=str(cleaned), aligned_dir=str(tmp / "fresh"))
+            align.run_alignment(
+                cfg, extracted_seqs_dir=str(cleaned), aligned_dir=str(tmp / "reused"),
+                reuse_aligned_dir=cfg.aligned_dir,
+            )
+
+            aligned = sorted(path.name for path in (tmp / "fresh").iterdir())
+            self.assertEqual(len(aligned), 3)
+            _match, mismatch, errors = filecmp.cmpfiles(tmp / "fresh", tmp / "reused", aligned, shallow=False)
+            self.assertEqual((mismatch, errors), ([], []))
+            self.assertFalse(
+                align._subset_alignment(
+                    os.path.join(cfg.aligned_dir, aligned[0]), str(cleaned / names[0]), str(tmp / "stale.faa")
+                )
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
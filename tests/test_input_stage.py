@@ -1,15 +1,31 @@
+import bz2
+import gzip
+import importlib.machinery
+import importlib.util
+import lzma
+import os
+import random
 import sys
 import tempfile
 import types
 import unittest
 from pathlib import Path
+from unittest.mock import patch
 
 import pandas as pd
 
+from helpers import make_config
+from sgtree import ani_clustering
 from sgtree.config import Config
-from sgtree.fasta_normalize import normalize_and_concat_proteomes
+from sgtree.fasta_index import build_fasta_index, fetch_sequences, load_fasta_index
+from sgtree.fasta_normalize import (
+    _clean_sequence,
+    _clean_sequence_slow,
+    _iter_fasta_records,
+    normalize_and_concat_proteomes,
+)
 from sgtree.input_stage import detect_input_format, gene_call_inputs, write_genome_manifest
-from sgtree.search import build_working_df
+from sgtree.search import build_working_df, stage_genomes
 
 
 class _FakeGene:
@@ -46,6 +62,38 @@ class InputStageTests(unittest.TestCase):
             self.assertEqual(detect_input_format(str(faa_dir)), "faa")
             self.assertEqual(detect_input_format(str(fna_dir)), "fna")
 
+    def test_compressed_inputs_are_detected_and_normalized(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            faa_dir = tmp / "faa"
+            fna_dir = tmp / "fna"
+            faa_dir.mkdir()
+            fna_dir.mkdir()
+            with gzip.open(faa_dir / "GenomeA.faa.gz", "wt") as handle:
+                handle.write(">contig0001_42\nMPEPTIDE\n")
+            with bz2.open(faa_dir / "GenomeB.faa.bz2", "wt") as handle:
+                handle.write(">contig0002_7\nMSEQ\n")
+            with lzma.open(faa_dir / "GenomeC.faa.xz", "wt") as handle:
+                handle.write(">contig0003_1\nMKV\n")
+            with gzip.open(fna_dir / "GenomeA.fna.gz", "wt") as handle:
+                handle.write(">contigAlpha\nATGAAATTTAAATAG\n")
+
+            self.assertEqual(detect_input_format(str(faa_dir)), "faa")
+            self.assertEqual(detect_input_format(str(fna_dir)), "fna")
+
+            stats = normalize_and_concat_proteomes(str(faa_dir), str(tmp / "proteomes"))
+
+            self.assertEqual(stats["genomes"], 3)
+            contents = (tmp / "proteomes").read_text()
+            self.assertIn(">GenomeA|contig0001|contig0001_42\nMPEPTIDE\n", contents)
+            self.assertIn(">GenomeB|contig0002|contig0002_7\nMSEQ\n", contents)
+            self.assertIn(">GenomeC|contig0003|contig0003_1\nMKV\n", contents)
+
+            manifest = tmp / "manifest.tsv"
+            write_genome_manifest(str(fna_dir), input_format="fna", manifest_path=str(manifest))
+            self.assertIn("GenomeA\tfna\t", manifest.read_text())
+            self.assertTrue(manifest.read_text().endswith("\t1\t15\n"))
+
     def test_normalize_and_concat_proteomes_infers_contig_from_protein_suffix(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             tmp = Path(tmpdir)
@@ -68,6 +116,96 @@ class InputStageTests(unittest.TestCase):
             self.assertIn("contig0001", map_text)
             self.assertIn("suffix", map_text)
 
+    def test_iter_fasta_records_repairs_glued_headers_and_crlf(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "glued.faa"
+            path.write_bytes(b">a desc \r\nMPE P\r\nKK*>b x>c\nAAA\n\n>d\n>e\nQQ")
+
+            records = list(_iter_fasta_records(str(path)))
+
+            self.assertEqual(
+                records,
+                [("a desc", "MPEPKK*"), ("b x", ""), ("c", "AAA"), ("d", ""), ("e", "QQ")],
+            )
+
+    def test_text_before_the_first_header_is_an_error(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            (tmp / "blank.faa").write_text("\n  \n>a\nMK\n")
+            self.assertEqual(list(_iter_fasta_records(str(tmp / "blank.faa"))), [("a", "MK")])
+
+            faa_dir = tmp / "faa"
+            faa_dir.mkdir()
+            (faa_dir / "GenomeA.faa").write_text(">p1\nMPEP\n")
+            for text in ("MPEPTIDE\n>p1\nMK\n", "MK>p1\nMK\n"):
+                (faa_dir / "GenomeB.faa").write_text(text)
+                with self.assertRaisesRegex(ValueError, "before the first FASTA header in .*GenomeB.faa"):
+                    normalize_and_concat_proteomes(str(faa_dir), str(tmp / "proteomes"))
+
+    def test_clean_sequence_table_matches_per_residue_loop(self):
+        rng = random.Random(7)
+        alphabet = [chr(code) for code in range(128)] + ["\u00e9", "\u00df", "\u2003"]
+        samples = ["", "mpep*\n", "MK V\tL\x1c*J?", "\u00dfmk\u2003v"]
+        samples += ["".join(rng.choice(alphabet) for _ in range(60)) for _ in range(500)]
+
+        for sample in samples:
+            self.assertEqual(_clean_sequence(sample), _clean_sequence_slow(sample), repr(sample))
+
+    def test_parallel_normalization_matches_serial_output(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            faa_dir = tmp / "faa"
+            faa_dir.mkdir()
+            (faa_dir / "GenomeA.faa").write_text(
+                ">contig0001_1 first\nMPEP*\n>contig0001_1 repeat\nmseq!\n>contig0002_3\nMKV\n"
+            )
+            (faa_dir / "GenomeB.faa").write_text(">GenomeB|scaf9|p1\nMAAB\n>empty\n*\n")
+            (faa_dir / "GenomeC.faa").write_text(">prot\nMKKL\n")
+
+            serial_stats = normalize_and_concat_proteomes(
+                str(faa_dir), str(tmp / "serial.faa"), str(tmp / "serial.tsv")
+            )
+            parallel_stats = normalize_and_concat_proteomes(
+                str(faa_dir), str(tmp / "parallel.faa"), str(tmp / "parallel.tsv"), num_workers=3
+            )
+
+            self.assertEqual(parallel_stats, serial_stats)
+            self.assertEqual(serial_stats["genomes"], 3)
+            self.assertEqual(serial_stats["invalid_chars_replaced"], 1)
+            self.assertEqual((tmp / "parallel.faa").read_text(), (tmp / "serial.faa").read_text())
+            self.assertEqual((tmp / "parallel.tsv").read_text(), (tmp / "serial.tsv").read_text())
+            self.assertEqual(sorted(path.name for path in tmp.iterdir() if path.name.startswith(".")), [])
+
+    def test_normalization_writes_offset_index_for_serial_and_sharded_runs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            faa_dir = tmp / "faa"
+            faa_dir.mkdir()
+            (faa_dir / "GenomeA.faa").write_text(">contig0001_1\nMPEP*\n>contig0002_3\nMK\nV\n")
+            (faa_dir / "GenomeB.faa").write_text(">GenomeB|scaf9|p1\nMAAB\n>empty\n*\n")
+
+            for name, workers in (("serial", 1), ("sharded", 2)):
+                out_fasta = tmp / f"{name}.faa"
+                normalize_and_concat_proteomes(str(faa_dir), str(out_fasta), num_workers=workers)
+                written = Path(str(out_fasta) + ".fai").read_text()
+                self.assertEqual(Path(build_fasta_index(str(out_fasta))).read_text(), written)
+
+                index = load_fasta_index(str(out_fasta))
+                fetched = list(fetch_sequences(str(out_fasta), index, ["GenomeB|scaf9|p1", "missing", "GenomeA|contig0002|contig0002_3"]))
+                self.assertEqual(
+                    fetched,
+                    [("GenomeA|contig0002|contig0002_3", "MKV"), ("GenomeB|scaf9|p1", "MAAB")],
+                )
+
+    def test_fasta_index_handles_wrapped_records(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "wrapped.faa"
+            path.write_text(">a desc\nMKVL\nAAQ\n>b\nMK\n")
+
+            index = load_fasta_index(str(path))
+
+            self.assertEqual(list(fetch_sequences(str(path), index, ["b", "a"])), [("a", "MKVLAAQ"), ("b", "MK")])
+
     def test_gene_call_inputs_emits_genome_contig_gene_ids(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             tmp = Path(tmpdir)
@@ -76,7 +214,9 @@ class InputStageTests(unittest.TestCase):
             fna_dir.mkdir()
             (fna_dir / "GenomeA.fna").write_text(">contigAlpha\nATGAAATTTAAATAG\n")
 
-            fake_module = types.SimpleNamespace(GeneFinder=_FakeGeneFinder)
+            fake_module = types.SimpleNamespace(
+                GeneFinder=_FakeGeneFinder, __spec__=importlib.machinery.ModuleSpec("pyrodigal", None)
+            )
             original = sys.modules.get("pyrodigal")
             sys.modules["pyrodigal"] = fake_module
             try:
@@ -92,6 +232,113 @@ class InputStageTests(unittest.TestCase):
             self.assertIn(">GenomeA|contigAlpha|gene_000001", called)
             self.assertIn(">GenomeA|contigAlpha|gene_000002", called)
 
+    def test_gene_call_stats_feed_manifest_without_rereading_inputs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            fna_dir = tmp / "fna"
+            out_dir = tmp / "called"
+            fna_dir.mkdir()
+            (fna_dir / "GenomeA.fna").write_text(">contigAlpha\nATGAAATTTAAATAG\n>contigBeta\nATGAAATTT\n")
+
+            fake_module = types.SimpleNamespace(
+                GeneFinder=_FakeGeneFinder, __spec__=importlib.machinery.ModuleSpec("pyrodigal", None)
+            )
+            original = sys.modules.get("pyrodigal")
+            sys.modules["pyrodigal"] = fake_module
+            try:
+                stats = gene_call_inputs(str(fna_dir), str(out_dir), str(tmp / "gene_calls.tsv"))
+            finally:
+                if original is None:
+                    del sys.modules["pyrodigal"]
+                else:
+                    sys.modules["pyrodigal"] = original
+
+            (genome,) = stats.genomes
+            self.assertEqual((genome.genome_id, genome.contigs, genome.total_bases, genome.proteins), ("GenomeA", 2, 24, 4))
+            self.assertEqual(genome.staged_proteome_path, str((out_dir / "GenomeA.faa").resolve()))
+
+            (fna_dir / "GenomeA.fna").unlink()
+            manifest = tmp / "manifest.tsv"
+            write_genome_manifest(
+                str(tmp / "missing"),
+                input_format="fna",
+                manifest_path=str(manifest),
+                genomes=list(stats.genomes),
+            )
+            self.assertTrue(manifest.read_text().endswith("GenomeA.faa\t2\t24\n"))
+
+    @unittest.skipUnless(importlib.util.find_spec("pyrodigal"), "pyrodigal not installed")
+    def test_parallel_gene_calling_matches_serial_output(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            fna_dir = tmp / "fna"
+            fna_dir.mkdir()
+            rng = random.Random(7)
+            for name, length in (("GenomeA", 12000), ("GenomeB", 30000), ("GenomeC", 20000)):
+                contigs = [
+                    f">{name}_ctg{index}\n" + "".join(rng.choice("ACGT") for _ in range(length)) + "\n"
+                    for index in range(1, 3)
+                ]
+                (fna_dir / f"{name}.fna").write_text("".join(contigs))
+
+            serial = gene_call_inputs(str(fna_dir), str(tmp / "serial"), str(tmp / "serial.tsv"))
+            parallel = gene_call_inputs(
+                str(fna_dir), str(tmp / "parallel"), str(tmp / "parallel.tsv"), num_workers=3
+            )
+
+            self.assertGreater(serial.staged_records, 0)
+            self.assertEqual(parallel.staged_records, serial.staged_records)
+            self.assertEqual(parallel.contigs, 6)
+            self.assertEqual((tmp / "parallel.tsv").read_text(), (tmp / "serial.tsv").read_text())
+            for name in ("GenomeA", "GenomeB", "GenomeC"):
+                self.assertEqual(
+                    (tmp / "parallel" / f"{name}.faa").read_text(),
+                    (tmp / "serial" / f"{name}.faa").read_text(),
+                )
+            self.assertEqual(sorted(path.name for path in (tmp / "parallel").iterdir()), [
+                "GenomeA.faa", "GenomeB.faa", "GenomeC.faa",
+            ])
+
+    @unittest.skipUnless(importlib.util.find_spec("pyrodigal"), "pyrodigal not installed")
+    def test_staging_links_the_gene_calls_of_ani_discovery(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            fna_dir = tmp / "fna"
+            fna_dir.mkdir()
+            rng = random.Random(3)
+            for name in ("GenomeA", "GenomeB"):
+                sequence = "".join(rng.choice("ACGT") for _ in range(15000))
+                (fna_dir / f"{name}.fna").write_text(f">{name}_ctg1\n{sequence}\n")
+            cfg = make_config(tmp, genomedir=str(fna_dir), input_format="fna", ani_cluster=True)
+            os.makedirs(cfg.outdir)
+            called = ani_clustering._call_query_inputs(cfg, str(fna_dir))
+            cfg.staged_inputs[str(fna_dir)] = called
+            # ANI kept GenomeB as the only representative
+            os.makedirs(cfg.ani_selected_query_dir)
+            os.symlink(fna_dir / "GenomeB.fna", Path(cfg.ani_selected_query_dir) / "GenomeB.fna")
+            cfg.genomedir = cfg.ani_selected_query_dir
+
+            with patch("sgtree.search.gene_call_inputs", side_effect=AssertionError("assemblies parsed twice")):
+                genomes = stage_genomes(
+                    cfg,
+                    cfg.genomedir,
+                    "fna",
+                    proteomes_path=cfg.proteomes_path,
+                    map_path=str(tmp / "header_map.tsv"),
+                    staged_dir=cfg.staged_proteomes_dir,
+                    gene_call_map_path=cfg.gene_call_map_path,
+                )
+
+            (genome,) = genomes
+            self.assertEqual((genome.genome_id, genome.contigs, genome.total_bases), ("GenomeB", 1, 15000))
+            self.assertGreater(genome.proteins, 0)
+            self.assertEqual(genome.proteins, called[1].proteins)
+            self.assertEqual(Path(genome.staged_proteome_path).read_text(), Path(called[1].staged_proteome_path).read_text())
+            self.assertEqual(Path(cfg.proteomes_path).read_text().count(">"), called[1].proteins)
+            calls = Path(cfg.gene_call_map_path).read_text().splitlines()
+            self.assertEqual(len(calls), 1 + called[1].proteins)
+            self.assertTrue(all(line.split("\t")[3] == "GenomeB" for line in calls[1:]))
+
     def test_write_genome_manifest_records_fna_paths_and_sizes(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             tmp = Path(tmpdir)
@@ -167,6 +414,31 @@ class InputStageTests(unittest.TestCase):
             self.assertEqual(df.iloc[0]["gene_id"], "gene_000001")
             self.assertIn("GenomeA/contigA/gene_000001", df_fordups.index)
 
+    def test_build_working_df_parses_ids_and_skips_tables_on_request(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cfg = make_config(tmp, keep_intermediates=False)
+            Path(cfg.tables_dir).mkdir(parents=True, exist_ok=True)
+            finaldf = pd.DataFrame(
+                [
+                    {0: "GenomeA|contigA|gene|1", 3: "MarkerX", 7: 120.0, 22: "desc|with|bars"},
+                    {0: "GenomeA|contigA|gene|1", 3: "MarkerX", 7: 80.0, 22: "second domain"},
+                    {0: "GenomeB|gene_000002", 3: "MarkerX", 7: 90.0, 22: "-"},
+                    {0: "lonely", 3: "MarkerY", 7: 70.0, 22: "-"},
+                ]
+            )
+
+            df, _df_fordups = build_working_df(cfg, finaldf)
+
+            self.assertEqual(list(df["savedname"]), ["GenomeA/contigA/gene/1", "GenomeB/gene_000002", "lonely"])
+            self.assertEqual(list(df["genome_id"]), ["GenomeA", "GenomeB", "unknown_genome"])
+            self.assertEqual(list(df["contig_id"]), ["contigA", "unknown_contig", "unknown_contig"])
+            self.assertEqual(list(df["gene_id"]), ["gene|1", "gene_000002", "lonely"])
+            self.assertEqual(list(df[0]), ["GenomeA", "GenomeB", "lonely"])
+            self.assertEqual(list(df[22]), ["desc", "-", "-"])
+            self.assertEqual(list(df["namemodel"]), ["GenomeA/MarkerX", "GenomeB/MarkerX", "lonely/MarkerY"])
+            self.assertEqual(list(Path(cfg.tables_dir).iterdir()), [])
+
 
 if __name__ == "__main__":
     unittest.main()
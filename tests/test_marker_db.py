@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from sgtree import marker_db
+from sgtree.cache import DiskCache
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+MODELS = REPO_ROOT / "resources" / "models" / "RProt16.hmm"
+
+
+class MarkerDatabaseTests(unittest.TestCase):
+    def setUp(self):
+        marker_db._LOADED.clear()
+        marker_db._DIGESTS.clear()
+
+    def test_press_once_and_reuse_from_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cache = DiskCache(root=str(tmp / "cache"), namespace="models")
+            first = tmp / "first" / "models"
+            first.parent.mkdir()
+            shutil.copyfile(MODELS, first)
+
+            digest = marker_db.press_models(str(first), cache)
+            pressed = {suffix: os.path.getmtime(str(first) + suffix) for suffix in marker_db.PRESSED_SUFFIXES}
+            self.assertEqual(marker_db.press_models(str(first), cache), digest)
+            self.assertEqual(
+                pressed,
+                {suffix: os.path.getmtime(str(first) + suffix) for suffix in marker_db.PRESSED_SUFFIXES},
+            )
+
+            second = tmp / "second" / "models"
+            second.parent.mkdir()
+            shutil.copyfile(MODELS, second)
+            marker_db.press_models(str(second), cache)
+            for suffix in marker_db.PRESSED_SUFFIXES:
+                self.assertEqual(
+                    Path(str(first) + suffix).read_bytes(),
+                    Path(str(second) + suffix).read_bytes(),
+                )
+            self.assertEqual(len(cache.entries()), 1)
+
+    def test_loaded_profiles_are_shared_and_match_the_text_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            models = tmp / "models"
+            shutil.copyfile(MODELS, models)
+
+            from_text = marker_db.load_models(str(models))
+            marker_db._LOADED.clear()
+            marker_db.press_models(str(models))
+            pressed = marker_db.load_models(str(models))
+
+            self.assertIs(marker_db.load_models(str(models)), pressed)
+            self.assertEqual(pressed.names, from_text.names)
+            self.assertEqual(len(pressed.profiles), 16)
+            self.assertEqual(pressed.hmms, from_text.hmms)
+
+            # a stale stamp falls back to the edited text file
+            models.write_text(models.read_text().split("//\n", 1)[0] + "//\n")
+            self.assertEqual(len(marker_db.load_models(str(models)).hmms), 1)
+
+    def test_repeated_loads_hash_the_file_only_when_it_changes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            models = Path(tmpdir) / "models"
+            shutil.copyfile(MODELS, models)
+
+            with patch("sgtree.marker_db.file_digest", wraps=marker_db.file_digest) as digest:
+                loaded = marker_db.load_models(str(models))
+                self.assertIs(marker_db.load_models(str(models)), loaded)
+                self.assertEqual(digest.call_count, 1)
+
+                models.write_text(models.read_text().split("//\n", 1)[0] + "//\n")
+                self.assertEqual(len(marker_db.load_models(str(models)).hmms), 1)
+                self.assertEqual(digest.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
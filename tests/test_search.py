@@ -0,0 +1,216 @@
+import os
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+from pyhmmer import easel, hmmer, plan7
+
+from helpers import make_config, write_marker_inputs
+from sgtree import search
+
+
+class HitTableTests(unittest.TestCase):
+    def test_table_from_top_hits_matches_domtblout_export(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            write_marker_inputs(tmp, models=3, genomes=2, paralogs=1, seed=11)
+            with plan7.HMMFile(str(tmp / "models.hmm")) as hmm_file:
+                hmms = list(hmm_file)
+            with easel.SequenceFile(str(tmp / "input" / "GenomeA.faa"), digital=True, alphabet=hmms[0].alphabet) as seqs:
+                results = list(hmmer.hmmsearch(hmms, seqs.read_block(), E=10.0, domE=10.0))
+            with open(tmp / "hits.hmmout", "wb") as handle:
+                for index, top_hits in enumerate(results):
+                    top_hits.write(handle, format="domains", header=(index == 0))
+
+            accuracies = []
+            search.write_hits(results, str(tmp / "shared.hmmout"), accuracies)
+            table = search.hits_to_table(results, accuracies=accuracies)
+
+            self.assertEqual((tmp / "shared.hmmout").read_bytes(), (tmp / "hits.hmmout").read_bytes())
+            pd.testing.assert_frame_equal(table, search.read_hit_table(str(tmp / "hits.hmmout")))
+            self.assertEqual(list(table.columns), list(range(23)))
+            self.assertTrue(table[21].str.fullmatch(r"[01]\.\d\d").all())
+            # without the text, acc is left out
+            without_acc = search.hits_to_table(results)
+            self.assertTrue((without_acc[21] == "-").all())
+            pd.testing.assert_frame_equal(without_acc.drop(columns=21), table.drop(columns=21))
+            self.assertEqual(table[7].dtype, "float64")
+            self.assertEqual(table[2].dtype, "int64")
+            self.assertGreaterEqual(len(table), 4)
+
+    def test_parse_uses_in_memory_hits_without_export(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            write_marker_inputs(tmp, models=3, genomes=2, paralogs=1, seed=11)
+            exported = make_config(tmp, outdir=str(tmp / "exported"))
+            in_memory = make_config(tmp, outdir=str(tmp / "in_memory"), write_hmmout=False)
+
+            frames = []
+            for cfg in (exported, in_memory):
+                os.makedirs(cfg.outdir)
+                cfg.model_count = search.concat_inputs(cfg)
+                hits, _ = search.run_hmmsearch(cfg)
+                finaldf, dict_counts = search.parse_hmmsearch(cfg, hits)
+                frames.append((finaldf, dict_counts))
+
+            self.assertTrue(os.path.exists(exported.hitsoutdir))
+            self.assertFalse(os.path.exists(in_memory.hitsoutdir))
+            pd.testing.assert_frame_equal(frames[0][0], frames[1][0])
+            self.assertEqual(frames[0][1], frames[1][1])
+            self.assertEqual(sorted(frames[1][1]["GenomeA"].values()), [1, 1, 2])
+
+    def test_chunked_search_matches_a_single_search(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            write_marker_inputs(tmp, models=3, genomes=2, paralogs=1, seed=11)
+            tables = []
+            for name, chunk in (("single", 0), ("chunked", 2)):
+                cfg = make_config(tmp, outdir=str(tmp / name), hmmsearch_cutoff="evalue", search_chunk=chunk)
+                os.makedirs(cfg.outdir)
+                cfg.model_count = search.concat_inputs(cfg)
+                hits, _ = search.run_hmmsearch(cfg)
+                tables.append(hits)
+
+            self.assertEqual(search._count_sequences(cfg.proteomes_path), 8)
+            pd.testing.assert_frame_equal(tables[0], tables[1])
+            self.assertEqual(
+                Path(tmp, "single", "hits.hmmout").read_bytes(),
+                Path(tmp, "chunked", "hits.hmmout").read_bytes(),
+            )
+
+    def test_top_copies_pruning_matches_the_duplicate_cap(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            write_marker_inputs(tmp, models=3, genomes=2, paralogs=1, seed=11)
+            rng = random.Random(3)
+            with plan7.HMMFile(str(tmp / "models.hmm")) as hmm_file:
+                consensus = next(iter(hmm_file)).consensus.upper()
+            lines = []
+            for copy in range(9):
+                # identical copies tie on bitscore and are ordered by savedname
+                sequence = list(consensus)
+                for position in rng.sample(range(len(sequence)), 3 * (copy % 3)):
+                    sequence[position] = rng.choice("ACDEFGHIKLMNPQRSTVWY")
+                lines.append(f">GenomeC|c{9 - copy}|p{copy}\n{''.join(sequence)}\n")
+            (tmp / "input" / "GenomeC.faa").write_text("".join(lines))
+
+            outputs = []
+            for name, keep in (("full", True), ("pruned", False)):
+                cfg = make_config(tmp, outdir=str(tmp / name), keep_intermediates=keep)
+                os.makedirs(cfg.outdir)
+                cfg.model_count = search.concat_inputs(cfg)
+                hits, _ = search.run_hmmsearch(cfg)
+                finaldf, dict_counts = search.parse_hmmsearch(cfg, hits)
+                df, _ = search.build_working_df(cfg, finaldf)
+                outputs.append((len(hits), dict_counts, df.reset_index(drop=True)))
+
+            self.assertLess(outputs[1][0], outputs[0][0])
+            self.assertEqual(outputs[0][1], outputs[1][1])
+            self.assertEqual(max(outputs[1][1]["GenomeC"].values()), 9)
+            pd.testing.assert_frame_equal(outputs[0][2], outputs[1][2])
+            self.assertEqual((df["genome_id"] == "GenomeC").sum(), search.MAX_MARKER_COPIES)
+
+    def test_dedup_search_fans_hits_out_to_identical_proteins(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            write_marker_inputs(tmp, models=3, genomes=2, paralogs=1, seed=11)
+            # near-clonal isolates: byte-identical proteomes under other genome IDs
+            genome_a = (tmp / "input" / "GenomeA.faa").read_text()
+            for isolate in ("GenomeA2", "GenomeA3"):
+                (tmp / "input" / f"{isolate}.faa").write_text(genome_a.replace(">GenomeA|", f">{isolate}|"))
+
+            tables = []
+            for name, dedup in (("full", False), ("dedup", True)):
+                cfg = make_config(
+                    tmp, outdir=str(tmp / name), write_hmmout=False, dedup_sequences=dedup, search_chunk=3
+                )
+                os.makedirs(cfg.outdir)
+                cfg.model_count = search.concat_inputs(cfg)
+                hits, _ = search.run_hmmsearch(cfg)
+                tables.append(hits)
+
+            pd.testing.assert_frame_equal(tables[0], tables[1])
+            self.assertEqual(sorted(set(tables[1][0].str.split("|").str[0])), ["GenomeA", "GenomeA2", "GenomeA3", "GenomeB"])
+            self.assertEqual(search._count_sequences(cfg.unique_proteomes_path), 8)
+            members = Path(cfg.sequence_members_path).read_text().splitlines()
+            self.assertEqual(len(members), 1 + 2 * 4)
+            self.assertEqual(members[1], "GenomeA|c0|p0\tGenomeA2|c0|p0")
+
+
+class GenomeFilterTests(unittest.TestCase):
+    def _hits(self, rows: list[tuple]) -> pd.DataFrame:
+        defaults = {label: ("-" if dtype is object else 1) for label, dtype in search.HIT_TABLE_DTYPES.items()}
+        frame = pd.DataFrame(
+            [{**defaults, 0: row[0], 3: row[1], 2: row[2] if len(row) > 2 else 100} for row in rows]
+        )
+        return frame.astype(search.HIT_TABLE_DTYPES)
+
+    def test_counts_keep_first_seen_order_and_log_each_filter(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cfg = make_config(tmp, percent_models=50, max_sdup=2, max_dupl=0.25)
+            os.makedirs(cfg.outdir)
+            cfg.model_count = 4
+            hits = self._hits(
+                [
+                    ("B|c1|p1", "M2"),
+                    ("A|c1|p1", "M1"),
+                    ("B|c1|p2", "M1"),
+                    ("A|c1|p2", "M2"),
+                    ("A|c1|p2", "M2"),  # second domain of the same protein counts once
+                    ("A|c2|p3", "M3"),
+                    ("C|c1|p1", "M1"),
+                    ("D|c1|p1", "M1"),
+                    ("D|c1|p2", "M1"),
+                    ("D|c1|p3", "M1"),
+                    ("D|c1|p4", "M2"),
+                    ("E|c1|p1", "M1"),
+                    ("E|c1|p2", "M1"),
+                    ("E|c1|p3", "M2"),
+                    ("E|c1|p4", "M2"),
+                ]
+            )
+
+            finaldf, dict_counts = search.parse_hmmsearch(cfg, hits)
+
+            self.assertEqual(list(dict_counts), ["B", "A", "C", "D", "E"])
+            self.assertEqual(dict_counts["B"], {"M2": 1, "M1": 1})
+            self.assertEqual(dict_counts["A"], {"M1": 1, "M2": 1, "M3": 1})
+            self.assertEqual(
+                Path(cfg.outdir, "log_genomes_removed.txt").read_text(),
+                "C\tminmarker:0.2500\n"
+                "D\tmaxsdup:3\n"
+                "E\tmaxdupl:0.5000\n",
+            )
+            self.assertEqual(sorted(set(finaldf[0].str.split("|").str[0])), ["A", "B"])
+            matrix = pd.read_csv(Path(cfg.outdir, "marker_count_matrix.csv"), index_col=0)
+            self.assertEqual(list(matrix.columns), ["B", "A"])
+
+    def test_length_filter_drops_exact_ids_in_memory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cfg = make_config(tmp, lflt_fraction=0.5, write_hmmout=False)
+            os.makedirs(cfg.outdir)
+            cfg.model_count = 2
+            hits = self._hits(
+                [
+                    ("A|c1|p1", "M1", 40),
+                    ("A|c1|p1.1", "M1", 100),  # grep -w matched this as well
+                    ("A|c1|p1", "M2", 100),
+                    ("B|c1|p1", "M1", 100),
+                    ("B|c1|p2", "M2", 100),
+                ]
+            )
+
+            finaldf, dict_counts = search.parse_hmmsearch(cfg, hits)
+
+            self.assertEqual(list(finaldf[0]), ["A|c1|p1.1", "B|c1|p1", "B|c1|p2"])
+            self.assertEqual(dict_counts["A"], {"M1": 1})
+            self.assertEqual(Path(cfg.hitsoutdir + ".del.ls").read_text(), "A|c1|p1\n")
+            self.assertFalse(os.path.exists(cfg.hitsoutdir))
+
+
+if __name__ == "__main__":
+    unittest.main()
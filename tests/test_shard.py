@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from multiprocessing import get_context
+from pathlib import Path
+
+from helpers import make_config, write_marker_inputs
+from sgtree import search
+from sgtree.config import Config
+from sgtree.shard import check_merged_hits, main as shard_main, merge_shards, shard_slice
+
+
+def _config(tmp: Path) -> Config:
+    return make_config(tmp, hmmsearch_cutoff="evalue", hmmsearch_evalue=10.0)
+
+
+def _write_inputs(tmp: Path) -> None:
+    """Four genomes with three weak marker copies and three non-marker proteins each."""
+    write_marker_inputs(tmp, models=3, genomes=4, mutations=25, extra_proteins=3, seed=5)
+
+
+class ShardedSearchTests(unittest.TestCase):
+    def test_merged_shards_equal_the_monolithic_export(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            _write_inputs(tmp)
+            cfg = _config(tmp)
+            os.makedirs(cfg.outdir)
+            cfg.model_count = search.concat_inputs(cfg)
+            search.run_hmmsearch(cfg)
+
+            argvs = [
+                [
+                    "search-shard", cfg.proteomes_path, cfg.models_path,
+                    "--shard", str(index), "--shards", "3",
+                    "--out", str(tmp / f"shard{index}.pkl"),
+                    "--num_cpus", "1", "--search_chunk", "2",
+                    "--hmmsearch_cutoff", "evalue", "--hmmsearch_evalue", "10",
+                ]
+                for index in range(3)
+            ]
+            with get_context("spawn").Pool(3) as pool:
+                pool.map(shard_main, argvs)
+            shard_main(
+                ["search-merge", *(str(tmp / f"shard{index}.pkl") for index in (2, 0, 1)),
+                 "--models", cfg.models_path, "--out", str(tmp / "merged.hmmout")]
+            )
+
+            self.assertEqual((tmp / "merged.hmmout").read_bytes(), Path(cfg.hitsoutdir).read_bytes())
+            merged = str(tmp / "merged.hmmout")
+            self.assertTrue(check_merged_hits(merged, cfg.proteomes_path, cfg.models_path, "evalue", 10.0))
+            self.assertFalse(check_merged_hits(cfg.hitsoutdir, cfg.proteomes_path, cfg.models_path, "evalue", 10.0))
+            with self.assertRaisesRegex(ValueError, "different hmmsearch_cutoff, hmmsearch_evalue than this run"):
+                check_merged_hits(merged, cfg.proteomes_path, cfg.models_path, "cut_ga", 1e-5)
+            self.assertGreater(len(search.read_hit_table(str(tmp / "merged.hmmout"))), 3)
+            self.assertEqual(
+                [shard_slice(cfg.proteomes_path, index, 3).records for index in range(3)],
+                [8, 8, 8],
+            )
+
+    def test_merge_rejects_incomplete_or_mismatched_shards(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            _write_inputs(tmp)
+            cfg = _config(tmp)
+            os.makedirs(cfg.outdir)
+            search.concat_inputs(cfg)
+            common = ["--num_cpus", "1", "--hmmsearch_cutoff", "evalue", "--hmmsearch_evalue", "10"]
+            for index in range(2):
+                shard_main(["search-shard", cfg.proteomes_path, cfg.models_path, "--shard", str(index),
+                            "--shards", "2", "--out", str(tmp / f"shard{index}.pkl"), *common])
+            shard_main(["search-shard", cfg.proteomes_path, cfg.models_path, "--shard", "1",
+                        "--shards", "2", "--out", str(tmp / "strict.pkl"), "--num_cpus", "1"])
+
+            # same record count, one renamed record
+            other_store = tmp / "other_proteomes"
+            other_store.write_text(Path(cfg.proteomes_path).read_text().replace(">", ">x", 1))
+            shard_main(["search-shard", str(other_store), cfg.models_path, "--shard", "1",
+                        "--shards", "2", "--out", str(tmp / "other.pkl"), *common])
+
+            with self.assertRaisesRegex(ValueError, "different store$"):
+                merge_shards([str(tmp / "shard0.pkl"), str(tmp / "other.pkl")], cfg.models_path, str(tmp / "out"))
+            merge_shards([str(tmp / "shard0.pkl"), str(tmp / "shard1.pkl")], cfg.models_path, str(tmp / "out"))
+            with self.assertRaisesRegex(ValueError, "different store than this run"):
+                check_merged_hits(str(tmp / "out"), str(other_store), cfg.models_path, "evalue", 10.0)
+            with self.assertRaisesRegex(ValueError, r"missing \[1\]"):
+                merge_shards([str(tmp / "shard0.pkl")], cfg.models_path, str(tmp / "out"))
+            with self.assertRaisesRegex(ValueError, "different hmmsearch_cutoff, hmmsearch_evalue"):
+                merge_shards([str(tmp / "shard0.pkl"), str(tmp / "strict.pkl")], cfg.models_path, str(tmp / "out"))
+            with self.assertRaisesRegex(ValueError, "outside 0..1"):
+                shard_slice(cfg.proteomes_path, 2, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+
+from helpers import make_config
+from sgtree import phylogeny
+from sgtree.config import Config
+from sgtree.fasta_index import fetch_sequences, load_fasta_index
+from sgtree.fasta_normalize import normalize_and_concat_proteomes
+from sgtree.input_stage import scan_genome_inputs, write_genome_manifest
+from sgtree.update import (
+    UPDATE_REQUIRED,
+    _append_store,
+    affected_markers,
+    plan_update,
+    remove_stale_markers,
+)
+
+
+def _config(tmp: Path) -> Config:
+    return make_config(tmp, input_format="auto", update=True)
+
+
+def _previous_run(tmp: Path, cfg: Config) -> None:
+    """Lay out the files a --keep_intermediates run leaves for genomes A and B."""
+    run = Path(cfg.outdir)
+    run.mkdir()
+    for name in UPDATE_REQUIRED:
+        if name == "aligned":
+            (run / name).mkdir()
+        else:
+            (run / name).write_text("")
+    write_genome_manifest(
+        cfg.genomedir,
+        input_format="faa",
+        manifest_path=cfg.genome_manifest_path,
+        genomes=scan_genome_inputs(cfg.genomedir, input_format="faa"),
+    )
+
+
+class UpdatePlanTests(unittest.TestCase):
+    def test_plan_lists_only_genomes_missing_from_the_manifest(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cfg = _config(tmp)
+            (tmp / "input").mkdir()
+            (tmp / "input" / "GenomeA.faa").write_text(">p1\nMKV\n")
+            (tmp / "input" / "GenomeB.faa").write_text(">p1\nMAA\n")
+            _previous_run(tmp, cfg)
+            (tmp / "input" / "GenomeC.faa").write_text(">p1\nMCC\n")
+
+            plan = plan_update(cfg)
+
+            self.assertEqual(plan.input_format, "faa")
+            self.assertEqual([g.genome_id for g in plan.previous], ["GenomeA", "GenomeB"])
+            self.assertEqual([Path(path).name for path in plan.new_files], ["GenomeC.faa"])
+
+    def test_plan_requires_kept_intermediates_and_matching_format(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cfg = _config(tmp)
+            (tmp / "input").mkdir()
+            (tmp / "input" / "GenomeA.faa").write_text(">p1\nMKV\n")
+            _previous_run(tmp, cfg)
+
+            (Path(cfg.outdir) / "hits.hmmout").unlink()
+            with self.assertRaisesRegex(ValueError, "keep_intermediates yes.*hits.hmmout"):
+                plan_update(cfg)
+
+            (Path(cfg.outdir) / "hits.hmmout").write_text("")
+            (tmp / "input" / "GenomeA.faa").unlink()
+            (tmp / "input" / "GenomeB.fna").write_text(">contig\nATGAAATTTAAATAG\n")
+            with self.assertRaisesRegex(ValueError, "does not match the previous run"):
+                plan_update(cfg)
+
+    def test_plan_rejects_evalue_cutoffs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cfg = _config(tmp)
+            cfg.hmmsearch_cutoff = "evalue"
+            (tmp / "input").mkdir()
+            (tmp / "input" / "GenomeA.faa").write_text(">p1\nMKV\n")
+            _previous_run(tmp, cfg)
+
+            with self.assertRaisesRegex(ValueError, "--update needs a cut_ga, cut_tc or cut_nc"):
+                plan_update(cfg)
+
+
+class UpdateAppendTests(unittest.TestCase):
+    def test_appended_store_keeps_a_valid_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            old_dir = tmp / "old"
+            new_dir = tmp / "new"
+            old_dir.mkdir()
+            new_dir.mkdir()
+            (old_dir / "GenomeA.faa").write_text(">contig0001_1\nMPEP\n>contig0001_2\nMKVL\n")
+            (new_dir / "GenomeB.faa").write_text(">GenomeB|scaf9|p1\nMAAB\n")
+            store = str(tmp / "proteomes")
+            normalize_and_concat_proteomes(str(old_dir), store)
+            normalize_and_concat_proteomes(str(new_dir), str(tmp / "new_proteomes"))
+
+            total = _append_store(str(tmp / "new_proteomes"), store)
+
+            index = load_fasta_index(store)
+            self.assertEqual(total, 3)
+            self.assertEqual(
+                dict(fetch_sequences(store, index, ["GenomeB|scaf9|p1", "GenomeA|contig0001|contig0001_2"])),
+                {"GenomeB|scaf9|p1": "MAAB", "GenomeA|contig0001|contig0001_2": "MKVL"},
+            )
+
+    def test_affected_markers_compares_retained_hits_with_the_previous_alignments(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            cfg = _config(tmp)
+            aligned = Path(cfg.aligned_dir)
+            aligned.mkdir(parents=True)
+            (aligned / "MarkerX.faa").write_text(">A|c1|p1\nMK-\n")
+            (aligned / "MarkerY.faa").write_text(">A|c1|p2\nMK-\n>B|c1|p2\nMKV\n")
+            (aligned / "MarkerW.faa").write_text(">B|c1|p9\nMKV\n")
+            df = pd.DataFrame(
+                {
+                    "savedname": ["A/c1/p1", "A/c1/p2", "C/c1/p2", "C/c1/p3"],
+                    "genome_id": ["A", "A", "C", "C"],
+                    "namemodel": ["A/MarkerX", "A/MarkerY", "C/MarkerY", "C/MarkerZ"],
+                }
+            )
+
+            # MarkerY lost B (filtered out of the combined table) and gained C
+            self.assertEqual(affected_markers(df, cfg.aligned_dir), {"MarkerY", "MarkerZ"})
+            self.assertEqual(affected_markers(df[df["genome_id"] == "A"], cfg.aligned_dir), {"MarkerY"})
+            self.assertEqual(remove_stale_markers(cfg, df), ["MarkerW"])
+            self.assertEqual(sorted(path.name for path in aligned.iterdir()), ["MarkerX.faa", "MarkerY.faa"])
+
+class UpdateTreeTests(unittest.TestCase):
+    def test_iqtree_redo_is_only_passed_on_update(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            commands = []
+
+            def fake_run(cmd, **_kwargs):
+                commands.append(cmd)
+                Path(cmd[cmd.index("--prefix") + 1] + ".treefile").write_text("(A,B);\n")
+
+            cfg = _config(tmp)
+            cfg.tree_method = "iqtree"
+            with patch("sgtree.phylogeny.subprocess.run", side_effect=fake_run):
+                for update in (False, True):
+                    cfg.update = update
+                    phylogeny.run_species_tree(cfg, str(tmp / "concat.faa"), str(tmp / f"tree_{update}.nwk"))
+
+            self.assertEqual(["-redo" in cmd for cmd in commands], [False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()